@@ -1,15 +1,79 @@
-from typing import Any, Dict, List, Type
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
 
 import numpy as np
 import torch
 from torch import nn
-from torch.distributions import kl_divergence
+from torch.distributions import Beta, Distribution, Independent, Normal, kl_divergence
 
 from tianshou.data import Batch, ReplayBuffer, to_torch_as
 from tianshou.policy import A2CPolicy
+from tianshou.utils import DeferredMetrics
 from tianshou.utils.net.common import ActorCritic
 
 
+def closed_form_base(dist: Distribution) -> Optional[Distribution]:
+    """Return the Normal or Beta base of a diagonal policy distribution, if any."""
+    if isinstance(dist, Independent) and dist.reinterpreted_batch_ndims == 1 and \
+            isinstance(dist.base_dist, (Normal, Beta)):
+        return dist.base_dist
+    return None
+
+
+def dist_snapshot(dist: Distribution) -> Optional[Batch]:
+    """Store the parameters of a diagonal Normal or Beta policy distribution.
+
+    Returns None for distributions without a closed-form kernel, in which case the
+    caller should keep the raw logits and go through ``dist_fn`` instead.
+    """
+    base = closed_form_base(dist)
+    if base is None:
+        return None
+    if isinstance(base, Normal):
+        return Batch(
+            loc=base.loc.contiguous(), log_scale=base.scale.log().contiguous()
+        )
+    return Batch(
+        concentration1=base.concentration1.contiguous(),
+        concentration0=base.concentration0.contiguous(),
+    )
+
+
+def snapshot_log_prob(dist: Distribution, act: torch.Tensor) -> torch.Tensor:
+    """Closed-form ``dist.log_prob(act)`` for the distributions in dist_snapshot."""
+    base = dist.base_dist
+    if isinstance(base, Normal):
+        log_scale = base.scale.log()
+        return (
+            -((act - base.loc)**2) / (2 * base.scale**2) - log_scale -
+            0.5 * np.log(2 * np.pi)
+        ).sum(-1)
+    a, b = base.concentration1, base.concentration0
+    return (
+        torch.xlogy(a - 1, act) + torch.xlogy(b - 1, 1 - act) + torch.lgamma(a + b) -
+        torch.lgamma(a) - torch.lgamma(b)
+    ).sum(-1)
+
+
+def snapshot_kl(old: Batch, dist: Distribution) -> torch.Tensor:
+    """Closed-form KL(old || dist), summed over the action dimension."""
+    base = dist.base_dist
+    if "loc" in old:
+        log_ratio = old.log_scale - base.scale.log()
+        kl = 0.5 * ((2 * log_ratio).exp() + ((old.loc - base.loc) / base.scale)**2 -
+                    1) - log_ratio
+        return kl.sum(-1)
+    a1, b1 = old.concentration1, old.concentration0
+    a2, b2 = base.concentration1, base.concentration0
+    ab1 = a1 + b1
+    kl = (
+        torch.lgamma(a2) + torch.lgamma(b2) - torch.lgamma(a2 + b2) -
+        torch.lgamma(a1) - torch.lgamma(b1) + torch.lgamma(ab1) +
+        (a1 - a2) * torch.digamma(a1) + (b1 - b2) * torch.digamma(b1) +
+        (a2 - a1 + b2 - b1) * torch.digamma(ab1)
+    )
+    return kl.sum(-1)
+
+
 class FixPOPolicy(A2CPolicy):
     r"""Implementation of Proximal Policy Optimization. arXiv:1707.06347.
 
@@ -36,11 +100,25 @@ class FixPOPolicy(A2CPolicy):
         Default to True.
     :param bool fixup_every_repeat: whether to run fixup loop every epoch.
         Default to True.
+    :param str fixup_strategy: how the fixup loop finds constraint violations.
+        "full" re-checks every minibatch of the batch on each pass, "indexed" keeps
+        a per-sample KL index from the last full pass and only steps on minibatches
+        drawn from violating samples, verifying on the full batch at the end.
+        "bisect" takes no fixup gradient steps and instead bisects on the
+        interpolation between the actor parameters from before ``learn()`` and the
+        updated ones, keeping the largest coefficient that satisfies the
+        constraint. Default to "full".
+    :param int fixup_bisect_steps: number of bisection halvings done by the "bisect"
+        fixup strategy after the updated parameters violate the constraint.
+        Default to 8.
     :param bool advantage_normalization: whether to do per mini-batch advantage
         normalization. Default to True.
     :param bool recompute_advantage: whether to recompute advantage every update
         repeat according to https://arxiv.org/pdf/2006.05990.pdf Sec. 3.5.
         Default to False.
+    :param bool reuse_next_value: whether to take V(s') from V(s) of the next
+        transition when it is in the same batch and episode, instead of evaluating
+        the critic on every "obs_next". Default to True.
     :param float vf_coef: weight for value loss. Default to 0.5.
     :param float ent_coef: weight for entropy loss. Default to 0.01.
     :param float max_grad_norm: clipping gradients in back propagation. Default to
@@ -49,9 +127,17 @@ class FixPOPolicy(A2CPolicy):
         Default to 0.95.
     :param bool reward_normalization: normalize estimated values to have std close
         to 1, also normalize the advantage to Normal(0, 1). Default to False.
-    :param int max_batchsize: the maximum size of the batch when computing GAE,
-        depends on the size of available memory and the memory cost of the model;
-        should be as large as possible within the memory constraint. Default to 256.
+    :param int max_batchsize: the maximum size of the chunks used to compute values,
+        the old policy and GAE in ``process_fn``, depends on the size of available
+        memory and the memory cost of the model; should be as large as possible
+        within the memory constraint. Default to 256.
+    :param bool deferred_metrics: whether to keep the losses of each gradient step
+        on the device and synchronize them once at the end of ``learn()``, instead
+        of calling ``.item()`` on every minibatch. Default to False. The fixup
+        loop still decides on the host whether to step: with this flag, a "full"
+        pass first checks all its minibatches with one sync and only syncs per
+        minibatch from the first violating one on, while "indexed" and "bisect"
+        sync once per check either way.
     :param bool action_scaling: whether to map actions from range [-1, 1] to range
         [action_spaces.low, action_spaces.high]. Default to True.
     :param str action_bound_method: method to bound action to range [-1, 1], can be
@@ -87,11 +173,21 @@ class FixPOPolicy(A2CPolicy):
         target_coeff: float = 2.,
         init_beta: float = 1.,
         kl_target_stat: str = "max",
+        fixup_strategy: str = "full",
+        fixup_bisect_steps: int = 8,
         advantage_normalization: bool = True,
         recompute_advantage: bool = False,
+        reuse_next_value: bool = True,
         **kwargs: Any,
     ) -> None:
-        super().__init__(actor, critic, optim, dist_fn, **kwargs)
+        super().__init__(
+            actor,
+            critic,
+            optim,
+            dist_fn,
+            reuse_next_value=reuse_next_value,
+            **kwargs,
+        )
         self._eps_clip = eps_clip  # Only used for vf clipping
         self._eps_kl = eps_kl
         self._value_clip = value_clip
@@ -105,6 +201,10 @@ class FixPOPolicy(A2CPolicy):
         self._kl_target_stat = kl_target_stat
         self._fixup_loop = fixup_loop
         self._target_coeff = target_coeff
+        if fixup_strategy not in ("full", "indexed", "bisect"):
+            raise ValueError("Unknown fixup_strategy", fixup_strategy)
+        self._fixup_strategy = fixup_strategy
+        self._fixup_bisect_steps = fixup_bisect_steps
 
     def process_fn(
         self, batch: Batch, buffer: ReplayBuffer, indices: np.ndarray
@@ -112,122 +212,275 @@ class FixPOPolicy(A2CPolicy):
         if self._recompute_adv:
             # buffer input `buffer` and `indices` to be used in `learn()`.
             self._buffer, self._indices = buffer, indices
-        batch = self._compute_returns(batch, buffer, indices)
-        batch.act = to_torch_as(batch.act, batch.v_s)
+        # One pass over chunks of at most max_batchsize samples computes V(s), the
+        # old policy and logp_old together; V(s') reuses V(s) inside episodes unless
+        # reuse_next_value is off.
+        v_s, old_dists, logits, logp_old = [], [], [], []
         with torch.no_grad():
-            result = self(batch)
-            # Move batch dimension to start
-            batch.logits = result.logits.transpose(0, 1)
-            batch.logp_old = result.dist.log_prob(batch.act)
+            for minibatch in batch.split(
+                self._batch, shuffle=False, merge_last=True, contiguous=True
+            ):
+                v_s.append(self.critic(minibatch.obs).flatten())
+                result = self(minibatch)
+                old_dist = dist_snapshot(result.dist)
+                if old_dist is None:
+                    # Move batch dimension to start
+                    logits.append(result.logits.transpose(0, 1))
+                else:
+                    old_dists.append(old_dist)
+                act = to_torch_as(minibatch.act, v_s[-1])
+                logp_old.append(self._log_prob(result.dist, act))
+        v_s = torch.cat(v_s)
+        if self._reuse_next_value:
+            next_rows = self._next_rows(buffer, indices)
+        else:
+            next_rows = np.full(len(indices), -1)
+        v_s_ = self._next_values(batch, v_s, next_rows)
+        batch = self._compute_returns(batch, buffer, indices, values=(v_s, v_s_))
+        batch.act = to_torch_as(batch.act, batch.v_s)
+        if old_dists:
+            batch.old_dist = Batch.cat(old_dists)
+        else:
+            batch.logits = torch.cat(logits)
+        batch.logp_old = torch.cat(logp_old)
         return batch
 
-    def _optimize_beta(self, kl_div: torch.Tensor):
-        self._beta_optim.zero_grad()
+    def _log_prob(self, dist: Distribution, act: torch.Tensor) -> torch.Tensor:
+        if closed_form_base(dist) is None:
+            return dist.log_prob(act)
+        return snapshot_log_prob(dist, act)
+
+    def _kl_from_old(self, minibatch: Batch, dist: Distribution) -> torch.Tensor:
+        if "old_dist" in minibatch:
+            return snapshot_kl(minibatch.old_dist, dist)
+        old_dist = self.dist_fn(*minibatch.logits.transpose(0, 1))
+        return kl_divergence(old_dist, dist)
+
+    def _kl_stat(self, kl_div: torch.Tensor) -> torch.Tensor:
+        """The statistic of the per-sample KL that the constraint applies to."""
         if self._kl_target_stat == "max":
-            beta_loss = self._beta * (self._eps_kl - self._target_coeff * kl_div.detach().max())
+            return kl_div.detach().max()
         elif self._kl_target_stat == "mean":
-            beta_loss = self._beta * (self._eps_kl - self._target_coeff * kl_div.detach().mean())
+            return kl_div.detach().mean()
         else:
             raise ValueError("Unknown kl_target_stat", self._kl_target_stat)
+
+    def _sync_grads(self) -> None:
+        """Hook called after every backward pass on the actor and critic."""
+        pass
+
+    def _minibatches(self, batch: Batch, size: int) -> Iterator[Batch]:
+        # gather the shuffled batch once, every minibatch is a view of it
+        return batch.split(size, merge_last=True, contiguous=True)
+
+    def _optimize_beta(self, kl_div: torch.Tensor) -> torch.Tensor:
+        self._beta_optim.zero_grad()
+        beta_loss = self._beta * (self._eps_kl - self._target_coeff * self._kl_stat(kl_div))
         # This backward pass only affects self._beta
         beta_loss.backward()
         self._beta_optim.step()
-        if self._beta < 0:
-            with torch.no_grad():
-                self._beta.copy_(0.)
-        return beta_loss.item()
+        with torch.no_grad():
+            # clamp in place, comparing on the host would force a device sync
+            self._beta.clamp_(min=0.)
+        return beta_loss.detach()
 
-    def _violates_constraint(self, kl_div: torch.Tensor):
-        if self._kl_target_stat == "max":
-            return (kl_div > self._eps_kl).any()
-        elif self._kl_target_stat == "mean":
-            return kl_div.mean() > self._eps_kl
-        else:
-            raise ValueError("Unknown kl_target_stat", self._kl_target_stat)
+    def _violates_constraint(self, kl_div: torch.Tensor, batch: Batch):
+        """Whether the KL of ``batch``, e.g. a minibatch, breaks the constraint."""
+        return self._kl_stat(kl_div) > self._eps_kl
+
+    def _fixup_step(self, kl_div: torch.Tensor, metrics: DeferredMetrics) -> None:
+        kl_loss = self._beta.detach() * kl_div.mean()
+        self.optim.zero_grad()
+        self._beta_optim.zero_grad()
+        kl_loss.backward()
+        self._sync_grads()
+        if self._grad_norm:  # clip large gradient
+            nn.utils.clip_grad_norm_(
+                self._actor_critic.parameters(), max_norm=self._grad_norm
+            )
+        self.optim.step()
+
+        metrics.add("loss/beta", self._optimize_beta(kl_div))
+
+    def _first_violating(self, minibatches: List[Batch]) -> Optional[int]:
+        """Index of the first minibatch breaking the constraint, with one sync."""
+        violations = []
+        with torch.no_grad():
+            for minibatch in minibatches:
+                kl_div = self._kl_from_old(minibatch, self(minibatch).dist)
+                violations.append(self._violates_constraint(kl_div, minibatch))
+        found = torch.stack(violations).nonzero().flatten().tolist()
+        return found[0] if found else None
+
+    def _fixup_full(self, batch: Batch, metrics: DeferredMetrics) -> int:
+        fixup_grad_steps = 0
+        while True:  # until constriant satisfied
+            minibatches = list(self._minibatches(batch, self._fixup_batchsize))
+            start = 0
+            if self._deferred_metrics:
+                # No step is taken before the first violating minibatch, so a pass
+                # that satisfies the constraint costs a single sync.
+                start = self._first_violating(minibatches)
+                if start is None:
+                    return fixup_grad_steps
+            constraint_satisfied = True
+            for minibatch in minibatches[start:]:
+                dist = self(minibatch).dist
+                kl_div = self._kl_from_old(minibatch, dist)
+                if self._violates_constraint(kl_div, minibatch):
+                    constraint_satisfied = False
+                    fixup_grad_steps += 1
+                    self._fixup_step(kl_div, metrics)
+            if constraint_satisfied:
+                return fixup_grad_steps
+
+    def _batch_kl(self, batch: Batch) -> torch.Tensor:
+        """Per-sample KL divergence from the old policy over the whole batch."""
+        kl_divs = []
+        with torch.no_grad():
+            for minibatch in batch.split(
+                self._fixup_batchsize, shuffle=False, merge_last=True, contiguous=True
+            ):
+                dist = self(minibatch).dist
+                kl_divs.append(self._kl_from_old(minibatch, dist))
+        return torch.cat(kl_divs)
+
+    def _violating_indices(self, kl_index: torch.Tensor, batch: Batch) -> np.ndarray:
+        if not self._violates_constraint(kl_index, batch):
+            return np.array([], dtype=int)
+        # a max or mean over the bound always has a sample over the bound
+        violating = kl_index > self._eps_kl
+        return violating.nonzero().flatten().cpu().numpy()
+
+    def _fixup_indexed(self, batch: Batch, metrics: DeferredMetrics) -> int:
+        fixup_grad_steps = 0
+        kl_index = self._batch_kl(batch)
+        while True:  # until constriant satisfied
+            violating = self._violating_indices(kl_index, batch)
+            if len(violating) == 0:
+                # The index only tracks samples we stepped on, so make sure the
+                # constraint holds on the whole batch before leaving.
+                kl_index = self._batch_kl(batch)
+                violating = self._violating_indices(kl_index, batch)
+                if len(violating) == 0:
+                    return fixup_grad_steps
+            violating = np.random.permutation(violating)
+            for start in range(0, len(violating), self._fixup_batchsize):
+                indices = violating[start:start + self._fixup_batchsize]
+                minibatch = batch[indices]
+                dist = self(minibatch).dist
+                kl_div = self._kl_from_old(minibatch, dist)
+                kl_index[indices] = kl_div.detach()
+                if self._violates_constraint(kl_div, minibatch):
+                    fixup_grad_steps += 1
+                    self._fixup_step(kl_div, metrics)
+
+    def _interpolate_actor(
+        self, old_params: List[torch.Tensor], new_params: List[torch.Tensor],
+        coeff: float
+    ) -> None:
+        with torch.no_grad():
+            for param, old, new in zip(self.actor.parameters(), old_params, new_params):
+                param.copy_(old).lerp_(new, coeff)
+
+    def _fixup_bisect(
+        self, batch: Batch, metrics: DeferredMetrics, old_params: List[torch.Tensor]
+    ) -> Tuple[float, int]:
+        """Return the kept interpolation coefficient and the number of evaluations."""
+        kl_div = self._batch_kl(batch)
+        if not self._violates_constraint(kl_div, batch):
+            return 1., 1
+        # Still adapt beta to the violation, like a fixup gradient step would
+        metrics.add("loss/beta", self._optimize_beta(kl_div))
+        new_params = [param.detach().clone() for param in self.actor.parameters()]
+        # The old parameters (coeff 0) satisfy the constraint with a KL of 0
+        low, high = 0., 1.
+        for _ in range(self._fixup_bisect_steps):
+            mid = (low + high) / 2
+            self._interpolate_actor(old_params, new_params, mid)
+            if self._violates_constraint(self._batch_kl(batch), batch):
+                high = mid
+            else:
+                low = mid
+        self._interpolate_actor(old_params, new_params, low)
+        return low, 1 + self._fixup_bisect_steps
 
     def learn(  # type: ignore
         self, batch: Batch, batch_size: int, repeat: int, **kwargs: Any
     ) -> Dict[str, List[float]]:
-        losses, pg_losses, vf_losses, ent_losses, beta_losses, kl_losses = [], [], [], [], [], []
+        metrics = self._metrics(
+            ["loss", "loss/pg", "loss/vf", "loss/ent", "loss/kl", "loss/beta"],
+            batch, batch_size, repeat
+        )
         fixup_grad_steps = 0
+        if self._fixup_strategy == "bisect":
+            old_params = [param.detach().clone() for param in self.actor.parameters()]
+            interp_coeffs, fixup_evals = [], 0
         for step in range(repeat):
             if self._recompute_adv and step > 0:
                 batch = self._compute_returns(batch, self._buffer, self._indices)
-            for minibatch in batch.split(batch_size, merge_last=True):
-                # calculate loss for actor
-                dist = self(minibatch).dist
-                if self._norm_adv:
-                    mean, std = minibatch.adv.mean(), minibatch.adv.std()
-                    minibatch.adv = (minibatch.adv -
-                                     mean) / (std + self._eps)  # per-batch norm
-                ratio = (dist.log_prob(minibatch.act) -
-                         minibatch.logp_old).exp().float()
-                ratio = ratio.reshape(ratio.size(0), -1).transpose(0, 1)
-                pg_loss = -(ratio * minibatch.adv).mean()
-                old_dist = self.dist_fn(*minibatch.logits.transpose(0, 1))
-                kl_div = kl_divergence(old_dist, dist)
-                kl_loss = self._beta.detach() * kl_div.mean()
-                # calculate loss for critic
-                value = self.critic(minibatch.obs).flatten()
-                if self._value_clip:
-                    v_clip = minibatch.v_s + \
-                        (value - minibatch.v_s).clamp(-self._eps_clip, self._eps_clip)
-                    vf1 = (minibatch.returns - value).pow(2)
-                    vf2 = (minibatch.returns - v_clip).pow(2)
-                    vf_loss = torch.max(vf1, vf2).mean()
-                else:
-                    vf_loss = (minibatch.returns - value).pow(2).mean()
-                # calculate regularization and overall loss
-                ent_loss = dist.entropy().mean()
-                loss = pg_loss + self._weight_vf * vf_loss \
-                    - self._weight_ent * ent_loss + kl_loss
-                self.optim.zero_grad()
-                loss.backward()
-                if self._grad_norm:  # clip large gradient
-                    nn.utils.clip_grad_norm_(
-                        self._actor_critic.parameters(), max_norm=self._grad_norm
-                    )
-                self.optim.step()
-                pg_losses.append(pg_loss.item())
-                vf_losses.append(vf_loss.item())
-                ent_losses.append(ent_loss.item())
-                kl_losses.append(kl_loss.item())
-                losses.append(loss.item())
-
-                beta_losses.append(self._optimize_beta(kl_div))
+            with self.timing.timeit("primary"):
+                for minibatch in self._minibatches(batch, batch_size):
+                    # calculate loss for actor
+                    dist = self(minibatch).dist
+                    if self._norm_adv:
+                        mean, std = minibatch.adv.mean(), minibatch.adv.std()
+                        minibatch.adv = (minibatch.adv -
+                                         mean) / (std + self._eps)  # per-batch norm
+                    ratio = (self._log_prob(dist, minibatch.act) -
+                             minibatch.logp_old).exp().float()
+                    ratio = ratio.reshape(ratio.size(0), -1).transpose(0, 1)
+                    pg_loss = -(ratio * minibatch.adv).mean()
+                    kl_div = self._kl_from_old(minibatch, dist)
+                    kl_loss = self._beta.detach() * kl_div.mean()
+                    # calculate loss for critic
+                    value = self.critic(minibatch.obs).flatten()
+                    if self._value_clip:
+                        v_clip = minibatch.v_s + (value - minibatch.v_s).clamp(
+                            -self._eps_clip, self._eps_clip
+                        )
+                        vf1 = (minibatch.returns - value).pow(2)
+                        vf2 = (minibatch.returns - v_clip).pow(2)
+                        vf_loss = torch.max(vf1, vf2).mean()
+                    else:
+                        vf_loss = (minibatch.returns - value).pow(2).mean()
+                    # calculate regularization and overall loss
+                    ent_loss = dist.entropy().mean()
+                    loss = pg_loss + self._weight_vf * vf_loss \
+                        - self._weight_ent * ent_loss + kl_loss
+                    self.optim.zero_grad()
+                    loss.backward()
+                    self._sync_grads()
+                    if self._grad_norm:  # clip large gradient
+                        nn.utils.clip_grad_norm_(
+                            self._actor_critic.parameters(), max_norm=self._grad_norm
+                        )
+                    self.optim.step()
+                    metrics.add("loss/pg", pg_loss)
+                    metrics.add("loss/vf", vf_loss)
+                    metrics.add("loss/ent", ent_loss)
+                    metrics.add("loss/kl", kl_loss)
+                    metrics.add("loss", loss)
+
+                    metrics.add("loss/beta", self._optimize_beta(kl_div))
 
             if self._fixup_loop and (self._fixup_every_repeat or step + 1 == repeat):
-                while True:  # until constriant satisfied
-                    constraint_satisfied = True
-                    for minibatch in batch.split(self._fixup_batchsize, merge_last=True):
-                        dist = self(minibatch).dist
-                        old_dist = self.dist_fn(*minibatch.logits.transpose(0, 1))
-                        kl_div = kl_divergence(old_dist, dist)
-                        if self._violates_constraint(kl_div):
-                            constraint_satisfied = False
-                            fixup_grad_steps += 1
-
-                            kl_loss = self._beta.detach() * kl_div.mean()
-                            self.optim.zero_grad()
-                            self._beta_optim.zero_grad()
-                            kl_loss.backward()
-                            if self._grad_norm:  # clip large gradient
-                                nn.utils.clip_grad_norm_(
-                                    self._actor_critic.parameters(), max_norm=self._grad_norm
-                                )
-                            self.optim.step()
-
-                            beta_losses.append(self._optimize_beta(kl_div))
-                    if constraint_satisfied:
-                        break
-
-        return {
-            "loss": losses,
-            "loss/pg": pg_losses,
-            "loss/vf": vf_losses,
-            "loss/ent": ent_losses,
-            "loss/kl": kl_losses,
-            "loss/beta": beta_losses,
+                with self.timing.timeit("fixup"):
+                    if self._fixup_strategy == "full":
+                        fixup_grad_steps += self._fixup_full(batch, metrics)
+                    elif self._fixup_strategy == "indexed":
+                        fixup_grad_steps += self._fixup_indexed(batch, metrics)
+                    else:
+                        coeff, evals = self._fixup_bisect(batch, metrics, old_params)
+                        interp_coeffs.append(coeff)
+                        fixup_evals += evals
+
+        result = {
+            **metrics.result(),
             "fixup_grad_steps": fixup_grad_steps,
             "beta": self._beta.item(),
         }
+        if self._fixup_strategy == "bisect":
+            result["fixup_interp_coeff"] = interp_coeffs
+            result["fixup_evals"] = fixup_evals
+        return result
@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Type
+from typing import Any, Dict, List, Optional, Type
 
 import numpy as np
 import torch
@@ -9,7 +9,182 @@ from tianshou.data import Batch, ReplayBuffer, to_torch_as
 from tianshou.policy import A2CPolicy
 from tianshou.utils.net.common import ActorCritic
 
-import pickle
+# One record per gradient step of the KL trace, see :class:`KLTraceWriter`.
+KL_TRACE_DTYPE = np.dtype([
+    ("epoch", "<u4"),
+    ("grad_step", "<u4"),
+    ("phase", "u1"),
+    ("refreshed", "u1"),
+    ("max_kl", "<f4"),
+    ("full_max_kl", "<f4"),
+    ("beta", "<f4"),
+])
+PRIMARY_PHASE = 0
+FIXUP_PHASE = 1
+
+
+class KLTraceWriter:
+    """Append-only binary log of per gradient step KL statistics.
+
+    Records are kept as device tensors until :meth:`flush`, so recording a step
+    never synchronizes with the device; each flush writes one contiguous block of
+    ``KL_TRACE_DTYPE`` records, which :func:`read_kl_trace` can memory-map.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "ab")
+        self._meta: List[tuple] = []
+        self._values: List[torch.Tensor] = []
+
+    def record(
+        self,
+        epoch: int,
+        grad_step: int,
+        phase: int,
+        refreshed: bool,
+        max_kl: torch.Tensor,
+        full_max_kl: torch.Tensor,
+        beta: torch.Tensor,
+    ) -> None:
+        self._meta.append((epoch, grad_step, phase, refreshed))
+        # stack copies, so later in-place updates of beta don't leak in
+        self._values.append(torch.stack([max_kl, full_max_kl, beta]).detach())
+
+    def flush(self) -> None:
+        if not self._meta:
+            return
+        records = np.empty(len(self._meta), dtype=KL_TRACE_DTYPE)
+        meta = np.array(self._meta)
+        values = torch.stack(self._values).float().cpu().numpy()
+        for i, name in enumerate(["epoch", "grad_step", "phase", "refreshed"]):
+            records[name] = meta[:, i]
+        for i, name in enumerate(["max_kl", "full_max_kl", "beta"]):
+            records[name] = values[:, i]
+        records.tofile(self._file)
+        self._file.flush()
+        self._meta, self._values = [], []
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+
+def read_kl_trace(path: str, mmap: bool = True) -> np.ndarray:
+    """Read a KL trace written by :class:`KLTraceWriter` as a record array."""
+    if mmap:
+        return np.memmap(path, dtype=KL_TRACE_DTYPE, mode="r")
+    return np.fromfile(path, dtype=KL_TRACE_DTYPE)
+
+
+# The behavior stats file starts with (magic, dim) as two int64s, followed by one
+# record of behavior_stats_dtype(dim) per epoch.
+BEHAVIOR_STATS_MAGIC = 0x46585042
+BEHAVIOR_STATS_HEADER = 16
+
+
+def behavior_stats_dtype(dim: int) -> np.dtype:
+    return np.dtype([
+        ("epoch", "<u4"),
+        ("count", "<u8"),
+        ("mean", "<f8", (dim, )),
+        ("covs", "<f8", (dim, dim)),
+    ])
+
+
+class BehaviorStatsWriter:
+    """Streaming mean and covariance of the behavior (obs, act) rows of each epoch.
+
+    Chunks are merged into the running moments with Chan et al.'s parallel update,
+    so memory stays O(dim ** 2) however large the batch is, and each epoch becomes
+    one fixed-size record appended to a single file, see :class:`BehaviorStats`.
+
+    :param str path: the file to append to.
+    :param int chunk_size: rows merged at once. Default to 4096.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 4096) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self._dim = 0
+        self.reset()
+
+    def reset(self) -> None:
+        self._count = 0
+        self._mean = np.zeros(self._dim)
+        self._m2 = np.zeros((self._dim, self._dim))
+
+    def update(self, *columns: np.ndarray) -> None:
+        """Merge rows made of the concatenated ``columns``, e.g. obs and act."""
+        columns = tuple(column.reshape(len(column), -1) for column in columns)
+        dim = sum(column.shape[1] for column in columns)
+        if self._dim != dim:
+            assert self._count == 0, "The behavior dimension changed mid epoch"
+            self._dim = dim
+            self.reset()
+        for start in range(0, len(columns[0]), self.chunk_size):
+            chunk = np.concatenate(
+                [column[start:start + self.chunk_size] for column in columns], axis=1
+            ).astype(np.float64)
+            count = len(chunk)
+            mean = chunk.mean(axis=0)
+            centered = chunk - mean
+            delta = mean - self._mean
+            total = self._count + count
+            self._mean = self._mean + delta * (count / total)
+            self._m2 += centered.T @ centered + \
+                np.outer(delta, delta) * (self._count * count / total)
+            self._count = total
+
+    def write(self, epoch: int) -> None:
+        """Append the current moments as the record of ``epoch`` and reset."""
+        if self._count == 0:
+            return
+        record = np.zeros(1, dtype=behavior_stats_dtype(self._dim))
+        record["epoch"] = epoch
+        record["count"] = self._count
+        record["mean"] = self._mean
+        # unbiased, to match np.cov
+        record["covs"] = self._m2 / max(self._count - 1, 1)
+        with open(self.path, "ab") as f:
+            if f.tell() == 0:
+                header = [BEHAVIOR_STATS_MAGIC, self._dim]
+                np.array(header, dtype="<i8").tofile(f)
+            record.tofile(f)
+        self.reset()
+
+
+class BehaviorStats:
+    """Reader of a file written by :class:`BehaviorStatsWriter`.
+
+    The records are memory-mapped, and ``stats[epoch]`` returns the same
+    ``{"mean": ..., "covs": ...}`` dict the per-epoch pickles used to hold.
+    """
+
+    def __init__(self, path: str) -> None:
+        magic, dim = np.fromfile(path, dtype="<i8", count=2)
+        if magic != BEHAVIOR_STATS_MAGIC:
+            raise ValueError("Not a behavior stats file", path)
+        self.dim = int(dim)
+        self.records = np.memmap(
+            path, dtype=behavior_stats_dtype(self.dim), mode="r",
+            offset=BEHAVIOR_STATS_HEADER
+        )
+
+    @property
+    def epochs(self) -> np.ndarray:
+        return self.records["epoch"]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, epoch: int) -> Dict[str, np.ndarray]:
+        # a resumed run may append an epoch again, the latest record wins
+        index = np.flatnonzero(self.records["epoch"] == epoch)
+        if len(index) == 0:
+            raise KeyError(epoch)
+        record = self.records[index[-1]]
+        return {"mean": np.array(record["mean"]), "covs": np.array(record["covs"])}
 
 
 class FixPOPolicy(A2CPolicy):
@@ -65,6 +240,16 @@ class FixPOPolicy(A2CPolicy):
         optimizer in each policy.update(). Default to None (no lr_scheduler).
     :param bool deterministic_eval: whether to use deterministic action instead of
         stochastic action sampled by the policy. Default to False.
+    :param bool gen_behavior: whether to append the mean and covariance of every
+        batch's concatenated (obs, act) to ``{log_dir}/behavior_stats.bin``, see
+        :class:`BehaviorStats`. Default to False.
+    :param bool trace_kl: whether to stream a cheap KL trace to
+        ``{log_dir}/kl_trace.bin``. Instead of recomputing the KL over the whole
+        batch after every gradient step like ``gen_plots`` does, a per-sample
+        estimate is kept and only the rows of the minibatch just trained on are
+        updated. Default to False.
+    :param int trace_refresh_every: recompute the KL estimate over the whole batch
+        every this many gradient steps, 0 for never. Default to 0.
 
     .. seealso::
 
@@ -94,6 +279,8 @@ class FixPOPolicy(A2CPolicy):
         recompute_advantage: bool = False,
         gen_plots: bool = False,
         gen_behavior: bool = False,
+        trace_kl: bool = False,
+        trace_refresh_every: int = 0,
         **kwargs: Any,
     ) -> None:
         super().__init__(actor, critic, optim, dist_fn, **kwargs)
@@ -119,6 +306,12 @@ class FixPOPolicy(A2CPolicy):
         self._fixup_phase_grad_steps = []
         self._gen_plots = gen_plots
         self._gen_behavior = gen_behavior
+        self._behavior_writer = BehaviorStatsWriter(f"{log_dir}/behavior_stats.bin")
+        self._trace_kl = trace_kl
+        self._trace_refresh_every = trace_refresh_every
+        self._trace_writer: Optional[KLTraceWriter] = None
+        self._trace_steps = 0
+        self._kl_estimate = torch.zeros(0)
         assert log_dir
 
     def reset_plot(self):
@@ -134,14 +327,8 @@ class FixPOPolicy(A2CPolicy):
         self, batch: Batch, buffer: ReplayBuffer, indices: np.ndarray
     ) -> Batch:
         if self._gen_behavior:
-            behavior = np.concatenate([batch.obs, batch.act], axis=1)
-            behavior_mean = np.mean(behavior, axis=0)
-            behavior_covs = np.cov(behavior, rowvar=0)
-            with open(f"{self._log_dir}/behavior_data_{self._epoch}.pkl", 'wb') as f:
-                pickle.dump({
-                    'mean': behavior_mean,
-                    'covs': behavior_covs,
-                }, f)
+            self._behavior_writer.update(batch.obs, batch.act)
+            self._behavior_writer.write(self._epoch)
 
         if self._recompute_adv:
             # buffer input `buffer` and `indices` to be used in `learn()`.
@@ -179,12 +366,40 @@ class FixPOPolicy(A2CPolicy):
         else:
             raise ValueError("Unknown kl_target_stat", self._kl_target_stat)
 
+    def _kl_to_old(self, batch: Batch) -> torch.Tensor:
+        old_dist = self.dist_fn(*batch.logits.transpose(0, 1))
+        return kl_divergence(old_dist, self(batch).dist)
+
+    def _trace_step(
+        self, batch: Batch, minibatch: Batch, kl_div: torch.Tensor, phase: int
+    ) -> None:
+        """Update the running KL estimate after a gradient step and record it."""
+        assert self._trace_writer is not None
+        self._trace_steps += 1
+        refresh = self._trace_refresh_every > 0 and \
+            self._trace_steps % self._trace_refresh_every == 0
+        with torch.no_grad():
+            if refresh:
+                self._kl_estimate = self._kl_to_old(batch)
+            else:
+                self._kl_estimate[minibatch.trace_idx] = self._kl_to_old(minibatch)
+        self._trace_writer.record(
+            self._epoch, self._trace_steps, phase, refresh, kl_div.detach().max(),
+            self._kl_estimate.max(), self._beta.detach()
+        )
+
     def learn(  # type: ignore
         self, batch: Batch, batch_size: int, repeat: int, **kwargs: Any
     ) -> Dict[str, List[float]]:
         losses, pg_losses, vf_losses, ent_losses, beta_losses, kl_losses = [], [], [], [], [], []
         if self._epoch % 4 == 0:
             self.reset_plot()
+        if self._trace_kl:
+            if self._trace_writer is None:
+                self._trace_writer = KLTraceWriter(f"{self._log_dir}/kl_trace.bin")
+            # the policy still equals the behavior policy, so every KL is zero
+            batch.trace_idx = np.arange(len(batch))
+            self._kl_estimate = torch.zeros(len(batch), device=batch.logp_old.device)
         fixup_grad_steps = 0
         for step in range(repeat):
             if self._recompute_adv and step > 0:
@@ -241,6 +456,8 @@ class FixPOPolicy(A2CPolicy):
                         self._max_kl_divs.append(kl_div.max().item())
                         self._betas.append(self._beta.item())
                         primary_steps += 1
+                if self._trace_kl:
+                    self._trace_step(batch, minibatch, kl_div, PRIMARY_PHASE)
 
                 beta_losses.append(self._optimize_beta(kl_div))
 
@@ -276,6 +493,8 @@ class FixPOPolicy(A2CPolicy):
                                     self._max_kl_divs.append(kl_div.max().item())
                                     self._betas.append(self._beta.item())
                                     fixup_steps += 1
+                            if self._trace_kl:
+                                self._trace_step(batch, minibatch, kl_div, FIXUP_PHASE)
 
                     if constraint_satisfied:
                         break
@@ -290,6 +509,8 @@ class FixPOPolicy(A2CPolicy):
                 target=self._eps_kl / self._target_coeff,
                 boundary=self._eps_kl,
                 filename=f"{self._log_dir}/grad_steps_plot_{self._epoch}.pdf")
+        if self._trace_writer is not None:
+            self._trace_writer.flush()
         self._epoch += 1
 
         return {
@@ -353,3 +574,23 @@ def gradient_steps_plot(full_max_kl_divs, betas, primary_phase_grad_steps, fixup
     # ax2.set_aspect(1.5)
     fig.tight_layout()  # otherwise the right y-label is slightly clipped
     plt.savefig(filename)
+
+
+def plot_kl_trace(trace, target, boundary, filename):
+    """Plot records of :func:`read_kl_trace` the way :func:`gradient_steps_plot` does."""
+    primary_phase_grad_steps, fixup_phase_grad_steps = [], []
+    run_starts = np.flatnonzero(np.diff(trace["phase"])) + 1
+    for run in np.split(trace["phase"], run_starts):
+        if run[0] == PRIMARY_PHASE:
+            primary_phase_grad_steps.append(len(run))
+            fixup_phase_grad_steps.append(0)
+        elif primary_phase_grad_steps:
+            fixup_phase_grad_steps[-1] = len(run)
+    gradient_steps_plot(
+        full_max_kl_divs=trace["full_max_kl"],
+        betas=trace["beta"],
+        primary_phase_grad_steps=primary_phase_grad_steps,
+        fixup_phase_grad_steps=fixup_phase_grad_steps,
+        target=target,
+        boundary=boundary,
+        filename=filename)
@@ -0,0 +1,468 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+from torch import nn
+
+from tianshou.data import Batch, Collector, ReplayBuffer, to_torch
+from tianshou.policy import BasePolicy
+from tianshou.utils import BaseLogger, MultipleLRSchedulers
+from tianshou.utils.logger.base import LOG_DATA_TYPE
+from tianshou.utils.net.common import MLP, Net
+from tianshou.utils.net.continuous import ActorProb, Critic
+
+from fixpo_tianshou import FixPOPolicy, closed_form_base, snapshot_kl, snapshot_log_prob
+
+
+def _mlp_layers(module: nn.Module) -> nn.Sequential:
+    if isinstance(module, Net):
+        if module.use_dueling or module.num_atoms > 1 or module.softmax:
+            raise ValueError("Only plain MLP networks can be stacked", module)
+        module = module.model
+    if not isinstance(module, MLP):
+        raise ValueError("Only plain MLP networks can be stacked", module)
+    return module.model
+
+
+def _stacked_layers(modules: Sequence[nn.Module]) -> List[Union[List[nn.Linear], nn.Module]]:
+    """Pair up the layers of same-shaped MLPs, one entry per layer."""
+    sequentials = [_mlp_layers(module) for module in modules]
+    if len({len(layers) for layers in sequentials}) != 1:
+        raise ValueError("All stacked networks must have the same layers")
+    stacked: List[Union[List[nn.Linear], nn.Module]] = []
+    for layers in zip(*sequentials):
+        if isinstance(layers[0], nn.Linear):
+            if any(layer.bias is None or layer.weight.shape != layers[0].weight.shape
+                   for layer in layers):
+                raise ValueError("Stacked linear layers must match and have a bias")
+            stacked.append(list(layers))
+        elif any(True for _ in layers[0].parameters()):
+            raise ValueError("Only linear layers carry parameters when stacked", layers[0])
+        else:
+            # activations hold no state, any seed's module can be shared
+            stacked.append(layers[0])
+    return stacked
+
+
+def _stacked_forward(
+    layers: List[Union[List[nn.Linear], nn.Module]], x: torch.Tensor
+) -> torch.Tensor:
+    for layer in layers:
+        if isinstance(layer, list):
+            weight = torch.stack([linear.weight for linear in layer])
+            bias = torch.stack([linear.bias for linear in layer])
+            x = torch.baddbmm(bias.unsqueeze(1), x, weight.transpose(1, 2))
+        else:
+            x = layer(x)
+    return x
+
+
+class StackedActorCritic:
+    """Evaluate several same-shaped ActorProb/Critic pairs with batched matmuls.
+
+    Inputs and outputs carry a leading seed dimension. The weights stay in each
+    seed's own modules and are stacked on every call, so gradients flow back to
+    every seed's own parameters and optimizers.
+
+    :param actors: one ActorProb with a state-independent sigma per seed.
+    :param critics: one Critic per seed.
+    """
+
+    def __init__(self, actors: Sequence[ActorProb], critics: Sequence[Critic]) -> None:
+        if not all(isinstance(actor, ActorProb) and not actor._c_sigma for actor in actors):
+            raise ValueError("Only ActorProb with a state-independent sigma can be stacked")
+        if not all(isinstance(critic, Critic) for critic in critics):
+            raise ValueError("Only Critic can be stacked")
+        self._unbounded = actors[0]._unbounded
+        self._max_action = actors[0]._max
+        self._actor_layers = _stacked_layers([actor.preprocess for actor in actors]) + \
+            _stacked_layers([actor.mu for actor in actors])
+        self._sigma_params = [actor.sigma_param for actor in actors]
+        self._critic_layers = \
+            _stacked_layers([critic.preprocess for critic in critics]) + \
+            _stacked_layers([critic.last for critic in critics])
+
+    def actor(self, obs: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Mapping: obs [seeds, batch, ...] -> (mu, sigma) [seeds, batch, act]."""
+        mu = _stacked_forward(self._actor_layers, obs.flatten(2))
+        if not self._unbounded:
+            mu = self._max_action * torch.tanh(mu)
+        log_sigma = torch.stack(self._sigma_params).view(len(self._sigma_params), 1, -1)
+        return mu, (log_sigma + torch.zeros_like(mu)).exp()
+
+    def critic(self, obs: torch.Tensor) -> torch.Tensor:
+        """Mapping: obs [seeds, batch, ...] -> V(s) [seeds, batch]."""
+        return _stacked_forward(self._critic_layers, obs.flatten(2)).squeeze(-1)
+
+
+def _split_bounds(length: int, size: int) -> List[Tuple[int, int]]:
+    """Chunk boundaries of ``Batch.split(size, merge_last=True)``."""
+    merge_last = length % size > 0
+    bounds = []
+    for start in range(0, length, size):
+        if merge_last and start + size + size >= length:
+            bounds.append((start, length))
+            break
+        bounds.append((start, start + size))
+    return bounds
+
+
+def _gather(data: Batch, index: torch.Tensor) -> Batch:
+    """Select ``index[i]`` along dimension 1 of every [seeds, samples, ...] tensor."""
+    seeds = torch.arange(index.shape[0], device=index.device).unsqueeze(1)
+    return Batch(
+        {
+            key: _gather(value, index) if isinstance(value, Batch) else
+            value[seeds, index]
+            for key, value in data.items()
+        }
+    )
+
+
+class MultiSeedFixPOPolicy(BasePolicy):
+    """Train several independent FixPO seeds in one process.
+
+    Every seed is a complete :class:`FixPOPolicy` with its own actor, critic,
+    optimizer, beta, return normalization and lr scheduler. Action selection and
+    the minibatch and fixup loops of ``learn()`` evaluate all seeds at once through
+    :class:`StackedActorCritic`, while optimizer steps, gradient clipping and beta
+    updates stay per seed, and each seed leaves the fixup loop as soon as its own
+    constraint holds.
+
+    Samples are routed to their seed through the "seed" info key that
+    :class:`~metaworld_env_tianshou.GroupedVectorEnv` adds, and every seed must
+    contribute the same number of samples to ``learn()``, as it does when all envs
+    are collected in lockstep. Update results are reported per seed under keys
+    prefixed with ``seed{seed}/``.
+
+    Only the "full" fixup strategy and Normal or Beta action distributions are
+    supported, and ``recompute_advantage`` is not.
+
+    :param policies: one FixPOPolicy per seed, built with the same arguments and
+        networks of the same shape.
+    :param seeds: the seed of each policy. Seeds the action sampling and minibatch
+        shuffling RNG streams, and names the per-seed results.
+    """
+
+    def __init__(self, policies: Sequence[FixPOPolicy], seeds: Sequence[int]) -> None:
+        first = policies[0]
+        schedulers = [policy.lr_scheduler for policy in policies]
+        super().__init__(
+            observation_space=first.observation_space,
+            action_space=first.action_space,
+            action_scaling=first.action_scaling,
+            action_bound_method=first.action_bound_method,
+            lr_scheduler=MultipleLRSchedulers(*schedulers)
+            if all(scheduler is not None for scheduler in schedulers) else None,
+        )
+        assert len(policies) == len(seeds)
+        for policy in policies:
+            if policy._fixup_strategy != "full":
+                raise ValueError("Only the full fixup strategy runs multi-seed")
+            if policy._recompute_adv:
+                raise ValueError("recompute_advantage can't run multi-seed")
+        self.policies = nn.ModuleList(policies)
+        self.seeds = list(seeds)
+        self._stacked = StackedActorCritic(
+            [policy.actor for policy in policies], [policy.critic for policy in policies]
+        )
+        self._device = next(first.actor.parameters()).device
+        self._torch_rngs = [
+            torch.Generator(device=self._device).manual_seed(seed) for seed in seeds
+        ]
+        self._np_rngs = [np.random.default_rng(seed) for seed in seeds]
+        self._dist_fn = first.dist_fn
+        self._deterministic_eval = first._deterministic_eval
+        self._norm_adv, self._eps = first._norm_adv, first._eps
+        self._value_clip, self._eps_clip = first._value_clip, first._eps_clip
+        self._weight_vf, self._weight_ent = first._weight_vf, first._weight_ent
+        self._grad_norm = first._grad_norm
+        self._eps_kl, self._kl_target_stat = first._eps_kl, first._kl_target_stat
+        self._fixup_loop, self._fixup_every_repeat = \
+            first._fixup_loop, first._fixup_every_repeat
+        self._fixup_batchsize = first._fixup_batchsize
+
+    def _seed_rows(self, batch: Batch) -> List[np.ndarray]:
+        if "seed" not in batch.info:
+            raise ValueError("Multi-seed batches need a 'seed' info key")
+        seed = np.asarray(batch.info.seed)
+        return [np.nonzero(seed == i)[0] for i in range(len(self.policies))]
+
+    def forward(
+        self,
+        batch: Batch,
+        state: Optional[Union[dict, Batch, np.ndarray]] = None,
+        **kwargs: Any,
+    ) -> Batch:
+        rows = self._seed_rows(batch)
+        sizes = [len(seed_rows) for seed_rows in rows]
+        obs = to_torch(batch.obs, device=self._device, dtype=torch.float32)
+        index = np.concatenate(rows)
+        if min(sizes) == max(sizes):
+            mu, sigma = self._stacked.actor(obs[index].view(len(rows), sizes[0], -1))
+            mu, sigma = mu.flatten(0, 1), sigma.flatten(0, 1)
+        else:  # e.g. some test envs already stopped, fall back to one pass per seed
+            outputs = [
+                policy.actor(obs[seed_rows])[0]
+                for policy, seed_rows in zip(self.policies, rows) if len(seed_rows)
+            ]
+            mu = torch.cat([output[0] for output in outputs])
+            sigma = torch.cat([output[1] for output in outputs])
+        # back from seed order to batch order
+        order = torch.as_tensor(np.argsort(index), device=self._device)
+        mu, sigma = mu[order], sigma[order]
+        dist = self._dist_fn(mu, sigma)
+        if self._deterministic_eval and not self.training:
+            act = mu
+        elif isinstance(closed_form_base(dist), torch.distributions.Normal):
+            # draw every seed's noise from its own RNG stream
+            noise = torch.cat(
+                [
+                    torch.randn(
+                        (size, *mu.shape[1:]), generator=rng, device=self._device
+                    ) for size, rng in zip(sizes, self._torch_rngs)
+                ]
+            )
+            act = mu + sigma * noise[order]
+        else:
+            act = dist.sample()
+        return Batch(logits=(mu, sigma), act=act, state=state, dist=dist)
+
+    def process_fn(
+        self, batch: Batch, buffer: ReplayBuffer, indices: np.ndarray
+    ) -> Batch:
+        return Batch.cat(
+            [
+                policy.process_fn(batch[seed_rows], buffer, indices[seed_rows])
+                for policy, seed_rows in zip(self.policies, self._seed_rows(batch))
+            ]
+        )
+
+    def _stack_seeds(self, batch: Batch) -> Batch:
+        """Lay the samples out as [seeds, samples, ...] tensors for learn()."""
+        if "old_dist" not in batch:
+            raise ValueError("Multi-seed FixPO needs a Normal or Beta distribution")
+        rows = self._seed_rows(batch)
+        sizes = {len(seed_rows) for seed_rows in rows}
+        if len(sizes) != 1:
+            raise ValueError("Every seed must contribute the same number of samples")
+        index = np.concatenate(rows)
+
+        def stack(value: Any) -> torch.Tensor:
+            value = to_torch(value[index], device=self._device, dtype=torch.float32)
+            return value.view(len(rows), -1, *value.shape[1:])
+
+        return Batch(
+            obs=stack(batch.obs),
+            act=stack(batch.act),
+            adv=stack(batch.adv),
+            returns=stack(batch.returns),
+            v_s=stack(batch.v_s),
+            logp_old=stack(batch.logp_old),
+            old_dist=Batch({key: stack(value) for key, value in batch.old_dist.items()}),
+        )
+
+    def _minibatch_indices(self, length: int, size: int) -> Iterator[torch.Tensor]:
+        """Per-seed shuffled sample indices, one [seeds, minibatch] tensor each."""
+        perms = np.stack([rng.permutation(length) for rng in self._np_rngs])
+        for start, stop in _split_bounds(length, size):
+            yield torch.as_tensor(perms[:, start:stop], device=self._device)
+
+    def _betas(self) -> torch.Tensor:
+        return torch.stack([policy._beta.detach() for policy in self.policies])
+
+    def _kl_stats(self, kl_div: torch.Tensor) -> torch.Tensor:
+        if self._kl_target_stat == "max":
+            return kl_div.detach().max(1).values
+        elif self._kl_target_stat == "mean":
+            return kl_div.detach().mean(1)
+        else:
+            raise ValueError("Unknown kl_target_stat", self._kl_target_stat)
+
+    def _step(self, loss: torch.Tensor, seeds: Sequence[int]) -> None:
+        """Backward the per-seed losses and step the optimizers of ``seeds``."""
+        for policy in self.policies:
+            policy.optim.zero_grad()
+        # seeds share no parameters, so the sum yields every seed's own gradient
+        loss.sum().backward()
+        for i in seeds:
+            policy = self.policies[i]
+            if self._grad_norm:  # clip large gradient
+                nn.utils.clip_grad_norm_(
+                    policy._actor_critic.parameters(), max_norm=self._grad_norm
+                )
+            policy.optim.step()
+
+    def _fixup(
+        self, data: Batch, beta_losses: List[List[torch.Tensor]]
+    ) -> np.ndarray:
+        num_seeds = len(self.policies)
+        fixup_grad_steps = np.zeros(num_seeds, dtype=int)
+        active = np.ones(num_seeds, dtype=bool)
+        while active.any():  # until every seed's constraint is satisfied
+            violated = np.zeros(num_seeds, dtype=bool)
+            for index in self._minibatch_indices(data.obs.shape[1],
+                                                 self._fixup_batchsize):
+                minibatch = _gather(data, index)
+                dist = self._dist_fn(*self._stacked.actor(minibatch.obs))
+                kl_div = snapshot_kl(minibatch.old_dist, dist)
+                violates = active & \
+                    (self._kl_stats(kl_div) > self._eps_kl).cpu().numpy()
+                if not violates.any():
+                    continue
+                violated |= violates
+                fixup_grad_steps += violates
+                mask = to_torch(violates, device=self._device, dtype=torch.float32)
+                seeds = np.nonzero(violates)[0]
+                self._step(self._betas() * kl_div.mean(1) * mask, seeds)
+                for i in seeds:
+                    beta_losses[i].append(self.policies[i]._optimize_beta(kl_div[i]))
+            active &= violated
+        return fixup_grad_steps
+
+    def learn(  # type: ignore
+        self, batch: Batch, batch_size: int, repeat: int, **kwargs: Any
+    ) -> Dict[str, Any]:
+        data = self._stack_seeds(batch)
+        num_seeds, length = data.obs.shape[:2]
+        all_seeds = range(num_seeds)
+        losses: Dict[str, List[torch.Tensor]] = {
+            key: []
+            for key in ["loss", "loss/pg", "loss/vf", "loss/ent", "loss/kl"]
+        }
+        beta_losses: List[List[torch.Tensor]] = [[] for _ in all_seeds]
+        fixup_grad_steps = np.zeros(num_seeds, dtype=int)
+        for step in range(repeat):
+            with self.timing.timeit("primary"):
+                for index in self._minibatch_indices(length, batch_size):
+                    minibatch = _gather(data, index)
+                    # calculate loss for actor
+                    dist = self._dist_fn(*self._stacked.actor(minibatch.obs))
+                    adv = minibatch.adv
+                    if self._norm_adv:
+                        mean, std = adv.mean(1, keepdim=True), adv.std(1, keepdim=True)
+                        adv = (adv - mean) / (std + self._eps)  # per-batch norm
+                    ratio = (snapshot_log_prob(dist, minibatch.act) -
+                             minibatch.logp_old).exp().float()
+                    pg_loss = -(ratio * adv).mean(1)
+                    kl_div = snapshot_kl(minibatch.old_dist, dist)
+                    kl_loss = self._betas() * kl_div.mean(1)
+                    # calculate loss for critic
+                    value = self._stacked.critic(minibatch.obs)
+                    if self._value_clip:
+                        v_clip = minibatch.v_s + (value - minibatch.v_s).clamp(
+                            -self._eps_clip, self._eps_clip
+                        )
+                        vf1 = (minibatch.returns - value).pow(2)
+                        vf2 = (minibatch.returns - v_clip).pow(2)
+                        vf_loss = torch.max(vf1, vf2).mean(1)
+                    else:
+                        vf_loss = (minibatch.returns - value).pow(2).mean(1)
+                    # calculate regularization and overall loss
+                    ent_loss = dist.entropy().mean(1)
+                    loss = pg_loss + self._weight_vf * vf_loss \
+                        - self._weight_ent * ent_loss + kl_loss
+                    self._step(loss, all_seeds)
+                    for key, value in zip(
+                        losses, [loss, pg_loss, vf_loss, ent_loss, kl_loss]
+                    ):
+                        losses[key].append(value.detach())
+                    for i in all_seeds:
+                        beta_losses[i].append(
+                            self.policies[i]._optimize_beta(kl_div[i])
+                        )
+
+            if self._fixup_loop and (self._fixup_every_repeat or step + 1 == repeat):
+                with self.timing.timeit("fixup"):
+                    fixup_grad_steps += self._fixup(data, beta_losses)
+
+        # one host sync for all metrics of all seeds
+        per_seed = {key: torch.stack(values, 1).tolist() for key, values in losses.items()}
+        flat_beta_losses = torch.stack(sum(beta_losses, [])).tolist()
+        betas = self._betas().tolist()
+        result: Dict[str, Any] = {}
+        offset = 0
+        for i, seed in enumerate(self.seeds):
+            prefix = f"seed{seed}/"
+            for key, values in per_seed.items():
+                result[prefix + key] = values[i]
+            result[prefix + "loss/beta"] = \
+                flat_beta_losses[offset:offset + len(beta_losses[i])]
+            offset += len(beta_losses[i])
+            result[prefix + "fixup_grad_steps"] = int(fixup_grad_steps[i])
+            result[prefix + "beta"] = betas[i]
+        return result
+
+
+class GroupedLogger(BaseLogger):
+    """Wrap a logger to also log collect statistics for every env group separately.
+
+    Aggregate statistics are logged by the wrapped logger as usual; whenever it
+    writes them, the reward, length and success rate of each group are written
+    along, under ``train/{name}/...`` and ``test/{name}/...``.
+
+    :param BaseLogger logger: the logger to write to.
+    :param names: the name of every group, e.g. "seed3" or a task name.
+    :param Collector train_collector: the collector whose results reach
+        ``log_train_data``, over a :class:`~metaworld_env_tianshou.GroupedVectorEnv`.
+    :param Collector test_collector: the same for ``log_test_data``.
+    """
+
+    def __init__(
+        self,
+        logger: BaseLogger,
+        names: Sequence[str],
+        train_collector: Collector,
+        test_collector: Collector,
+    ) -> None:
+        super().__init__(logger.train_interval, logger.test_interval,
+                         logger.update_interval)
+        self.logger = logger
+        self.names = list(names)
+        self._collectors = {"train": train_collector, "test": test_collector}
+
+    def _per_group(self, mode: str, collect_result: dict) -> LOG_DATA_TYPE:
+        collector = self._collectors[mode]
+        buffer = collector.buffer
+        # every env of a VectorReplayBuffer owns one equally sized sub-buffer
+        env_ids = collect_result["idxs"] // (
+            buffer.maxsize // getattr(buffer, "buffer_num", 1)
+        )
+        episode_groups = collector.env.env_group[env_ids]
+        log_data: LOG_DATA_TYPE = {}
+        for i, name in enumerate(self.names):
+            mask = episode_groups == i
+            if mask.any():
+                log_data[f"{mode}/{name}/reward"] = collect_result["rews"][mask].mean()
+                log_data[f"{mode}/{name}/length"] = collect_result["lens"][mask].mean()
+                log_data[f"{mode}/{name}/success_rate"] = \
+                    collect_result["successes"][mask].mean()
+        return log_data
+
+    def write(self, step_type: str, step: int, data: LOG_DATA_TYPE) -> None:
+        self.logger.write(step_type, step, data)
+
+    def log_train_data(self, collect_result: dict, step: int) -> None:
+        self.logger.log_train_data(collect_result, step)
+        if self.logger.last_log_train_step == step:
+            self.write("train/env_step", step, self._per_group("train", collect_result))
+
+    def log_test_data(self, collect_result: dict, step: int) -> None:
+        self.logger.log_test_data(collect_result, step)
+        if self.logger.last_log_test_step == step:
+            self.write("test/env_step", step, self._per_group("test", collect_result))
+
+    def log_update_data(self, update_result: dict, step: int) -> None:
+        self.logger.log_update_data(update_result, step)
+
+    def save_data(
+        self,
+        epoch: int,
+        env_step: int,
+        gradient_step: int,
+        save_checkpoint_fn: Optional[Callable[[int, int, int], str]] = None,
+    ) -> None:
+        self.logger.save_data(epoch, env_step, gradient_step, save_checkpoint_fn)
+
+    def restore_data(self) -> Tuple[int, int, int]:
+        return self.logger.restore_data()
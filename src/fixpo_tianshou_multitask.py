@@ -0,0 +1,55 @@
+from typing import Any
+
+import torch
+
+from tianshou.data import Batch, to_torch
+
+from fixpo_tianshou import FixPOPolicy
+
+
+class MultiTaskFixPOPolicy(FixPOPolicy):
+    """FixPO on one task-tagged batch gathered from several tasks at once.
+
+    Every sample carries the index of its task in ``info.task``, as added by
+    :class:`~metaworld_env_tianshou.GroupedVectorEnv` with ``group_key="task"``.
+    The update runs over the combined batch like plain FixPO.
+
+    :param int num_tasks: the number of tasks.
+    :param bool per_task_kl: in the fixup phase, require the KL constraint to hold
+        within every task of a minibatch instead of only over the whole minibatch.
+        With ``kl_target_stat="max"`` both are the same. Default to False.
+
+    .. seealso::
+
+        Please refer to :class:`FixPOPolicy` for the other parameters.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        num_tasks: int,
+        per_task_kl: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self._num_tasks = num_tasks
+        self._per_task_kl = per_task_kl
+
+    def _task_kl_stats(self, kl_div: torch.Tensor, batch: Batch) -> torch.Tensor:
+        """The KL statistic of every task, 0 for tasks without samples in batch."""
+        task = to_torch(batch.info.task, device=kl_div.device, dtype=torch.long)
+        kl_div = kl_div.detach()
+        if self._kl_target_stat == "max":
+            return kl_div.new_zeros(self._num_tasks).scatter_reduce(
+                0, task, kl_div, "amax", include_self=False
+            )
+        elif self._kl_target_stat == "mean":
+            total = kl_div.new_zeros(self._num_tasks).index_add_(0, task, kl_div)
+            return total / torch.bincount(task, minlength=self._num_tasks).clamp(min=1)
+        else:
+            raise ValueError("Unknown kl_target_stat", self._kl_target_stat)
+
+    def _violates_constraint(self, kl_div: torch.Tensor, batch: Batch):
+        if not self._per_task_kl:
+            return super()._violates_constraint(kl_div, batch)
+        return (self._task_kl_stats(kl_div, batch) > self._eps_kl).any()
@@ -0,0 +1,232 @@
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from tianshou.data import Batch
+
+from fixpo_tianshou import FixPOPolicy
+
+
+class SharedMemoryAllReduce:
+    """All-reduce between the processes of one node through shared memory.
+
+    Local stand-in for a gloo process group: every rank writes its tensor into its
+    own row of a shared buffer, and after a barrier every rank reduces all rows in
+    the same order, so all ranks get bitwise identical results.
+
+    :param int world_size: number of participating processes.
+    :param int numel: the largest number of elements reduced at once.
+    """
+
+    def __init__(self, world_size: int, numel: int, context: Any) -> None:
+        self.world_size = world_size
+        self.rank = 0
+        self._buffer = torch.zeros(world_size, numel).share_memory_()
+        self._barrier = context.Barrier(world_size)
+
+    def all_reduce(self, tensor: torch.Tensor, op: str = "sum") -> torch.Tensor:
+        flat = tensor.detach().reshape(-1)
+        rows = self._buffer[:, :flat.numel()]
+        rows[self.rank] = flat
+        self._barrier.wait()
+        if op == "sum":
+            result = rows.sum(0)
+        elif op == "max":
+            result = rows.max(0).values
+        else:
+            raise ValueError("Unknown all_reduce op", op)
+        # nobody may overwrite their row before every rank has read it
+        self._barrier.wait()
+        return result.reshape(tensor.shape).to(tensor.dtype)
+
+    def abort(self) -> None:
+        """Break the barrier so that no rank waits for a failed one forever."""
+        self._barrier.abort()
+
+    def broadcast(self, tensor: torch.Tensor, src: int = 0) -> torch.Tensor:
+        flat = tensor.detach().reshape(-1)
+        if self.rank == src:
+            self._buffer[src, :flat.numel()] = flat
+        self._barrier.wait()
+        result = self._buffer[src, :flat.numel()].clone()
+        self._barrier.wait()
+        return result.reshape(tensor.shape).to(tensor.dtype)
+
+
+class DataParallelFixPOPolicy(FixPOPolicy):
+    """FixPO with ``learn()`` sharded across CPU processes on one node.
+
+    The calling process is rank 0 and forks ``num_learners - 1`` workers the first
+    time ``learn()`` runs. Each call shards the batch across all ranks, gradients
+    are averaged after every backward pass, and the KL statistic used by the beta
+    update and by the fixup constraint check is reduced over all ranks, so the
+    parameters, beta and the fixup loop exit stay identical on every rank.
+
+    Only the "full" and "bisect" fixup strategies are supported, and
+    ``recompute_advantage`` is not, since workers never see the replay buffer.
+
+    :param int num_learners: total number of processes taking part in ``learn()``,
+        including the calling one. Default to 2.
+    :param int learner_threads: torch threads used by each worker. Default to 1.
+
+    .. seealso::
+
+        Please refer to :class:`FixPOPolicy` for the other parameters.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        num_learners: int = 2,
+        learner_threads: int = 1,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        if self._fixup_strategy == "indexed":
+            raise ValueError("The indexed fixup strategy can't run data-parallel")
+        if self._recompute_adv:
+            raise ValueError("recompute_advantage can't run data-parallel")
+        assert num_learners >= 1
+        # the workers are forked and all-reduce through CPU shared memory
+        for name, param in self._actor_critic.named_parameters():
+            if param.device.type != "cpu":
+                raise ValueError(
+                    "DataParallelFixPOPolicy only runs on CPU, but parameter "
+                    f"{name} is on {param.device}."
+                )
+        self._num_learners = num_learners
+        self._learner_threads = learner_threads
+        self._comm: Optional[SharedMemoryAllReduce] = None
+        self._conns: List[Any] = []
+        self._workers: List[Any] = []
+        self._num_minibatch: Dict[int, int] = {}
+
+    def _synced_params(self) -> List[torch.nn.Parameter]:
+        return list(self._actor_critic.parameters()) + [self._beta]
+
+    def _start_workers(self) -> None:
+        # fork, so workers get a copy of the policy including a closure dist_fn
+        context = mp.get_context("fork")
+        numel = sum(param.numel() for param in self._synced_params())
+        self._comm = SharedMemoryAllReduce(self._num_learners, max(numel, 2), context)
+        for rank in range(1, self._num_learners):
+            parent_conn, child_conn = context.Pipe()
+            worker = context.Process(
+                target=self._worker_loop, args=(rank, child_conn), daemon=True
+            )
+            worker.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._workers.append(worker)
+
+    def _worker_loop(self, rank: int, conn: Any) -> None:
+        assert self._comm is not None
+        self._comm.rank = rank
+        self._conns, self._workers = [], []
+        torch.set_num_threads(self._learner_threads)
+        while True:
+            command = conn.recv()
+            if command is None:
+                break
+            shard, batch_size, repeat, num_minibatch, lrs = command
+            for param_group, lr in zip(self.optim.param_groups, lrs):
+                param_group["lr"] = lr
+            try:
+                self._learn_shard(shard, batch_size, repeat, num_minibatch)
+            except BaseException:
+                self._comm.abort()
+                raise
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        for conn in self._conns:
+            conn.send(None)
+        for worker in self._workers:
+            worker.join()
+        self._conns, self._workers, self._comm = [], [], None
+
+    def _kl_stat(self, kl_div: torch.Tensor) -> torch.Tensor:
+        if self._comm is None:
+            return super()._kl_stat(kl_div)
+        kl_div = kl_div.detach()
+        if self._kl_target_stat == "max":
+            return self._comm.all_reduce(kl_div.max(), op="max")
+        elif self._kl_target_stat == "mean":
+            total = torch.stack([kl_div.sum(), torch.tensor(float(len(kl_div)))])
+            total = self._comm.all_reduce(total)
+            return total[0] / total[1]
+        else:
+            raise ValueError("Unknown kl_target_stat", self._kl_target_stat)
+
+    def _sync_grads(self) -> None:
+        if self._comm is None:
+            return
+        params = [
+            param for param in self._actor_critic.parameters()
+            if param.grad is not None
+        ]
+        flat_grad = torch.cat([param.grad.reshape(-1) for param in params])
+        flat_grad = self._comm.all_reduce(flat_grad) / self._num_learners
+        offset = 0
+        for param in params:
+            numel = param.numel()
+            param.grad.copy_(flat_grad[offset:offset + numel].view_as(param.grad))
+            offset += numel
+
+    def _sync_params(self) -> None:
+        """Copy rank 0's parameters to every rank, e.g. after a checkpoint load."""
+        assert self._comm is not None
+        params = self._synced_params()
+        flat = torch.cat([param.detach().reshape(-1) for param in params])
+        flat = self._comm.broadcast(flat)
+        offset = 0
+        with torch.no_grad():
+            for param in params:
+                numel = param.numel()
+                param.copy_(flat[offset:offset + numel].view_as(param))
+                offset += numel
+
+    def _minibatches(self, batch: Batch, size: int) -> Iterator[Batch]:
+        if self._comm is None:
+            return super()._minibatches(batch, size)
+        # Every rank must take the same number of steps, so split the shard into
+        # as many minibatches as the whole batch would have been split into.
+        # Like Batch.split(contiguous=True), shuffle once and yield views.
+        num_minibatch = self._num_minibatch[size]
+        bounds = np.arange(num_minibatch + 1) * len(batch) // num_minibatch
+        permuted = batch[np.random.permutation(len(batch))]
+        return (permuted[start:end] for start, end in zip(bounds[:-1], bounds[1:]))
+
+    def _learn_shard(
+        self,
+        shard: Batch,
+        batch_size: int,
+        repeat: int,
+        num_minibatch: Dict[int, int],
+    ) -> Dict[str, Any]:
+        self._num_minibatch = num_minibatch
+        self._sync_params()
+        return super().learn(shard, batch_size, repeat)
+
+    def learn(  # type: ignore
+        self, batch: Batch, batch_size: int, repeat: int, **kwargs: Any
+    ) -> Dict[str, Any]:
+        if self._num_learners == 1:
+            return super().learn(batch, batch_size, repeat, **kwargs)
+        if self._comm is None:
+            self._start_workers()
+        shards = np.array_split(np.random.permutation(len(batch)), self._num_learners)
+        num_minibatch = {
+            size: max(len(batch) // size, 1)
+            for size in (batch_size, self._fixup_batchsize)
+        }
+        lrs = [param_group["lr"] for param_group in self.optim.param_groups]
+        for conn, indices in zip(self._conns, shards[1:]):
+            conn.send((batch[indices], batch_size, repeat, num_minibatch, lrs))
+        try:
+            return self._learn_shard(batch[shards[0]], batch_size, repeat, num_minibatch)
+        except BaseException:
+            self._comm.abort()
+            raise
@@ -1,9 +1,32 @@
-from tianshou.env import ShmemVectorEnv, VectorEnvNormObs
+import numpy as np
 
+from tianshou.env import BaseVectorEnv, ShmemVectorEnv, VectorEnvNormObs
+
+import metaworld
 from metaworld.envs import ALL_V2_ENVIRONMENTS_GOAL_OBSERVABLE
 import gymnasium as gym
 from gymnasium.wrappers import TimeLimit
 
+# The scalar fields of the info dicts of MetaWorld envs. Collectors read them straight
+# into typed arrays, see the info_schema argument of Collector.
+METAWORLD_INFO_SCHEMA = {
+    "success": bool,
+    "near_object": np.float32,
+    "grasp_success": np.float32,
+    "grasp_reward": np.float32,
+    "in_place_reward": np.float32,
+    "obj_to_target": np.float32,
+    "unscaled_reward": np.float32,
+}
+
+
+def metaworld_info_schema(group_key=None):
+    """The info schema of MetaWorld envs, plus the group index of a GroupedVectorEnv."""
+    if group_key is None:
+        return METAWORLD_INFO_SCHEMA
+    return {**METAWORLD_INFO_SCHEMA, group_key: np.int64}
+
+
 def gen_env(env_name: str):
     env = ALL_V2_ENVIRONMENTS_GOAL_OBSERVABLE[env_name + "-v2-goal-observable"](seed=0)
     env.seeded_rand_vec = True
@@ -25,3 +48,159 @@ def make_metaworld_env(task, seed, training_num, test_num, obs_norm):
         test_envs = VectorEnvNormObs(test_envs, update_obs_rms=False)
         test_envs.set_obs_rms(train_envs.get_obs_rms())
     return env, train_envs, test_envs
+
+
+class GroupedVectorEnv(BaseVectorEnv):
+    """The vectorized envs of several groups (seeds, tasks), one after another.
+
+    Every group keeps its own env workers and observation normalization. Each info
+    dict returned by reset() and step() gets a ``group_key`` entry with the index of
+    the group its env belongs to, and "env_id" is the id in this combined env.
+
+    :param venvs: one vectorized env per group.
+    :param str group_key: the info key holding the group index. Default to "seed".
+    :param bool append_group_id: append a one-hot encoding of the group to the
+        (normalized) observations, e.g. to tell tasks apart. Default to False.
+    """
+
+    def __init__(self, venvs, group_key="seed", append_group_id=False):
+        self.venvs = venvs
+        self.group_key = group_key
+        self.append_group_id = append_group_id
+        self.is_async = False
+        self.is_closed = False
+        sizes = [len(venv) for venv in venvs]
+        self.env_num = sum(sizes)
+        # index of the group of every env, and the first env id of every group
+        self.env_group = np.repeat(np.arange(len(venvs)), sizes)
+        self._offset = np.cumsum([0] + sizes[:-1])
+
+    def __len__(self):
+        return self.env_num
+
+    def _groups(self, id):
+        """Yield (group, positions in id, ids inside the group's venv) per group."""
+        id = np.asarray(self._wrap_id(id))
+        groups = self.env_group[id]
+        for group in np.unique(groups):
+            pos = np.nonzero(groups == group)[0]
+            yield group, pos, id[pos] - self._offset[group]
+
+    def get_env_attr(self, key, id=None):
+        result = [None] * len(self._wrap_id(id))
+        for group, pos, local_id in self._groups(id):
+            for p, value in zip(pos, self.venvs[group].get_env_attr(key, local_id)):
+                result[p] = value
+        return result
+
+    def set_env_attr(self, key, value, id=None):
+        for group, _, local_id in self._groups(id):
+            self.venvs[group].set_env_attr(key, value, local_id)
+
+    def _tag_info(self, info, group, env_id):
+        return {**info, self.group_key: group, "env_id": env_id}
+
+    def _with_group_id(self, obs, id):
+        if not self.append_group_id:
+            return obs
+        one_hot = np.eye(len(self.venvs), dtype=obs.dtype)[self.env_group[id]]
+        return np.concatenate([obs.reshape(len(obs), -1), one_hot], axis=1)
+
+    def reset(self, id=None, **kwargs):
+        id = np.asarray(self._wrap_id(id))
+        obs, infos = None, [None] * len(id)
+        for group, pos, local_id in self._groups(id):
+            group_obs, group_infos = self.venvs[group].reset(local_id, **kwargs)
+            if obs is None:
+                obs = np.empty((len(id), *group_obs.shape[1:]), group_obs.dtype)
+            obs[pos] = group_obs
+            for p, info in zip(pos, group_infos):
+                infos[p] = self._tag_info(info, group, id[p])
+        return self._with_group_id(obs, id), infos
+
+    def step(self, action, id=None):
+        id = np.asarray(self._wrap_id(id))
+        results = None
+        for group, pos, local_id in self._groups(id):
+            group_results = self.venvs[group].step(action[pos], local_id)
+            if results is None:
+                results = [
+                    np.empty((len(id), *value.shape[1:]), value.dtype)
+                    for value in group_results
+                ]
+            for result, value in zip(results, group_results):
+                result[pos] = value
+            for p in pos:
+                results[-1][p] = self._tag_info(results[-1][p], group, id[p])
+        results[0] = self._with_group_id(results[0], id)
+        return tuple(results)
+
+    def seed(self, seed=None):
+        """Seed every group's venv; ``seed`` is None or holds one entry per group."""
+        seeds = [None] * len(self.venvs) if seed is None else seed
+        assert len(seeds) == len(self.venvs)
+        return sum([venv.seed(s) for venv, s in zip(self.venvs, seeds)], [])
+
+    def render(self, **kwargs):
+        return sum([venv.render(**kwargs) for venv in self.venvs], [])
+
+    def close(self):
+        for venv in self.venvs:
+            venv.close()
+        self.is_closed = True
+
+    def get_obs_rms(self):
+        """Return the observation running mean/std of every group."""
+        return [venv.get_obs_rms() for venv in self.venvs]
+
+    def set_obs_rms(self, obs_rms):
+        """Set the observation running mean/std of every group."""
+        for venv, rms in zip(self.venvs, obs_rms):
+            venv.set_obs_rms(rms)
+
+
+def make_metaworld_multiseed_env(task, seeds, training_num, test_num, obs_norm):
+    """Build the envs of make_metaworld_env once per seed and concatenate them.
+
+    :return: a tuple of (single env, training envs, test envs), where the
+        vectorized envs are :class:`GroupedVectorEnv`.
+    """
+    envs = [
+        make_metaworld_env(task, seed, training_num, test_num, obs_norm)
+        for seed in seeds
+    ]
+    train_envs = GroupedVectorEnv([train_envs for _, train_envs, _ in envs])
+    test_envs = GroupedVectorEnv([test_envs for _, _, test_envs in envs])
+    return envs[0][0], train_envs, test_envs
+
+
+def metaworld_benchmark_tasks(benchmark, seed):
+    """Names of the tasks of a multi-task benchmark like "MT10" or "MT50"."""
+    env_names = getattr(metaworld, benchmark)(seed=seed).train_classes
+    return [env_name[:-len("-v2")] for env_name in env_names]
+
+
+def make_metaworld_multitask_env(tasks, seed, training_num, test_num, obs_norm):
+    """Build the envs of make_metaworld_env once per task and concatenate them.
+
+    Observations get a one-hot task id appended after the per-task normalization,
+    and infos a "task" entry with the task index.
+
+    :return: a tuple of (single env, training envs, test envs), where the
+        vectorized envs are :class:`GroupedVectorEnv`.
+    """
+    envs = [
+        make_metaworld_env(task, seed, training_num, test_num, obs_norm)
+        for task in tasks
+    ]
+    train_envs = GroupedVectorEnv(
+        [train_envs for _, train_envs, _ in envs],
+        group_key="task",
+        append_group_id=True,
+    )
+    test_envs = GroupedVectorEnv(
+        [test_envs for _, _, test_envs in envs],
+        group_key="task",
+        append_group_id=True,
+    )
+    return envs[0][0], train_envs, test_envs
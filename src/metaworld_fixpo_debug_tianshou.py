@@ -13,14 +13,14 @@ from torch.distributions import Independent, Normal, Beta
 from torch.optim.lr_scheduler import LambdaLR
 from torch.utils.tensorboard import SummaryWriter
 
-from tianshou.data import Collector, ReplayBuffer, VectorReplayBuffer
+from tianshou.data import FastCollector, ReplayBuffer, RolloutBuffer
 from tianshou.trainer import onpolicy_trainer
 from tianshou.utils import TensorboardLogger, WandbLogger
 from tianshou.utils.net.common import Net
 from tianshou.utils.net.continuous import ActorProb, Critic
 
 from mujoco_env_tianshou import make_mujoco_env
-from metaworld_env_tianshou import make_metaworld_env
+from metaworld_env_tianshou import make_metaworld_env, metaworld_info_schema
 from fixpo_tianshou_debug import FixPOPolicy
 
 
@@ -69,6 +69,8 @@ def get_args():
     parser.add_argument("--resume-id", type=str, default=None)
     parser.add_argument("--gen-plots", type=int, default=0)
     parser.add_argument("--gen-behavior", type=int, default=0)
+    parser.add_argument("--trace-kl", type=int, default=0)
+    parser.add_argument("--trace-refresh-every", type=int, default=0)
     parser.add_argument(
         "--logger",
         type=str,
@@ -189,6 +191,8 @@ def run_fixpo(args=get_args()):
         log_dir=args.log_dir,
         gen_plots=bool(args.gen_plots),
         gen_behavior=bool(args.gen_behavior),
+        trace_kl=bool(args.trace_kl),
+        trace_refresh_every=args.trace_refresh_every,
     )
 
     # load a previous policy
@@ -223,11 +227,21 @@ def run_fixpo(args=get_args()):
 
     # collector
     if args.training_num > 1:
-        buffer = VectorReplayBuffer(args.buffer_size, len(train_envs))
+        buffer = RolloutBuffer(args.buffer_size, len(train_envs))
     else:
         buffer = ReplayBuffer(args.buffer_size)
-    train_collector = Collector(policy, train_envs, buffer, exploration_noise=True)
-    test_collector = Collector(policy, test_envs)
+    info_schema = metaworld_info_schema()
+    train_collector = FastCollector(
+        policy,
+        train_envs,
+        buffer,
+        exploration_noise=True,
+        info_schema=info_schema,
+        drop_unknown_info=True,
+    )
+    test_collector = FastCollector(
+        policy, test_envs, info_schema=info_schema, drop_unknown_info=True
+    )
 
     # logger
     if args.logger == "wandb":
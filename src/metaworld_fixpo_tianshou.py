@@ -13,21 +13,38 @@ from torch.distributions import Independent, Normal, Beta
 from torch.optim.lr_scheduler import LambdaLR
 from torch.utils.tensorboard import SummaryWriter
 
-from tianshou.data import Collector, ReplayBuffer, VectorReplayBuffer
-from tianshou.trainer import onpolicy_trainer
-from tianshou.utils import TensorboardLogger, WandbLogger
+from tianshou.data import FastCollector, ReplayBuffer, RolloutBuffer, VectorReplayBuffer
+from tianshou.trainer import BackgroundEvaluator, onpolicy_trainer
+from tianshou.utils import (
+    AsyncLogger,
+    EpochProfiler,
+    TensorboardLogger,
+    WandbLogger,
+)
 from tianshou.utils.net.common import Net
 from tianshou.utils.net.continuous import ActorProb, Critic
 
 from mujoco_env_tianshou import make_mujoco_env
-from metaworld_env_tianshou import make_metaworld_env
+from metaworld_env_tianshou import (
+    make_metaworld_env,
+    make_metaworld_multiseed_env,
+    metaworld_info_schema,
+)
 from fixpo_tianshou import FixPOPolicy
+from fixpo_tianshou_parallel import DataParallelFixPOPolicy
+from fixpo_tianshou_multiseed import GroupedLogger, MultiSeedFixPOPolicy
 
 
 def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--env", type=str, default="pick-place")
     parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--num-seeds",
+        type=int,
+        default=1,
+        help="train seeds seed, seed + 1, ... in one process with stacked networks",
+    )
     parser.add_argument("--buffer-size", type=int, default=10_000)
     parser.add_argument("--hidden-sizes", type=int, nargs="*", default=[128, 128])
     parser.add_argument("--lr", type=float, default=3e-4)
@@ -55,12 +72,32 @@ def get_args():
     parser.add_argument("--value-clip", type=int, default=1)
     parser.add_argument("--dist", type=str, default="normal")
     parser.add_argument("--norm-adv", type=int, default=0)
+    parser.add_argument("--device-gae", type=int, default=0)
     parser.add_argument("--recompute-adv", type=int, default=0)
     parser.add_argument("--render", type=float, default=0.0)
     parser.add_argument("--fixup-loop", type=int, default=1)
     parser.add_argument("--fixup-every-repeat", type=int, default=1)
     parser.add_argument("--kl-target-stat", type=str, default="max")
+    parser.add_argument("--deferred-metrics", type=int, default=0)
+    parser.add_argument("--max-batchsize", type=int, default=2048)
+    parser.add_argument(
+        "--fixup-strategy",
+        type=str,
+        default="full",
+        choices=["full", "indexed", "bisect"],
+    )
+    parser.add_argument("--fixup-bisect-steps", type=int, default=8)
+    parser.add_argument("--num-learners", type=int, default=1)
+    parser.add_argument("--learner-threads", type=int, default=1)
     parser.add_argument("--target-coeff", type=float, default=3.0)
+    parser.add_argument("--background-eval", type=int, default=0)
+    parser.add_argument("--timing", type=int, default=0)
+    # > 0: write the logs from a background thread in batches of this many seconds
+    parser.add_argument("--log-flush-interval", type=float, default=0.0)
+    parser.add_argument("--profile-epoch", type=int, default=0)
+    parser.add_argument(
+        "--profile-backend", type=str, default="torch", choices=["torch", "cprofile"]
+    )
     parser.add_argument(
         "--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu"
     )
@@ -86,19 +123,11 @@ def get_args():
     return parser.parse_args()
 
 
-def run_fixpo(args=get_args()):
-    env, train_envs, test_envs = make_metaworld_env(
-        args.env, args.seed, args.training_num, args.test_num, obs_norm=True
-    )
-    args.state_shape = env.observation_space.shape or env.observation_space.n
-    args.action_shape = env.action_space.shape or env.action_space.n
-    args.max_action = env.action_space.high[0]
-    print("Observations shape:", args.state_shape)
-    print("Actions shape:", args.action_shape)
-    print("Action range:", np.min(env.action_space.low), np.max(env.action_space.high))
-    # seed
-    np.random.seed(args.seed)
-    torch.manual_seed(args.seed)
+def make_fixpo_policy(args, env):
+    """Build the actor, critic, optimizer and FixPOPolicy for one seed."""
+    if args.num_learners > 1:
+        # data-parallel learners are forked CPU processes
+        args.device = "cpu"
     # model
     net_a = Net(
         args.state_shape,
@@ -160,7 +189,14 @@ def run_fixpo(args=get_args()):
         else:
             raise ValueError(f"Only 'normal' and 'beta' dist. supported. Got {dist}")
 
-    policy = FixPOPolicy(
+    policy_kwargs = {}
+    policy_cls = FixPOPolicy
+    if args.num_learners > 1:
+        policy_cls = DataParallelFixPOPolicy
+        policy_kwargs = dict(
+            num_learners=args.num_learners, learner_threads=args.learner_threads
+        )
+    policy = policy_cls(
         actor,
         critic,
         optim,
@@ -180,11 +216,47 @@ def run_fixpo(args=get_args()):
         fixup_batchsize=args.fixup_batchsize,
         fixup_loop=args.fixup_loop,
         fixup_every_repeat=args.fixup_every_repeat,
+        fixup_strategy=args.fixup_strategy,
+        fixup_bisect_steps=args.fixup_bisect_steps,
+        deferred_metrics=args.deferred_metrics,
+        max_batchsize=args.max_batchsize,
         target_coeff=args.target_coeff,
         value_clip=args.value_clip,
         advantage_normalization=args.norm_adv,
+        device_gae=bool(args.device_gae),
         recompute_advantage=args.recompute_adv,
+        **policy_kwargs,
     )
+    return policy
+
+
+def make_profiler(args):
+    """Profile the epoch given by --profile-epoch into the log dir, if any."""
+    if not args.profile_epoch:
+        return None
+    suffix = ".json" if args.profile_backend == "torch" else ".prof"
+    return EpochProfiler(
+        os.path.join(args.log_dir, f"profile_epoch{args.profile_epoch}{suffix}"),
+        start_epoch=args.profile_epoch,
+        backend=args.profile_backend,
+    )
+
+
+def run_fixpo(args=get_args()):
+    env, train_envs, test_envs = make_metaworld_env(
+        args.env, args.seed, args.training_num, args.test_num, obs_norm=True
+    )
+    args.state_shape = env.observation_space.shape or env.observation_space.n
+    args.action_shape = env.action_space.shape or env.action_space.n
+    args.max_action = env.action_space.high[0]
+    print("Observations shape:", args.state_shape)
+    print("Actions shape:", args.action_shape)
+    print("Action range:", np.min(env.action_space.low), np.max(env.action_space.high))
+    # seed
+    np.random.seed(args.seed)
+    torch.manual_seed(args.seed)
+    policy = make_fixpo_policy(args, env)
+    actor, critic = policy.actor, policy.critic
 
     # load a previous policy
     if args.base_task_path:
@@ -218,11 +290,43 @@ def run_fixpo(args=get_args()):
 
     # collector
     if args.training_num > 1:
-        buffer = VectorReplayBuffer(args.buffer_size, len(train_envs))
+        buffer = RolloutBuffer(args.buffer_size, len(train_envs))
     else:
         buffer = ReplayBuffer(args.buffer_size)
-    train_collector = Collector(policy, train_envs, buffer, exploration_noise=True)
-    test_collector = Collector(policy, test_envs)
+    info_schema = metaworld_info_schema()
+    train_collector = FastCollector(
+        policy,
+        train_envs,
+        buffer,
+        exploration_noise=True,
+        info_schema=info_schema,
+        drop_unknown_info=True,
+    )
+    test_collector = FastCollector(
+        policy, test_envs, info_schema=info_schema, drop_unknown_info=True
+    )
+
+    # test the snapshots in a separate process, with its own CPU policy and envs
+    evaluator = None
+    if args.background_eval and not args.watch:
+
+        def eval_collector_fn():
+            torch.set_num_threads(1)
+            eval_args = copy.copy(args)
+            eval_args.device = "cpu"
+            eval_args.num_learners = 1
+            eval_env, eval_train_envs, eval_test_envs = make_metaworld_env(
+                args.env, args.seed, 1, args.test_num, obs_norm=True
+            )
+            eval_train_envs.close()
+            return FastCollector(
+                make_fixpo_policy(eval_args, eval_env),
+                eval_test_envs,
+                info_schema=info_schema,
+                drop_unknown_info=True,
+            )
+
+        evaluator = BackgroundEvaluator(eval_collector_fn, train_envs.get_obs_rms)
 
     # logger
     if args.logger == "wandb":
@@ -241,9 +345,15 @@ def run_fixpo(args=get_args()):
         logger = TensorboardLogger(writer)
     else:  # wandb
         logger.load(writer)
+    if args.log_flush_interval > 0:
+        logger = AsyncLogger(logger, args.log_flush_interval)
 
     def save_best_fn(policy):
-        state = {"model": policy.state_dict(), "obs_rms": train_envs.get_obs_rms()}
+        # a background result comes with the statistics of its own snapshot
+        obs_rms = evaluator.obs_rms if evaluator else None
+        if obs_rms is None:
+            obs_rms = train_envs.get_obs_rms()
+        state = {"model": policy.state_dict(), "obs_rms": obs_rms}
         torch.save(state, os.path.join(args.log_dir, "policy.pth"))
 
     if not args.watch:
@@ -251,7 +361,7 @@ def run_fixpo(args=get_args()):
         result = onpolicy_trainer(
             policy,
             train_collector,
-            test_collector,
+            None if evaluator else test_collector,
             args.epoch,
             args.step_per_epoch,
             args.repeat_per_collect,
@@ -261,8 +371,17 @@ def run_fixpo(args=get_args()):
             save_best_fn=save_best_fn,
             logger=logger,
             test_in_train=False,
+            timing=bool(args.timing),
+            profiler=make_profiler(args),
+            evaluator=evaluator,
         )
         pprint.pprint(result)
+        if isinstance(logger, AsyncLogger):
+            logger.close()
+        if evaluator:
+            evaluator.close()
+        if isinstance(policy, DataParallelFixPOPolicy):
+            policy.close()
 
     # Let's watch its performance!
     policy.eval()
@@ -272,5 +391,122 @@ def run_fixpo(args=get_args()):
     print(f'Final reward: {result["rews"].mean()}, length: {result["lens"].mean()}')
 
 
+def run_fixpo_multiseed(args=get_args()):
+    seeds = [args.seed + i for i in range(args.num_seeds)]
+    env, train_envs, test_envs = make_metaworld_multiseed_env(
+        args.env, seeds, args.training_num, args.test_num, obs_norm=True
+    )
+    args.state_shape = env.observation_space.shape or env.observation_space.n
+    args.action_shape = env.action_space.shape or env.action_space.n
+    args.max_action = env.action_space.high[0]
+    print("Seeds:", seeds)
+    print("Observations shape:", args.state_shape)
+    print("Actions shape:", args.action_shape)
+    print("Action range:", np.min(env.action_space.low), np.max(env.action_space.high))
+    policies = []
+    for seed in seeds:
+        # the same initialization as a single-seed run with this seed
+        np.random.seed(seed)
+        torch.manual_seed(seed)
+        policies.append(make_fixpo_policy(args, env))
+    policy = MultiSeedFixPOPolicy(policies, seeds)
+
+    def seed_path(seed):
+        return f"policy_seed{seed}.pth"
+
+    # load a previous policy, saved by save_best_fn below
+    if args.resume_path:
+        obs_rms = []
+        for seed, seed_policy in zip(seeds, policies):
+            ckpt = torch.load(
+                os.path.join(args.resume_path, seed_path(seed)), map_location=args.device
+            )
+            seed_policy.load_state_dict(ckpt["model"])
+            obs_rms.append(ckpt["obs_rms"])
+        train_envs.set_obs_rms(obs_rms)
+        test_envs.set_obs_rms(obs_rms)
+        print("Loaded agents from: ", args.resume_path)
+
+    # collector, every seed collects step_per_collect steps per update
+    buffer = VectorReplayBuffer(args.buffer_size * args.num_seeds, len(train_envs))
+    info_schema = metaworld_info_schema("seed")
+    train_collector = FastCollector(
+        policy,
+        train_envs,
+        buffer,
+        exploration_noise=True,
+        info_schema=info_schema,
+        drop_unknown_info=True,
+    )
+    test_collector = FastCollector(
+        policy, test_envs, info_schema=info_schema, drop_unknown_info=True
+    )
+
+    # logger
+    if args.logger == "wandb":
+        os.environ["WANDB_RUN_GROUP"] = args.wandb_group
+        logger = WandbLogger(
+            save_interval=1,
+            name=None,
+            entity=args.wandb_entity,
+            run_id=args.resume_id,
+            config=args,
+            project=args.wandb_project,
+        )
+    writer = SummaryWriter(args.log_dir)
+    writer.add_text("args", str(args))
+    if args.logger == "tensorboard":
+        logger = TensorboardLogger(writer)
+    else:  # wandb
+        logger.load(writer)
+    logger = GroupedLogger(
+        logger, [f"seed{seed}" for seed in seeds], train_collector, test_collector
+    )
+    if args.log_flush_interval > 0:
+        logger = AsyncLogger(logger, args.log_flush_interval)
+
+    def save_best_fn(policy):
+        # one checkpoint per seed, in the format of a single-seed run
+        for seed, seed_policy, obs_rms in zip(
+            seeds, policy.policies, train_envs.get_obs_rms()
+        ):
+            state = {"model": seed_policy.state_dict(), "obs_rms": obs_rms}
+            torch.save(state, os.path.join(args.log_dir, seed_path(seed)))
+
+    if not args.watch:
+        # trainer
+        result = onpolicy_trainer(
+            policy,
+            train_collector,
+            test_collector,
+            args.epoch,
+            args.step_per_epoch * args.num_seeds,
+            args.repeat_per_collect,
+            args.test_num * args.num_seeds,
+            args.batch_size,
+            step_per_collect=args.step_per_collect * args.num_seeds,
+            save_best_fn=save_best_fn,
+            logger=logger,
+            test_in_train=False,
+            timing=bool(args.timing),
+            profiler=make_profiler(args),
+        )
+        pprint.pprint(result)
+        if isinstance(logger, AsyncLogger):
+            logger.close()
+
+    # Let's watch its performance!
+    policy.eval()
+    test_envs.seed(seeds)
+    test_collector.reset()
+    result = test_collector.collect(
+        n_episode=args.test_num * args.num_seeds, render=args.render
+    )
+    print(f'Final reward: {result["rews"].mean()}, length: {result["lens"].mean()}')
+
+
 if __name__ == "__main__":
-    run_fixpo()
+    if get_args().num_seeds > 1:
+        run_fixpo_multiseed()
+    else:
+        run_fixpo()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import pprint
+import copy
+
+import numpy as np
+import torch
+from torch import nn
+from torch.distributions import Independent, Normal, Beta
+from torch.optim.lr_scheduler import LambdaLR
+from torch.utils.tensorboard import SummaryWriter
+
+from tianshou.data import FastCollector, VectorReplayBuffer
+from tianshou.trainer import onpolicy_trainer
+from tianshou.utils import TensorboardLogger, WandbLogger
+from tianshou.utils.net.common import Net
+from tianshou.utils.net.continuous import ActorProb, Critic
+
+from metaworld_env_tianshou import (
+    make_metaworld_multitask_env,
+    metaworld_benchmark_tasks,
+    metaworld_info_schema,
+)
+from fixpo_tianshou_multitask import MultiTaskFixPOPolicy
+from fixpo_tianshou_multiseed import GroupedLogger
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--benchmark", type=str, default="MT10", choices=["MT10", "MT50"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--buffer-size", type=int, default=10_000)
+    parser.add_argument("--hidden-sizes", type=int, nargs="*", default=[128, 128])
+    parser.add_argument("--lr", type=float, default=3e-4)
+    parser.add_argument("--gamma", type=float, default=0.99)
+    parser.add_argument("--epoch", type=int, default=400)
+    parser.add_argument("--step-per-epoch", type=int, default=50_000)
+    parser.add_argument("--step-per-collect", type=int, default=10_000)
+    parser.add_argument("--repeat-per-collect", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=500)
+    # per task, like the step and buffer counts above
+    parser.add_argument("--training-num", type=int, default=2)
+    parser.add_argument("--test-num", type=int, default=2)
+    # ppo special
+    parser.add_argument("--rew-norm", type=int, default=True)
+    parser.add_argument("--vf-coef", type=float, default=0.25)
+    parser.add_argument("--ent-coef", type=float, default=0.0)
+    parser.add_argument("--gae-lambda", type=float, default=0.95)
+    parser.add_argument("--bound-action-method", type=str, default="clip")
+    parser.add_argument("--lr-decay", type=int, default=True)
+    parser.add_argument("--max-grad-norm", type=float, default=0.5)
+    parser.add_argument("--eps-kl", type=float, default=0.5)
+    parser.add_argument("--beta-lr", type=float, default=0.01)
+    parser.add_argument("--init-beta", type=float, default=1.0)
+
+    parser.add_argument("--fixup-batchsize", type=int, default=5_000)
+    parser.add_argument("--value-clip", type=int, default=1)
+    parser.add_argument("--dist", type=str, default="normal")
+    parser.add_argument("--norm-adv", type=int, default=0)
+    parser.add_argument("--recompute-adv", type=int, default=0)
+    parser.add_argument("--render", type=float, default=0.0)
+    parser.add_argument("--fixup-loop", type=int, default=1)
+    parser.add_argument("--fixup-every-repeat", type=int, default=1)
+    parser.add_argument("--kl-target-stat", type=str, default="max")
+    parser.add_argument("--deferred-metrics", type=int, default=0)
+    parser.add_argument("--max-batchsize", type=int, default=2048)
+    parser.add_argument(
+        "--fixup-strategy",
+        type=str,
+        default="full",
+        choices=["full", "indexed", "bisect"],
+    )
+    parser.add_argument("--fixup-bisect-steps", type=int, default=8)
+    parser.add_argument(
+        "--per-task-kl",
+        type=int,
+        default=0,
+        help="require the fixup KL constraint to hold within every task",
+    )
+    parser.add_argument("--target-coeff", type=float, default=3.0)
+    parser.add_argument(
+        "--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    parser.add_argument("--resume-path", type=str, default=None)
+    parser.add_argument("--resume-id", type=str, default=None)
+    parser.add_argument("--log-dir", type=str)
+    parser.add_argument(
+        "--logger",
+        type=str,
+        default="wandb",
+        choices=["tensorboard", "wandb"],
+    )
+    parser.add_argument("--wandb-project", type=str, default="stabilized-rl")
+    parser.add_argument("--wandb-group", type=str, default="fixpo")
+    parser.add_argument("--wandb-entity", type=str, default=None)
+    parser.add_argument(
+        "--watch",
+        default=False,
+        action="store_true",
+        help="watch the play of pre-trained policy only",
+    )
+    return parser.parse_args()
+
+
+def make_fixpo_policy(args, env):
+    """Build the actor, critic, optimizer and the multi-task FixPOPolicy."""
+    # model
+    net_a = Net(
+        args.state_shape,
+        hidden_sizes=args.hidden_sizes,
+        activation=nn.Tanh,
+        device=args.device,
+    )
+    actor = ActorProb(
+        net_a,
+        args.action_shape,
+        max_action=args.max_action,
+        unbounded=True,
+        device=args.device,
+    ).to(args.device)
+    net_c = Net(
+        args.state_shape,
+        hidden_sizes=args.hidden_sizes,
+        activation=nn.Tanh,
+        device=args.device,
+    )
+    critic = Critic(net_c, device=args.device).to(args.device)
+    torch.nn.init.constant_(actor.sigma_param, -0.5)
+    for m in list(actor.modules()) + list(critic.modules()):
+        if isinstance(m, torch.nn.Linear):
+            # orthogonal initialization
+            torch.nn.init.orthogonal_(m.weight, gain=np.sqrt(2))
+            torch.nn.init.zeros_(m.bias)
+    # do last policy layer scaling, this will make initial actions have (close to)
+    # 0 mean and std, and will help boost performances,
+    # see https://arxiv.org/abs/2006.05990, Fig.24 for details
+    for m in actor.mu.modules():
+        if isinstance(m, torch.nn.Linear):
+            torch.nn.init.zeros_(m.bias)
+            m.weight.data.copy_(0.01 * m.weight.data)
+
+    optim = torch.optim.Adam(
+        list(actor.parameters()) + list(critic.parameters()), lr=args.lr
+    )
+
+    lr_scheduler = None
+    if args.lr_decay:
+        # decay learning rate to 0 linearly
+        max_update_num = (
+            np.ceil(args.step_per_epoch / args.step_per_collect) * args.epoch
+        )
+
+        lr_scheduler = LambdaLR(
+            optim, lr_lambda=lambda epoch: 1 - epoch / max_update_num
+        )
+
+    def dist(*logits):
+        if args.dist == "normal":
+            return Independent(Normal(*logits), 1)
+        elif args.dist == "beta":
+            alpha, beta = logits
+            alpha = nn.functional.softplus(alpha) + 1
+            beta = nn.functional.softplus(beta) + 1
+            return Independent(Beta(alpha, beta), 1)
+        else:
+            raise ValueError(f"Only 'normal' and 'beta' dist. supported. Got {dist}")
+
+    policy = MultiTaskFixPOPolicy(
+        actor,
+        critic,
+        optim,
+        dist,
+        discount_factor=args.gamma,
+        gae_lambda=args.gae_lambda,
+        max_grad_norm=args.max_grad_norm,
+        vf_coef=args.vf_coef,
+        ent_coef=args.ent_coef,
+        reward_normalization=args.rew_norm,
+        action_scaling=True,
+        action_bound_method=args.bound_action_method,
+        lr_scheduler=copy.deepcopy(lr_scheduler),
+        action_space=env.action_space,
+        eps_kl=args.eps_kl,
+        beta_lr=args.beta_lr,
+        fixup_batchsize=args.fixup_batchsize,
+        fixup_loop=args.fixup_loop,
+        fixup_every_repeat=args.fixup_every_repeat,
+        fixup_strategy=args.fixup_strategy,
+        fixup_bisect_steps=args.fixup_bisect_steps,
+        deferred_metrics=args.deferred_metrics,
+        max_batchsize=args.max_batchsize,
+        target_coeff=args.target_coeff,
+        value_clip=args.value_clip,
+        advantage_normalization=args.norm_adv,
+        recompute_advantage=args.recompute_adv,
+        num_tasks=args.num_tasks,
+        per_task_kl=args.per_task_kl,
+    )
+    return policy
+
+
+def run_fixpo_multitask(args=get_args()):
+    tasks = metaworld_benchmark_tasks(args.benchmark, args.seed)
+    args.num_tasks = len(tasks)
+    env, train_envs, test_envs = make_metaworld_multitask_env(
+        tasks, args.seed, args.training_num, args.test_num, obs_norm=True
+    )
+    # the observations carry a one-hot task id
+    args.state_shape = (np.prod(env.observation_space.shape) + args.num_tasks, )
+    args.action_shape = env.action_space.shape or env.action_space.n
+    args.max_action = env.action_space.high[0]
+    print("Tasks:", tasks)
+    print("Observations shape:", args.state_shape)
+    print("Actions shape:", args.action_shape)
+    print("Action range:", np.min(env.action_space.low), np.max(env.action_space.high))
+    # seed
+    np.random.seed(args.seed)
+    torch.manual_seed(args.seed)
+    policy = make_fixpo_policy(args, env)
+
+    # load a previous policy
+    if args.resume_path:
+        ckpt = torch.load(args.resume_path, map_location=args.device)
+        policy.load_state_dict(ckpt["model"])
+        train_envs.set_obs_rms(ckpt["obs_rms"])
+        test_envs.set_obs_rms(ckpt["obs_rms"])
+        print("Loaded agent from: ", args.resume_path)
+
+    # collector, rollouts of all tasks go into one task-tagged batch
+    buffer = VectorReplayBuffer(args.buffer_size * args.num_tasks, len(train_envs))
+    info_schema = metaworld_info_schema("task")
+    train_collector = FastCollector(
+        policy,
+        train_envs,
+        buffer,
+        exploration_noise=True,
+        info_schema=info_schema,
+        drop_unknown_info=True,
+    )
+    test_collector = FastCollector(
+        policy, test_envs, info_schema=info_schema, drop_unknown_info=True
+    )
+
+    # logger
+    if args.logger == "wandb":
+        os.environ["WANDB_RUN_GROUP"] = args.wandb_group
+        logger = WandbLogger(
+            save_interval=1,
+            name=None,
+            entity=args.wandb_entity,
+            run_id=args.resume_id,
+            config=args,
+            project=args.wandb_project,
+        )
+    writer = SummaryWriter(args.log_dir)
+    writer.add_text("args", str(args))
+    if args.logger == "tensorboard":
+        logger = TensorboardLogger(writer)
+    else:  # wandb
+        logger.load(writer)
+    # per-task reward and success rate next to the aggregate ones
+    logger = GroupedLogger(logger, tasks, train_collector, test_collector)
+
+    def save_best_fn(policy):
+        state = {"model": policy.state_dict(), "obs_rms": train_envs.get_obs_rms()}
+        torch.save(state, os.path.join(args.log_dir, "policy.pth"))
+
+    if not args.watch:
+        # trainer
+        result = onpolicy_trainer(
+            policy,
+            train_collector,
+            test_collector,
+            args.epoch,
+            args.step_per_epoch * args.num_tasks,
+            args.repeat_per_collect,
+            args.test_num * args.num_tasks,
+            args.batch_size,
+            step_per_collect=args.step_per_collect * args.num_tasks,
+            save_best_fn=save_best_fn,
+            logger=logger,
+            test_in_train=False,
+        )
+        pprint.pprint(result)
+
+    # Let's watch its performance!
+    policy.eval()
+    test_envs.seed([args.seed] * args.num_tasks)
+    test_collector.reset()
+    result = test_collector.collect(
+        n_episode=args.test_num * args.num_tasks, render=args.render
+    )
+    print(f'Final reward: {result["rews"].mean()}, length: {result["lens"].mean()}')
+    print(f'Final success rate: {result["success_rate"]}')
+
+
+if __name__ == "__main__":
+    run_fixpo_multitask()
@@ -12,7 +12,7 @@ from torch.distributions import Independent, Normal, Beta
 from torch.optim.lr_scheduler import LambdaLR
 from torch.utils.tensorboard import SummaryWriter
 
-from tianshou.data import Collector, ReplayBuffer, VectorReplayBuffer
+from tianshou.data import FastCollector, ReplayBuffer, RolloutBuffer
 from tianshou.trainer import onpolicy_trainer
 from tianshou.utils import TensorboardLogger, WandbLogger
 from tianshou.utils.net.common import Net
@@ -194,11 +194,11 @@ def run_fixpo(args=get_args()):
 
     # collector
     if args.training_num > 1:
-        buffer = VectorReplayBuffer(args.buffer_size, len(train_envs))
+        buffer = RolloutBuffer(args.buffer_size, len(train_envs))
     else:
         buffer = ReplayBuffer(args.buffer_size)
-    train_collector = Collector(policy, train_envs, buffer, exploration_noise=True)
-    test_collector = Collector(policy, test_envs)
+    train_collector = FastCollector(policy, train_envs, buffer, exploration_noise=True)
+    test_collector = FastCollector(policy, test_envs)
 
     # logger
     if args.logger == "wandb":
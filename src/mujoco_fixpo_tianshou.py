@@ -12,7 +12,7 @@ from torch.distributions import Independent, Normal, Beta
 from torch.optim.lr_scheduler import LambdaLR
 from torch.utils.tensorboard import SummaryWriter
 
-from tianshou.data import Collector, ReplayBuffer, VectorReplayBuffer
+from tianshou.data import FastCollector, ReplayBuffer, RolloutBuffer
 from tianshou.trainer import onpolicy_trainer
 from tianshou.utils import TensorboardLogger, WandbLogger
 from tianshou.utils.net.common import Net
@@ -20,6 +20,7 @@ from tianshou.utils.net.continuous import ActorProb, Critic
 
 from mujoco_env_tianshou import make_mujoco_env
 from fixpo_tianshou import FixPOPolicy
+from fixpo_tianshou_parallel import DataParallelFixPOPolicy
 
 
 def get_args():
@@ -52,12 +53,24 @@ def get_args():
     parser.add_argument("--fixup-batchsize", type=int, default=1024)
     parser.add_argument("--value-clip", type=int, default=1)
     parser.add_argument("--norm-adv", type=int, default=0)
+    parser.add_argument("--device-gae", type=int, default=0)
     parser.add_argument("--recompute-adv", type=int, default=0)
     parser.add_argument("--log-dir", type=str)
     parser.add_argument("--render", type=float, default=0.0)
     parser.add_argument("--fixup-every-repeat", type=int, default=1)
     parser.add_argument("--fixup-loop", type=int, default=1)
     parser.add_argument("--kl-target-stat", type=str, default="max")
+    parser.add_argument("--deferred-metrics", type=int, default=0)
+    parser.add_argument("--max-batchsize", type=int, default=2048)
+    parser.add_argument(
+        "--fixup-strategy",
+        type=str,
+        default="full",
+        choices=["full", "indexed", "bisect"],
+    )
+    parser.add_argument("--fixup-bisect-steps", type=int, default=8)
+    parser.add_argument("--num-learners", type=int, default=1)
+    parser.add_argument("--learner-threads", type=int, default=1)
     parser.add_argument("--target-coeff", type=float, default=2.0)
     parser.add_argument(
         "--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu"
@@ -95,6 +108,9 @@ def run_fixpo(args=get_args()):
     # seed
     np.random.seed(args.seed)
     torch.manual_seed(args.seed)
+    if args.num_learners > 1:
+        # data-parallel learners are forked CPU processes
+        args.device = "cpu"
     # model
     net_a = Net(
         args.state_shape,
@@ -156,7 +172,14 @@ def run_fixpo(args=get_args()):
         else:
             raise ValueError(f"Only 'normal' and 'beta' dist. supported. Got {dist}")
 
-    policy = FixPOPolicy(
+    policy_kwargs = {}
+    policy_cls = FixPOPolicy
+    if args.num_learners > 1:
+        policy_cls = DataParallelFixPOPolicy
+        policy_kwargs = dict(
+            num_learners=args.num_learners, learner_threads=args.learner_threads
+        )
+    policy = policy_cls(
         actor,
         critic,
         optim,
@@ -177,10 +200,16 @@ def run_fixpo(args=get_args()):
         fixup_batchsize=args.fixup_batchsize,
         fixup_loop=args.fixup_loop,
         fixup_every_repeat=args.fixup_every_repeat,
+        fixup_strategy=args.fixup_strategy,
+        fixup_bisect_steps=args.fixup_bisect_steps,
+        deferred_metrics=args.deferred_metrics,
+        max_batchsize=args.max_batchsize,
         target_coeff=args.target_coeff,
         value_clip=args.value_clip,
         advantage_normalization=args.norm_adv,
+        device_gae=bool(args.device_gae),
         recompute_advantage=args.recompute_adv,
+        **policy_kwargs,
     )
 
     # load a previous policy
@@ -193,11 +222,11 @@ def run_fixpo(args=get_args()):
 
     # collector
     if args.training_num > 1:
-        buffer = VectorReplayBuffer(args.buffer_size, len(train_envs))
+        buffer = RolloutBuffer(args.buffer_size, len(train_envs))
     else:
         buffer = ReplayBuffer(args.buffer_size)
-    train_collector = Collector(policy, train_envs, buffer, exploration_noise=True)
-    test_collector = Collector(policy, test_envs)
+    train_collector = FastCollector(policy, train_envs, buffer, exploration_noise=True)
+    test_collector = FastCollector(policy, test_envs)
 
     # logger
     if args.logger == "wandb":
@@ -238,6 +267,8 @@ def run_fixpo(args=get_args()):
             test_in_train=False,
         )
         pprint.pprint(result)
+        if isinstance(policy, DataParallelFixPOPolicy):
+            policy.close()
 
     # Let's watch its performance!
     policy.eval()
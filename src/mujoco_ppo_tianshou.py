@@ -12,7 +12,7 @@ from torch.distributions import Independent, Normal
 from torch.optim.lr_scheduler import LambdaLR
 from torch.utils.tensorboard import SummaryWriter
 
-from tianshou.data import Collector, ReplayBuffer, VectorReplayBuffer
+from tianshou.data import FastCollector, ReplayBuffer, RolloutBuffer
 from tianshou.policy import PPOPolicy
 from tianshou.trainer import onpolicy_trainer
 from tianshou.utils import TensorboardLogger, WandbLogger
@@ -48,6 +48,7 @@ def get_args():
     parser.add_argument("--dual-clip", type=float, default=None)
     parser.add_argument("--value-clip", type=int, default=0)
     parser.add_argument("--norm-adv", type=int, default=0)
+    parser.add_argument("--device-gae", type=int, default=0)
     parser.add_argument("--recompute-adv", type=int, default=1)
     parser.add_argument("--log-dir", type=str)
     parser.add_argument("--render", type=float, default=0.)
@@ -159,6 +160,7 @@ def test_ppo(args=get_args()):
         value_clip=args.value_clip,
         dual_clip=args.dual_clip,
         advantage_normalization=args.norm_adv,
+        device_gae=bool(args.device_gae),
         recompute_advantage=args.recompute_adv,
     )
 
@@ -172,11 +174,11 @@ def test_ppo(args=get_args()):
 
     # collector
     if args.training_num > 1:
-        buffer = VectorReplayBuffer(args.buffer_size, len(train_envs))
+        buffer = RolloutBuffer(args.buffer_size, len(train_envs))
     else:
         buffer = ReplayBuffer(args.buffer_size)
-    train_collector = Collector(policy, train_envs, buffer, exploration_noise=True)
-    test_collector = Collector(policy, test_envs)
+    train_collector = FastCollector(policy, train_envs, buffer, exploration_noise=True)
+    test_collector = FastCollector(policy, test_envs)
 
     # logger
     if args.logger == "wandb":
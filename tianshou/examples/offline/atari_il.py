@@ -54,6 +54,12 @@ def get_args():
     parser.add_argument(
         "--buffer-from-rl-unplugged", action="store_true", default=False
     )
+    parser.add_argument(
+        "--lazy-buffer",
+        action="store_true",
+        default=False,
+        help="read the rl-unplugged buffer from disk on demand",
+    )
     parser.add_argument(
         "--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu"
     )
@@ -90,7 +96,7 @@ def test_il(args=get_args()):
         print("Loaded agent from: ", args.resume_path)
     # buffer
     if args.buffer_from_rl_unplugged:
-        buffer = load_buffer(args.load_buffer_name)
+        buffer = load_buffer(args.load_buffer_name, lazy=args.lazy_buffer)
     else:
         assert os.path.exists(args.load_buffer_name), \
             "Please run atari_dqn.py first to get expert's data buffer."
@@ -5,7 +5,7 @@ import gymnasium as gym
 import h5py
 import numpy as np
 
-from tianshou.data import ReplayBuffer
+from tianshou.data import LazyReplayBuffer, ReplayBuffer
 from tianshou.utils import RunningMeanStd
 
 
@@ -23,7 +23,18 @@ def load_buffer_d4rl(expert_data_task: str) -> ReplayBuffer:
     return replay_buffer
 
 
-def load_buffer(buffer_path: str) -> ReplayBuffer:
+def load_buffer(buffer_path: str, lazy: bool = False) -> ReplayBuffer:
+    if lazy:  # keep the file open, rows are only read when sampled
+        dataset = h5py.File(buffer_path, "r")
+        return LazyReplayBuffer.from_data(
+            obs=dataset["observations"],
+            act=dataset["actions"],
+            rew=dataset["rewards"],
+            done=dataset["terminals"],
+            obs_next=dataset["next_observations"],
+            terminated=dataset["terminals"],
+            truncated=np.zeros(len(dataset["terminals"]))
+        )
     with h5py.File(buffer_path, "r") as dataset:
         buffer = ReplayBuffer.from_data(
             obs=dataset["observations"],
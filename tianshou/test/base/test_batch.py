@@ -597,6 +597,35 @@ def test_batch_standard_compatibility():
         Batch()[0]
 
 
+def test_batch_split_contiguous():
+    batch = Batch(
+        a=np.arange(10),
+        b=Batch(c=torch.arange(10.).reshape(10, 1), d=np.zeros((10, 2))),
+    )
+    for size in [1, 3, 5, 7, 15]:
+        for merge_last in [False, True]:
+            for shuffle in [False, True]:
+                np.random.seed(size)
+                expected = list(batch.split(size, shuffle, merge_last))
+                np.random.seed(size)
+                result = list(batch.split(size, shuffle, merge_last, contiguous=True))
+                assert len(result) == len(expected)
+                for res, exp in zip(result, expected):
+                    assert np.array_equal(res.a, exp.a)
+                    assert torch.equal(res.b.c, exp.b.c)
+                    assert res.b.d.shape == exp.b.d.shape
+    # minibatches are views of one shuffled copy
+    minibatches = list(batch.split(3, contiguous=True))
+    whole = minibatches[0].a.base
+    assert whole is not None and whole is not batch.a
+    assert all(b.a.base is whole for b in minibatches)
+    storage = minibatches[0].b.c.untyped_storage().data_ptr()
+    assert all(b.b.c.untyped_storage().data_ptr() == storage for b in minibatches)
+    # without shuffling, they are views of the batch itself
+    minibatches = list(batch.split(3, shuffle=False, contiguous=True))
+    assert all(np.shares_memory(b.a, batch.a) for b in minibatches)
+
+
 if __name__ == '__main__':
     test_batch()
     test_batch_over_batch()
@@ -608,3 +637,4 @@ if __name__ == '__main__':
     test_batch_cat_and_stack()
     test_batch_copy()
     test_batch_empty()
+    test_batch_split_contiguous()
@@ -1,3 +1,5 @@
+import gc
+import json
 import os
 import pickle
 import tempfile
@@ -13,9 +15,11 @@ from tianshou.data import (
     CachedReplayBuffer,
     HERReplayBuffer,
     HERVectorReplayBuffer,
+    LazyReplayBuffer,
     PrioritizedReplayBuffer,
     PrioritizedVectorReplayBuffer,
     ReplayBuffer,
+    RolloutBuffer,
     SegmentTree,
     VectorReplayBuffer,
 )
@@ -901,6 +905,112 @@ def test_replaybuffermanager():
     assert np.array([ReplayBuffer(0, ignore_obs_next=True)]).dtype == object
 
 
+def test_rolloutbuffer():
+    buf = RolloutBuffer(10, 3)
+    assert buf.rollout_len == 4 and buf.maxsize == 12
+    for step in range(3):
+        batch = Batch(
+            obs=np.array([10, 20, 30]) + step,
+            act=np.zeros(3),
+            rew=np.ones(3),
+            terminated=np.array([False, step == 1, False]),
+            truncated=np.zeros(3, bool),
+        )
+        ptr, ep_rew, ep_len, ep_idx = buf.add(batch)
+        assert np.array_equal(ptr, step * 3 + np.arange(3))
+    # env 1 finished an episode of length 2 at step 1
+    assert np.array_equal(ep_len, [0, 0, 0]) and np.array_equal(ep_idx, [0, 7, 2])
+    assert len(buf) == 9
+    # time-major layout
+    assert np.array_equal(buf.time_major("obs")[:3], [[10, 20, 30], [11, 21, 31],
+                                                      [12, 22, 32]])
+    assert np.array_equal(buf.sample_indices(0), np.arange(9))
+    assert np.array_equal(buf.prev(np.arange(9)), [0, 1, 2, 0, 1, 2, 3, 7, 5])
+    assert np.array_equal(buf.next(np.arange(9)), [3, 4, 5, 6, 4, 8, 6, 7, 8])
+    assert buf.prev(4) == 1 and buf.next(4) == 4
+    assert np.array_equal(buf.unfinished_index(), [6, 7, 8])
+    # only some envs step, then a column wraps around
+    for step in range(3, 6):
+        batch = Batch(
+            obs=np.array([10]) + step,
+            act=np.zeros(1),
+            rew=np.ones(1),
+            terminated=np.array([step == 5]),
+            truncated=np.zeros(1, bool),
+        )
+        ptr, ep_rew, ep_len, ep_idx = buf.add(batch, buffer_ids=[0])
+    assert ptr == [3] and ep_rew == [6] and ep_len == [6] and ep_idx == [0]
+    assert len(buf) == 10
+    assert np.array_equal(
+        buf[buf.sample_indices(0)].obs, [12, 20, 30, 13, 21, 31, 14, 22, 32, 15]
+    )
+    assert np.array_equal(buf.unfinished_index(), [7, 8])
+    buf.reset(keep_statistics=True)
+    assert len(buf) == 0 and buf.sample_indices(0).size == 0
+
+
+def test_add_many():
+    np.random.seed(0)
+
+    def make_block(length, num):
+        return Batch(
+            obs=np.random.rand(length, num, 3),
+            act=np.random.randint(5, size=(length, num)),
+            rew=np.random.rand(length, num),
+            terminated=np.random.rand(length, num) < 0.15,
+            truncated=np.random.rand(length, num) < 0.05,
+            obs_next=np.random.rand(length, num, 3),
+            info=Batch(x=np.random.rand(length, num)),
+        )
+
+    for make_buffer in [
+        lambda: VectorReplayBuffer(60, 4),
+        lambda: RolloutBuffer(60, 4),
+        lambda: PrioritizedVectorReplayBuffer(60, 4, alpha=0.6, beta=0.4),
+        lambda: CachedReplayBuffer(ReplayBuffer(100), 4, 30),
+    ]:
+        buf, bulk_buf = make_buffer(), make_buffer()
+        # the 40-step block wraps around every 15-step sub-buffer
+        for length in [5, 1, 17, 40, 3]:
+            block = make_block(length, 4)
+            results = [buf.add(block[t]) for t in range(length)]
+            bulk_results = bulk_buf.add_many(block)
+            for result, bulk_result in zip(zip(*results), bulk_results):
+                assert np.allclose(np.stack(result), bulk_result)
+            for key in ["obs", "act", "rew", "done", "obs_next"]:
+                assert np.array_equal(buf._meta[key], bulk_buf._meta[key])
+            assert np.array_equal(buf.info.x, bulk_buf.info.x)
+            assert len(buf) == len(bulk_buf)
+            assert np.array_equal(buf.last_index, bulk_buf.last_index)
+            assert np.array_equal(buf.unfinished_index(), bulk_buf.unfinished_index())
+            indices = buf.sample_indices(0)
+            assert np.array_equal(indices, bulk_buf.sample_indices(0))
+            assert np.array_equal(buf.prev(indices), bulk_buf.prev(indices))
+            assert np.array_equal(buf.next(indices), bulk_buf.next(indices))
+            if isinstance(buf, PrioritizedVectorReplayBuffer):
+                assert np.allclose(buf.weight[indices], bulk_buf.weight[indices])
+    # a subset of sub-buffers
+    buf, bulk_buf = VectorReplayBuffer(60, 4), VectorReplayBuffer(60, 4)
+    block = make_block(20, 2)
+    for t in range(20):
+        buf.add(block[t], buffer_ids=[3, 1])
+    ptrs, ep_rews, ep_lens, ep_idxs = bulk_buf.add_many(block, buffer_ids=[3, 1])
+    assert ptrs.shape == ep_rews.shape == ep_lens.shape == (20, 2)
+    assert np.array_equal(buf.obs, bulk_buf.obs)
+    assert np.array_equal(buf.last_index, bulk_buf.last_index)
+    # single buffer
+    buf, bulk_buf = ReplayBuffer(20), ReplayBuffer(20)
+    for length in [5, 30, 3]:
+        block = make_block(length, 1)[:, 0]
+        results = [buf.add(block[t]) for t in range(length)]
+        bulk_results = bulk_buf.add_many(block)
+        for result, bulk_result in zip(zip(*results), bulk_results):
+            assert np.allclose(np.concatenate(result), bulk_result)
+        assert np.array_equal(buf.obs, bulk_buf.obs)
+        assert buf._index == bulk_buf._index and len(buf) == len(bulk_buf)
+        assert buf._ep_len == bulk_buf._ep_len and buf._ep_idx == bulk_buf._ep_idx
+
+
 def test_cachedbuffer():
     buf = CachedReplayBuffer(ReplayBuffer(10), 4, 5)
     assert buf.sample_indices(0).tolist() == []
@@ -1336,6 +1446,236 @@ def test_from_data():
     os.remove(path)
 
 
+def test_lazybuffer():
+    np.random.seed(0)
+    keys = ["obs", "act", "rew", "terminated", "truncated", "done", "obs_next"]
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "buffer")
+        buf = ReplayBuffer(50, stack_num=3)
+        # a tiny page cache, so that pages get evicted all the time
+        lazy = LazyReplayBuffer(
+            50, path=path, chunk_size=16, page_size=4, cache_bytes=256, stack_num=3
+        )
+        for i in range(73):
+            batch = Batch(
+                obs=np.random.rand(4).astype(np.float32),
+                act=i,
+                rew=float(i),
+                terminated=i % 7 == 0,
+                truncated=False,
+                obs_next=np.random.rand(4).astype(np.float32),
+                info={
+                    "x": i,
+                    "s": "odd" if i % 2 else None
+                },
+            )
+            for value, lazy_value in zip(buf.add(batch), lazy.add(batch)):
+                assert np.array_equal(value, lazy_value)
+        indices = buf.sample_indices(0)
+        assert np.array_equal(indices, lazy.sample_indices(0))
+        data, lazy_data = buf[indices], lazy[indices]
+        for key in keys:
+            assert np.array_equal(data[key], lazy_data[key])
+        assert np.array_equal(data.info.x, lazy_data.info.x)
+        assert np.array_equal(data.info.s, lazy_data.info.s)
+        assert np.array_equal(buf.prev(indices), lazy.prev(indices))
+        assert len(lazy._cache) > 0 and lazy._cache.nbytes <= 256
+        assert lazy.act[-1] == buf.act[-1] and lazy.obs[3:5].shape == (2, 4)
+        # a chunk file is only written when a row lands in it
+        lazy.flush()
+        assert sorted(os.listdir(path)).count("act.3.npy") == 1
+        assert not os.path.exists(os.path.join(path, "act.4.npy"))
+        reopened = LazyReplayBuffer.open(path)
+        assert len(reopened) == len(buf) and reopened.stack_num == 3
+        assert np.array_equal(reopened.last_index, buf.last_index)
+        for key in keys:
+            assert np.array_equal(reopened[indices][key], data[key])
+        assert np.array_equal(reopened.info.x[indices], buf.info.x[indices])
+        # export to / lazily import from the ReplayBuffer hdf5 format
+        hdf5_path = os.path.join(root, "lazy.hdf5")
+        lazy.save_hdf5(hdf5_path)
+        loaded = ReplayBuffer.load_hdf5(hdf5_path)
+        buf.save_hdf5(hdf5_path)
+        lazy_loaded = LazyReplayBuffer.load_hdf5(hdf5_path)
+        for key in keys:
+            assert np.array_equal(loaded[indices][key], data[key])
+            assert np.array_equal(lazy_loaded[indices][key], data[key])
+        assert np.array_equal(lazy_loaded.info.s, buf.info.s)
+        pickled = pickle.loads(pickle.dumps(lazy))
+        assert np.array_equal(pickled.obs[indices], buf.obs[indices])
+        lazy_loaded._meta.obs.source.dataset.file.close()
+        # from_data keeps the datasets in their file
+        with h5py.File(os.path.join(root, "data.hdf5"), "w") as f:
+            for key in keys:
+                f.create_dataset(key, data=buf._meta[key])
+            lazy = LazyReplayBuffer.from_data(*[f[key] for key in keys])
+            assert len(lazy) == 50
+            assert np.array_equal(lazy[indices].obs_next, buf.obs_next[indices])
+    # without a path, the temporary chunk files are removed with the buffer
+    lazy = LazyReplayBuffer(10)
+    lazy.add(Batch(obs=1, act=0, rew=0.0, terminated=False, truncated=False))
+    path = lazy.path
+    assert os.listdir(path)
+    del lazy
+    gc.collect()
+    assert not os.path.exists(path)
+
+
+def test_buffer_codecs():
+    np.random.seed(0)
+    low, high = -np.ones(3), np.array([1.0, 2.0, 4.0])
+    quantized = {"dtype": "uint8", "low": low, "high": high}
+    with pytest.raises(ValueError):
+        ReplayBuffer(10, codecs={"obs": "uint8"})
+    with pytest.raises(ValueError):
+        ReplayBuffer(10, codecs={"rew": "float16"})
+    for codecs, storage, atol in [
+        ({"obs": "float16"}, np.float16, 4e-3),
+        ({"obs": quantized, "act": "float32"}, np.uint8, (high - low) / 255 / 2),
+    ]:
+        makers = [
+            lambda **kwargs: VectorReplayBuffer(40, 4, **kwargs),
+            lambda **kwargs: RolloutBuffer(40, 4, **kwargs),
+            lambda **kwargs: CachedReplayBuffer(ReplayBuffer(40, **kwargs), 4, 10),
+        ]
+        bufs = [make(codecs=codecs) for make in makers]
+        plains = [make() for make in makers]
+        for i in range(12):
+            obs = np.random.uniform(low, high, (4, 3))
+            batch = Batch(
+                obs=obs,
+                act=obs,
+                rew=np.ones(4),
+                terminated=np.zeros(4, bool),
+                truncated=np.full(4, i % 5 == 4),
+                obs_next=np.random.uniform(low, high, (4, 3)),
+            )
+            for buf, plain in zip(bufs, plains):
+                buf.add(batch)
+                plain.add(batch)
+        for buf, plain in zip(bufs, plains):
+            assert buf._meta.obs.dtype == buf._meta.obs_next.dtype == storage
+            assert buf._meta.act.dtype == (
+                np.float32 if "act" in codecs else np.float64
+            )
+            data, reference = buf[:], plain[:]
+            assert data.obs.dtype == data.obs_next.dtype == np.float32
+            assert np.all(np.abs(data.obs - reference.obs) <= atol)
+            assert np.all(np.abs(data.obs_next - reference.obs_next) <= atol)
+        # the codec survives save_hdf5 and is recorded with the stored data
+        with tempfile.NamedTemporaryFile(suffix=".hdf5") as f:
+            bufs[0].save_hdf5(f.name)
+            with h5py.File(f.name, "r") as h5:
+                config = json.loads(h5["_meta"]["obs"].attrs["codec"])
+                assert config["dtype"] == np.dtype(storage).name
+            loaded = VectorReplayBuffer.load_hdf5(f.name)
+            assert np.array_equal(loaded[:].obs, bufs[0][:].obs)
+        # update decodes the source and encodes into the target
+        target = ReplayBuffer(10)
+        target.update(bufs[0].buffers[0])
+        assert target._meta.obs.dtype == np.float32
+        assert np.array_equal(target[:].obs, bufs[0].buffers[0][:].obs)
+
+
+def test_stack_table(stack_num=4):
+
+    def walk(buf, indices):
+        stack = [indices]
+        for _ in range(stack_num - 1):
+            stack.insert(0, buf.prev(stack[0]))
+        return np.stack(stack, axis=-1)
+
+    np.random.seed(0)
+    bufs = [
+        ReplayBuffer(13, stack_num=stack_num, sample_avail=True),
+        VectorReplayBuffer(30, 3, stack_num=stack_num, sample_avail=True),
+        CachedReplayBuffer(ReplayBuffer(17, stack_num=stack_num), 3, 6),
+        RolloutBuffer(30, 3, stack_num=stack_num),
+    ]
+    for i in range(60):
+        batch = Batch(
+            obs=np.full(3, i),
+            act=np.zeros(3),
+            rew=np.ones(3),
+            terminated=np.random.rand(3) < 0.15,
+            truncated=np.zeros(3, bool),
+        )
+        for buf in bufs:
+            if buf is bufs[0]:
+                buf.add(batch[:1], buffer_ids=[0])
+            else:
+                buf.add(batch)
+            if i < 20:
+                continue  # the table is built by the first stacked get
+            indices = buf.sample_indices(0)
+            # the table is updated incrementally while adding
+            stack = walk(buf, indices)
+            assert np.array_equal(buf._stack_index(indices, stack_num), stack)
+            assert np.array_equal(buf.get(indices, "obs"), buf.obs[stack])
+            if buf is bufs[0]:
+                all_indices = buf._ordered_indices()
+                stack = walk(buf, all_indices)
+                avail = all_indices[stack[:, 0] != stack[:, 1]]
+                assert np.array_equal(indices, avail)
+    # a manually changed stack_num rebuilds the table
+    for buf in bufs[:2]:
+        buf.stack_num = 2
+        indices = buf.sample_indices(0)
+        assert buf.get(indices, "obs").shape == (len(indices), 2)
+
+
+def test_her_episode_index(size=9):
+
+    def walk_last(buf, indices):
+        last = indices.copy()
+        while True:
+            nxt = buf.next(last)
+            if np.array_equal(nxt, last):
+                return last
+            last = nxt
+
+    def compute_reward_fn(ag, g):
+        return -np.abs(ag - g).sum(axis=-1)
+
+    np.random.seed(1)
+    bufs = [
+        HERReplayBuffer(size, compute_reward_fn=compute_reward_fn, horizon=4),
+        HERVectorReplayBuffer(
+            size * 3, 3, compute_reward_fn=compute_reward_fn, horizon=4
+        ),
+    ]
+    for i in range(40):
+        obs = Batch(
+            observation=np.full((3, 1), i),
+            achieved_goal=np.full((3, 1), i),
+            desired_goal=np.zeros((3, 1)),
+        )
+        batch = Batch(
+            obs=obs,
+            obs_next=obs,
+            act=np.zeros(3),
+            rew=np.zeros(3),
+            terminated=np.random.rand(3) < 0.2,
+            truncated=np.zeros(3, bool),
+        )
+        for buf in bufs:
+            if buf is bufs[0]:
+                buf.add(batch[:1], buffer_ids=[0])
+            elif i % 2:
+                buf.add(batch)
+            else:
+                buf.add_many(Batch.stack([batch, batch]))
+            # the manager keeps an episode index in each of its sub-buffers
+            for b in getattr(buf, "buffers", [buf]):
+                indices = b._ordered_indices()
+                assert np.array_equal(
+                    b._episode_last(indices), walk_last(b, indices)
+                )
+        if i == 25:
+            for buf in bufs:
+                buf.reset()
+
+
 if __name__ == '__main__':
     test_replaybuffer()
     test_ignore_obs_next()
@@ -1346,8 +1686,14 @@ if __name__ == '__main__':
     test_pickle()
     test_hdf5()
     test_replaybuffermanager()
+    test_rolloutbuffer()
+    test_add_many()
     test_cachedbuffer()
     test_multibuf_stack()
     test_multibuf_hdf5()
     test_from_data()
+    test_lazybuffer()
     test_herreplaybuffer()
+    test_buffer_codecs()
+    test_stack_table()
+    test_her_episode_index()
@@ -1,3 +1,4 @@
+import gymnasium as gym
 import numpy as np
 import pytest
 import tqdm
@@ -8,8 +9,11 @@ from tianshou.data import (
     Batch,
     CachedReplayBuffer,
     Collector,
+    FastCollector,
+    PipelinedCollector,
     PrioritizedReplayBuffer,
     ReplayBuffer,
+    RolloutBuffer,
     VectorReplayBuffer,
 )
 from tianshou.env import DummyVectorEnv, SubprocVectorEnv
@@ -260,6 +264,54 @@ def test_collector_with_async(gym_reset_kwargs):
         c1.collect()
 
 
+def test_collector_with_pipeline():
+
+    env_lens = [2, 3, 4, 5]
+    env_fns = [
+        lambda x=i: MyTestEnv(size=x, sleep=0.001, random_sleep=True) for i in env_lens
+    ]
+    for venv in [DummyVectorEnv(env_fns), SubprocVectorEnv(env_fns)]:
+        bufsize = 60
+        c1 = PipelinedCollector(
+            MyPolicy(), venv, VectorReplayBuffer(total_size=bufsize * 4, buffer_num=4)
+        )
+        groups, step = [], c1.env.step
+
+        def record_step(action, id=None, step=step, groups=groups):
+            groups.append(tuple(id))
+            return step(action, id)
+
+        c1.env.step = record_step
+        ptr = [0, 0, 0, 0]
+        for n_episode in range(1, 20):
+            result = c1.collect(n_episode=n_episode)
+            assert result["n/ep"] >= n_episode
+            for i, count in enumerate(np.bincount(result["lens"], minlength=6)[2:]):
+                env_len = i + 2
+                total = env_len * count
+                indices = np.arange(ptr[i], ptr[i] + total) % bufsize
+                ptr[i] = (ptr[i] + total) % bufsize
+                seq = np.arange(env_len)
+                buf = c1.buffer.buffers[i]
+                assert np.all(buf.info.env_id[indices] == i)
+                assert np.all(buf.obs[indices].reshape(count, env_len) == seq)
+                assert np.all(buf.obs_next[indices].reshape(count, env_len) == seq + 1)
+        # after the first step of all the envs, the two halves take turns
+        assert groups[0] == (0, 1, 2, 3)
+        assert groups[1::2] == [(0, 1)] * len(groups[1::2])
+        assert groups[2::2] == [(2, 3)] * len(groups[2::2])
+        # resetting waits for the stepping group and drops its step
+        c1.reset_env()
+        result = c1.collect(n_step=8)
+        assert result["n/st"] == 8
+        for i in range(4):
+            env_len = i + 2
+            buf = c1.buffer.buffers[i]
+            assert np.all(buf.info.env_id == i)
+            assert np.all(buf.obs_next - buf.obs == 1)
+        venv.close()
+
+
 def test_collector_with_dict_state():
     env = MyTestEnv(size=5, sleep=0, dict_state=True)
     policy = MyPolicy(dict_state=True)
@@ -682,6 +734,142 @@ def test_collector_with_atari_setting():
         assert np.allclose(result2[key], result[key])
 
 
+def test_collector_with_info_schema():
+
+    class SuccessInfo(gym.Wrapper):
+
+        def reset(self, **kwargs):
+            obs, info = self.env.reset(**kwargs)
+            return obs, {"success": False, "dist": 1.0, "pos": np.zeros(2)}
+
+        def step(self, action):
+            obs, rew, terminated, truncated, info = self.env.step(action)
+            success = terminated and self.env.size % 2 == 0
+            info = {"success": success, "pos": np.ones(2)}
+            if self.env.size > 2:
+                info["dist"] = self.env.size - self.env.index
+            return obs, rew, terminated, truncated, info
+
+    env_lens = [2, 3, 4, 5]
+    env_fns = [lambda x=i: SuccessInfo(MyTestEnv(size=x)) for i in env_lens]
+    schema = {"success": bool, "dist": np.float32}
+    for venv, collector_class in [
+        (DummyVectorEnv(env_fns), Collector),
+        (SubprocVectorEnv(env_fns, wait_num=3), AsyncCollector),
+    ]:
+        buffer = VectorReplayBuffer(total_size=100, buffer_num=4)
+        c0 = collector_class(
+            MyPolicy(), venv, buffer, info_schema=schema, drop_unknown_info=True
+        )
+        result = c0.collect(n_episode=8)
+        assert result["n/ep"] >= 8
+        assert buffer.info.success.dtype == bool
+        assert buffer.info.dist.dtype == np.float32
+        assert "pos" not in buffer.info and "env_id" not in buffer.info
+        # only the even length envs succeed, and only on their last step
+        for i, env_len in enumerate(env_lens):
+            buf = buffer.buffers[i]
+            assert np.all(buf.info.success == (buf.done & (env_len % 2 == 0)))
+            dist = env_len - buf.obs_next[:len(buf), 0] if env_len > 2 else 0
+            assert np.all(buf.info.dist[:len(buf)] == dist)
+        successes = result["lens"] % 2 == 0
+        assert np.isclose(result["success_rate"], successes.mean())
+        venv.close()
+    # undeclared keys are still converted as usual
+    c1 = Collector(
+        MyPolicy(),
+        DummyVectorEnv(env_fns),
+        VectorReplayBuffer(total_size=100, buffer_num=4),
+        info_schema={"success": bool},
+    )
+    c1.collect(n_episode=4)
+    assert c1.buffer.info.success.dtype == bool
+    assert c1.buffer.info.env_id.dtype.kind == "i"
+    assert c1.buffer.info.pos.shape == (100, 2)
+
+
+def test_fast_collector():
+
+    class BoxAction(gym.Wrapper):
+
+        def __init__(self, env):
+            super().__init__(env)
+            self.action_space = gym.spaces.Box(-1, 1, (1, ))
+
+        def reset(self, **kwargs):
+            obs, info = self.env.reset(**kwargs)
+            return obs, {"success": False, "dist": float(self.env.size)}
+
+        def step(self, action):
+            obs, rew, terminated, truncated, info = self.env.step(int(action[0] > 0))
+            success = terminated and self.env.size % 2 == 0
+            info = {"success": success, "dist": float(self.env.size - obs[0])}
+            return obs, rew, terminated, truncated, info
+
+    class BoxPolicy(BasePolicy):
+
+        def forward(self, batch, state=None):
+            act = np.random.uniform(-0.5, 1.0, size=batch.obs.shape)
+            return Batch(act=act, policy=Batch(obs=batch.obs * 2))
+
+        def learn(self):
+            pass
+
+    def assert_same(a, b):
+        if isinstance(a, Batch):
+            assert a.keys() == b.keys()
+            for key in a.keys():
+                assert_same(a[key], b[key])
+        else:
+            assert np.array_equal(a, b)
+
+    def seeded_collect(collector, kwargs):
+        np.random.seed(0)
+        for i, space in enumerate(collector._action_space):
+            space.seed(i)
+        return collector.collect(**kwargs)
+
+    env_lens = [2, 3, 4, 5]
+    env_fns = [lambda x=i: BoxAction(MyTestEnv(size=x)) for i in env_lens]
+    for buffer_fn in [
+        lambda: VectorReplayBuffer(total_size=40, buffer_num=4),
+        lambda: RolloutBuffer(total_size=40, buffer_num=4),
+        lambda: VectorReplayBuffer(40, 4, ignore_obs_next=True),
+    ]:
+        for schema in [None, {"success": bool, "dist": np.float32}]:
+            collectors = [
+                collector_class(
+                    BoxPolicy(),
+                    DummyVectorEnv(env_fns),
+                    buffer_fn(),
+                    info_schema=schema,
+                    drop_unknown_info=schema is not None,
+                ) for collector_class in [Collector, FastCollector]
+            ]
+            assert collectors[1]._use_fast_path()
+            for kwargs in [
+                dict(n_step=12),
+                dict(n_episode=5),
+                dict(n_step=13),
+                dict(n_step=8, random=True),
+                dict(n_episode=2),
+                dict(n_step=40),
+            ]:
+                expected, result = [
+                    seeded_collect(c, kwargs) for c in collectors
+                ]
+                assert expected.keys() == result.keys()
+                for key in expected:
+                    assert np.allclose(expected[key], result[key]), key
+                buffers = [c.buffer for c in collectors]
+                assert buffers[0]._meta.keys() == buffers[1]._meta.keys()
+                assert_same(buffers[0][:], buffers[1][:])
+    # anything else falls back to Collector.collect
+    c0 = FastCollector(MyPolicy(), DummyVectorEnv([lambda: MyTestEnv(size=3)]))
+    assert not c0._use_fast_path()
+    assert c0.collect(n_episode=2)["n/ep"] == 2
+
+
 @pytest.mark.skipif(envpool is None, reason="EnvPool doesn't support this platform")
 def test_collector_envpool_gym_reset_return_info():
     envs = envpool.make_gymnasium(
@@ -709,4 +897,7 @@ if __name__ == '__main__':
     test_collector_with_atari_setting()
     test_collector_with_async(gym_reset_kwargs=None)
     test_collector_with_async(gym_reset_kwargs=dict(return_info=True))
+    test_collector_with_pipeline()
+    test_collector_with_info_schema()
     test_collector_envpool_gym_reset_return_info()
+    test_fast_collector()
@@ -3,8 +3,14 @@ from timeit import timeit
 import numpy as np
 import torch
 
-from tianshou.data import Batch, ReplayBuffer, to_numpy
-from tianshou.policy import BasePolicy
+from tianshou.data import (
+    Batch,
+    ReplayBuffer,
+    RolloutBuffer,
+    VectorReplayBuffer,
+    to_numpy,
+)
+from tianshou.policy import A2CPolicy, BasePolicy
 
 
 def compute_episodic_return_base(batch, gamma):
@@ -134,6 +140,123 @@ def test_episodic_returns(size=2560):
         print('GAE optim  ', timeit(optimized, setup=optimized, number=cnt))
 
 
+def test_episodic_returns_rollout_buffer(env_num=4, rollout_len=9):
+    fn = BasePolicy.compute_episodic_return
+    vbuf = VectorReplayBuffer(env_num * rollout_len, env_num)
+    rbuf = RolloutBuffer(env_num * rollout_len, env_num)
+    # more steps than rollout_len, so that the columns wrap around
+    for step in range(rollout_len + 4):
+        env_ids = np.arange(env_num) if step % 3 else np.arange(1, env_num)
+        batch = Batch(
+            obs=np.random.random(len(env_ids)),
+            act=np.zeros(len(env_ids)),
+            rew=np.random.random(len(env_ids)),
+            terminated=np.random.random(len(env_ids)) < 0.2,
+            truncated=np.random.random(len(env_ids)) < 0.1,
+        )
+        vbuf.add(batch, buffer_ids=env_ids)
+        rbuf.add(batch, buffer_ids=env_ids)
+    results = []
+    for buf in [vbuf, rbuf]:
+        batch, indices = buf.sample(0)
+        # the obs are unique, so they identify a transition in both layouts
+        v_s = np.sin(batch.obs)
+        v_s_ = np.cos(batch.obs) * BasePolicy.value_mask(buf, indices)
+        returns, adv = fn(batch, buf, indices, v_s_, v_s, gamma=0.9, gae_lambda=0.8)
+        order = np.argsort(batch.obs)
+        results.append((returns[order], adv[order]))
+    assert np.allclose(results[0][0], results[1][0])
+    assert np.allclose(results[0][1], results[1][1])
+
+
+def test_episodic_returns_torch(env_num=4, size=400):
+    fn = BasePolicy.compute_episodic_return
+    torch_fn = BasePolicy.compute_episodic_return_torch
+    buffers = [
+        ReplayBuffer(size // 2),
+        VectorReplayBuffer(size // 2, env_num),
+        RolloutBuffer(size // 2, env_num),
+    ]
+    for buf in buffers:
+        # more steps than fit, so that the buffers wrap around
+        env_ids = np.arange(getattr(buf, "buffer_num", 1))
+        for _ in range(size // len(env_ids)):
+            batch = Batch(
+                obs=np.random.random(len(env_ids)),
+                act=np.zeros(len(env_ids)),
+                rew=np.random.random(len(env_ids)),
+                terminated=np.random.random(len(env_ids)) < 0.05,
+                truncated=np.random.random(len(env_ids)) < 0.02,
+            )
+            buf.add(batch, buffer_ids=env_ids)
+        batch, indices = buf.sample(0)
+        v_s = np.random.random(len(indices))
+        v_s_ = np.random.random(len(indices))
+        for gae_lambda in [0.95, 1.0]:
+            returns, adv = fn(batch, buf, indices, v_s_, v_s, 0.99, gae_lambda)
+            torch_returns, torch_adv = torch_fn(
+                batch, buf, indices, torch.tensor(v_s_), torch.tensor(v_s), 0.99,
+                gae_lambda
+            )
+            assert np.allclose(returns, torch_returns.numpy())
+            assert np.allclose(adv, torch_adv.numpy())
+        returns, _ = fn(batch, buf, indices, gamma=0.9, gae_lambda=1.0)
+        torch_returns, _ = torch_fn(batch, buf, indices, gamma=0.9, gae_lambda=1.0)
+        assert np.allclose(returns, torch_returns.numpy())
+
+
+class LinearCritic(torch.nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.linear = torch.nn.Linear(1, 1)
+
+    def forward(self, obs):
+        return self.linear(torch.as_tensor(obs))
+
+
+def test_episodic_returns_reuse_next_value(env_num=3, size=30):
+    buf = VectorReplayBuffer(size, env_num)
+    obs = np.random.random((env_num, 1)).astype(np.float32)
+    # more steps than fit, so that the buffers wrap around mid-episode
+    for step in range(size // env_num + 7):
+        obs_next = np.random.random((env_num, 1)).astype(np.float32)
+        terminated = np.random.random(env_num) < 0.1
+        # env 0 is truncated every 4 steps, so its obs_next is not the next obs
+        truncated = (np.arange(env_num) == 0) & (step % 4 == 3)
+        buf.add(
+            Batch(
+                obs=obs,
+                act=np.zeros(env_num),
+                rew=np.random.random(env_num),
+                terminated=terminated,
+                truncated=truncated,
+                obs_next=obs_next,
+            )
+        )
+        done = terminated | truncated
+        obs = obs_next.copy()
+        obs[done] = np.random.random((done.sum(), 1))
+    batch, indices = buf.sample(0)
+    assert batch.truncated.any()
+    critic = LinearCritic()
+    results = []
+    for reuse_next_value in [False, True]:
+        policy = A2CPolicy(
+            torch.nn.Linear(1, 1),
+            critic,
+            torch.optim.SGD(critic.parameters(), lr=0.1),
+            torch.distributions.Normal,
+            gae_lambda=0.9,
+            max_batchsize=7,
+            reuse_next_value=reuse_next_value,
+        )
+        result = policy._compute_returns(Batch(batch, copy=True), buf, indices)
+        results.append((result.returns.numpy(), result.adv.numpy()))
+    assert np.allclose(results[0][0], results[1][0])
+    assert np.allclose(results[0][1], results[1][1])
+
+
 def target_q_fn(buffer, indices):
     # return the next reward
     indices = buffer.next(indices)
@@ -327,3 +450,6 @@ if __name__ == '__main__':
     test_nstep_returns()
     test_nstep_returns_with_timelimit()
     test_episodic_returns()
+    test_episodic_returns_rollout_buffer()
+    test_episodic_returns_torch()
+    test_episodic_returns_reuse_next_value()
@@ -0,0 +1,168 @@
+import json
+import os
+import pstats
+import tempfile
+
+import gymnasium as gym
+import numpy as np
+import torch
+from gymnasium.spaces import Box
+
+from tianshou.data import Batch, Collector, VectorReplayBuffer
+from tianshou.env import DummyVectorEnv, VectorEnvNormObs
+from tianshou.policy import BasePolicy
+from tianshou.trainer import BackgroundEvaluator, OnpolicyTrainer
+from tianshou.utils import EpochProfiler, LazyLogger
+
+
+class ActionRewardEnv(gym.Env):
+    """One-step episodes rewarded with the action taken."""
+
+    def __init__(self):
+        self.observation_space = Box(shape=(1, ), low=-1, high=1)
+        self.action_space = Box(shape=(1, ), low=-10, high=10)
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        return np.zeros(1, dtype=np.float32), {}
+
+    def step(self, action):
+        obs = np.zeros(1, dtype=np.float32)
+        return obs, float(np.asarray(action).ravel()[0]), True, False, {}
+
+
+class BiasPolicy(BasePolicy):
+    """Act with its bias, which every update increases by one."""
+
+    def __init__(self):
+        super().__init__()
+        self.bias = torch.nn.Parameter(torch.zeros(1))
+
+    def forward(self, batch, state=None, **kwargs):
+        act = self.bias.detach().numpy().repeat(len(batch.obs))[:, None]
+        return Batch(act=act)
+
+    def learn(self, batch, **kwargs):
+        with torch.no_grad():
+            self.bias += 1
+        return {"loss": 0.0}
+
+
+class RecordingLogger(LazyLogger):
+
+    def __init__(self):
+        super().__init__()
+        self.test_data = []
+        self.timing_data = []
+
+    def write(self, step_type, step, data):
+        if step_type == "timing/env_step":
+            self.timing_data.append((step, data))
+
+    def log_test_data(self, collect_result, step):
+        self.test_data.append((step, collect_result["rew"]))
+
+
+def test_background_evaluator():
+
+    def collector_fn():
+        test_envs = VectorEnvNormObs(
+            DummyVectorEnv([ActionRewardEnv for _ in range(2)]),
+            update_obs_rms=False
+        )
+        return Collector(BiasPolicy(), test_envs)
+
+    policy = BiasPolicy()
+    train_envs = VectorEnvNormObs(DummyVectorEnv([ActionRewardEnv]))
+    train_collector = Collector(policy, train_envs, VectorReplayBuffer(20, 1))
+    evaluator = BackgroundEvaluator(collector_fn, train_envs.get_obs_rms)
+    logger = RecordingLogger()
+    saved = []
+
+    def save_best_fn(policy):
+        saved.append((policy.bias.item(), evaluator.obs_rms is not None))
+
+    try:
+        result = OnpolicyTrainer(
+            policy,
+            train_collector,
+            None,
+            max_epoch=4,
+            step_per_epoch=2,
+            repeat_per_collect=1,
+            episode_per_test=3,
+            batch_size=0,
+            step_per_collect=2,
+            save_best_fn=save_best_fn,
+            logger=logger,
+            verbose=False,
+            show_progress=False,
+            evaluator=evaluator,
+        ).run()
+        assert len(evaluator) == 0
+    finally:
+        evaluator.close()
+    # every snapshot is tested with the weights and env step it was taken at
+    assert logger.test_data == [(0, 0.0), (2, 1.0), (4, 2.0), (6, 3.0), (8, 4.0)]
+    assert result["best_reward"] == 4.0
+    # save_best_fn first runs on reset, then with the better snapshots loaded
+    assert saved == [(0.0, False)] + [(float(i), True) for i in range(5)]
+    assert policy.bias.item() == 4.0
+
+
+def test_trainer_timing():
+    policy = BiasPolicy()
+    train_collector = Collector(
+        policy, DummyVectorEnv([ActionRewardEnv]), VectorReplayBuffer(20, 1)
+    )
+    test_collector = Collector(policy, DummyVectorEnv([ActionRewardEnv]))
+    for backend, suffix in [("torch", ".json"), ("cprofile", ".prof")]:
+        logger = RecordingLogger()
+        f, path = tempfile.mkstemp(suffix=suffix)
+        os.close(f)
+        trainer = OnpolicyTrainer(
+            policy,
+            train_collector,
+            test_collector,
+            max_epoch=3,
+            step_per_epoch=4,
+            repeat_per_collect=1,
+            episode_per_test=2,
+            batch_size=0,
+            step_per_collect=2,
+            logger=logger,
+            verbose=False,
+            show_progress=False,
+            timing=True,
+            profiler=EpochProfiler(path, start_epoch=2, backend=backend),
+        )
+        for epoch, epoch_stat, _ in trainer:
+            # the phases of the trainer, collectors and policy.update form a tree
+            for key in [
+                "collect", "collect/policy", "collect/env", "collect/buffer",
+                "update", "update/sample", "update/process_fn", "update/learn",
+                "update/log", "log", "save", "test", "test/policy", "test/reset",
+                "epoch", "other"
+            ]:
+                assert epoch_stat[f"timing/{key}"] >= 0, key
+            assert trainer.timing.counts["collect"] == 2
+            assert trainer.timing.counts["update/learn"] == 2
+        assert [step for step, _ in logger.timing_data] == [4, 8, 12]
+        assert [data for _, data in logger.timing_data][-1] == {
+            k: v
+            for k, v in epoch_stat.items() if k.startswith("timing/")
+        }
+        assert not trainer.timing.record_functions
+        if backend == "torch":
+            with open(path) as f:
+                names = {e.get("name") for e in json.load(f)["traceEvents"]}
+            assert "update/learn" in names and "collect/env" in names
+        else:
+            stats = pstats.Stats(path)
+            assert any(func[2] == "learn" for func in stats.stats)
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    test_background_evaluator()
+    test_trainer_timing()
@@ -1,8 +1,20 @@
+import tempfile
+
 import numpy as np
 import torch
+from tensorboard.backend.event_processing import event_accumulator
+from torch.utils.tensorboard import SummaryWriter
 
 from tianshou.exploration import GaussianNoise, OUNoise
-from tianshou.utils import MovAvg, MultipleLRSchedulers, RunningMeanStd
+from tianshou.utils import (
+    AsyncLogger,
+    DeferredMetrics,
+    LazyLogger,
+    MovAvg,
+    MultipleLRSchedulers,
+    RunningMeanStd,
+    TensorboardLogger,
+)
 from tianshou.utils.net.common import MLP, Net
 from tianshou.utils.net.continuous import RecurrentActorProb, RecurrentCritic
 
@@ -40,6 +52,22 @@ def test_rms():
     assert np.allclose(rms.var, np.array([[0, 0], [2, 14 / 3.]]), atol=1e-3)
 
 
+def test_deferred_metrics():
+    for deferred in [True, False]:
+        metrics = DeferredMetrics(
+            ["loss", "kl", "unused"], capacity=2, deferred=deferred
+        )
+        for i in range(5):
+            metrics.add("loss", torch.tensor(float(i)))
+            metrics.add("kl", torch.tensor([i / 2.0]))
+        metrics.add("kl", 3.0)
+        result = metrics.result()
+        assert list(result) == ["loss", "kl", "unused"]
+        assert result["loss"] == [0.0, 1.0, 2.0, 3.0, 4.0]
+        assert result["kl"] == [0.0, 0.5, 1.0, 1.5, 2.0, 3.0]
+        assert result["unused"] == []
+
+
 def test_net():
     # here test the networks that does not appear in the other script
     bsz = 64
@@ -138,9 +166,56 @@ def test_lr_schedulers():
     )
 
 
+def test_async_logger():
+    with tempfile.TemporaryDirectory() as log_dir:
+        # a long interval: only save_data / flush / close write the records
+        logger = AsyncLogger(
+            TensorboardLogger(SummaryWriter(log_dir), train_interval=2),
+            flush_interval=60.0
+        )
+        assert not logger.logger.write_flush
+        for step in range(1, 6):
+            logger.log_train_data({"n/ep": 1, "rew": step, "len": 2}, step)
+            logger.log_update_data({"loss": -step}, step)
+        ea = event_accumulator.EventAccumulator(log_dir)
+        ea.Reload()
+        assert "train/reward" not in ea.Tags()["scalars"]
+        saved = []
+        logger.save_data(3, 5, 5, lambda *args: saved.append(args))
+        assert saved == [(3, 5, 5)]
+        ea.Reload()
+        # the wrapped logger's intervals still apply, in the original order
+        assert [e.value for e in ea.Scalars("train/reward")] == [1, 3, 5]
+        assert "update/loss" not in ea.Tags()["scalars"]
+        logger.log_update_data({"loss": -6}, 1000)
+        logger.close()
+        ea.Reload()
+        assert [e.step for e in ea.Scalars("update/loss")] == [1000]
+        restored = AsyncLogger(TensorboardLogger(SummaryWriter(log_dir)))
+        assert restored.restore_data() == (3, 5, 5)
+        assert restored.logger.last_log_train_step == 5
+        restored.close()
+
+    class FailingLogger(LazyLogger):
+
+        def write(self, step_type, step, data):
+            raise ValueError(step)
+
+    logger = AsyncLogger(FailingLogger(), flush_interval=0.0)
+    logger.write("train/env_step", 7, {})
+    try:
+        logger.flush()
+        raise AssertionError("the error of the background thread is lost")
+    except ValueError as e:
+        assert e.args == (7, )
+    logger.close()
+
+
 if __name__ == '__main__':
     test_noise()
     test_moving_average()
     test_rms()
+    test_deferred_metrics()
     test_net()
     test_lr_schedulers()
+    test_async_logger()
@@ -1,11 +1,13 @@
 import copy
 import pickle
+import time
 
 import numpy as np
 import pytest
 import torch
 
 from tianshou.data import Batch
+from tianshou.data import batch as batch_module
 
 
 @pytest.fixture(scope="module")
@@ -130,5 +132,28 @@ def test_stack(data):
         data['batchs2'][i].stack_([data['batch0']])
 
 
+def test_schema_fast_path(data, monkeypatch):
+    """Compare cat/stack of same-layout batches with and without the schema cache"""
+    batches = [data['batch0']] * 8
+    durations, results = {}, {}
+    for enabled in (False, True):
+        monkeypatch.setattr(batch_module, "_SCHEMA_FAST_PATH", enabled)
+        start = time.time()
+        for _ in range(10000):
+            cat = Batch.cat(batches)
+            stack = Batch.stack(batches)
+        durations[enabled] = time.time() - start
+        results[enabled] = (cat, stack)
+    print(
+        f"\ncat+stack: {durations[False]:.3f}s generic, {durations[True]:.3f}s "
+        f"schema-cached, {durations[False] / durations[True]:.2f}x speedup"
+    )
+    for generic, cached in zip(results[False], results[True]):
+        assert sorted(generic.keys()) == sorted(cached.keys())
+        assert np.allclose(generic.a, cached.a)
+        assert torch.equal(generic.b.d, cached.b.d)
+        assert np.allclose(generic.b.e, cached.b.e)
+
+
 if __name__ == '__main__':
     pytest.main(["-s", "-k batch_profile", "--durations=0", "-v"])
@@ -18,7 +18,14 @@ from tianshou.data.buffer.vecbuf import (
     VectorReplayBuffer,
 )
 from tianshou.data.buffer.cached import CachedReplayBuffer
-from tianshou.data.collector import Collector, AsyncCollector
+from tianshou.data.buffer.rollout import RolloutBuffer
+from tianshou.data.buffer.lazy import LazyReplayBuffer
+from tianshou.data.collector import (
+    Collector,
+    AsyncCollector,
+    PipelinedCollector,
+    FastCollector,
+)
 
 __all__ = [
     "Batch",
@@ -36,6 +43,10 @@ __all__ = [
     "PrioritizedVectorReplayBuffer",
     "HERVectorReplayBuffer",
     "CachedReplayBuffer",
+    "RolloutBuffer",
+    "LazyReplayBuffer",
     "Collector",
     "AsyncCollector",
+    "PipelinedCollector",
+    "FastCollector",
 ]
@@ -158,6 +158,113 @@ def _parse_value(obj: Any) -> Optional[Union["Batch", np.ndarray, torch.Tensor]]
         return obj
 
 
+# Layouts seen by Batch.cat_ and Batch.stack_, mapped to their compiled plans.
+_SCHEMA_PLANS: Dict[tuple, "_SchemaPlan"] = {}
+_SCHEMA_PLANS_MAXSIZE = 1024
+_SCHEMA_FAST_PATH = True
+
+_NUMPY, _TORCH, _EMPTY, _NESTED = range(4)
+
+
+def _schema(batch: "Batch") -> Optional[tuple]:
+    """Return the hashable layout of a batch, or None if it has no fast path.
+
+    The layout holds every key with the kind, dtype, ndim (and device) of its value,
+    recursively. Values other than numeric arrays, tensors and Batch (scalars,
+    objects, None) have no fast path.
+    """
+    schema = []
+    for key, obj in batch.__dict__.items():
+        cls = type(obj)
+        if cls is np.ndarray:
+            if obj.dtype == object:
+                return None
+            schema.append((key, _NUMPY, obj.dtype, obj.ndim))
+        elif cls is torch.Tensor:
+            schema.append((key, _TORCH, obj.dtype, obj.ndim, obj.device))
+        elif cls is Batch:
+            if len(obj.__dict__) == 0:
+                schema.append((key, _EMPTY))
+                continue
+            sub_schema = _schema(obj)
+            if sub_schema is None:
+                return None
+            schema.append((key, _NESTED, sub_schema))
+        else:
+            return None
+    return tuple(schema)
+
+
+class _SchemaPlan:
+    """The precomputed accessors of one layout, see :func:`_schema`."""
+
+    def __init__(self, schema: tuple) -> None:
+        self.entries = [
+            (entry[0], entry[1],
+             _schema_plan(entry[2]) if entry[1] == _NESTED else None)
+            for entry in schema
+        ]
+        leaves = [entry for entry in schema if entry[1] in (_NUMPY, _TORCH)]
+        self.has_leaf = len(leaves) > 0 or any(
+            plan.has_leaf for _, _, plan in self.entries if plan is not None
+        )
+        # concatenation of zero-dimensional arrays is an error for the slow path
+        self.catable = all(entry[3] > 0 for entry in leaves) and all(
+            plan.catable for _, _, plan in self.entries if plan is not None
+        )
+
+    def cat(self, batches: Sequence["Batch"]) -> "Batch":
+        result = Batch()
+        for key, kind, plan in self.entries:
+            values = [batch.__dict__[key] for batch in batches]
+            if kind == _NUMPY:
+                result.__dict__[key] = np.concatenate(values)
+            elif kind == _TORCH:
+                result.__dict__[key] = torch.cat(values)
+            elif kind == _EMPTY:
+                result.__dict__[key] = Batch()
+            else:
+                result.__dict__[key] = plan.cat(values)  # type: ignore
+        return result
+
+    def stack(self, batches: Sequence["Batch"], axis: int) -> "Batch":
+        result = Batch()
+        for key, kind, plan in self.entries:
+            values = [batch.__dict__[key] for batch in batches]
+            if kind == _NUMPY:
+                result.__dict__[key] = np.stack(values, axis)
+            elif kind == _TORCH:
+                result.__dict__[key] = torch.stack(values, axis)
+            elif kind == _EMPTY:
+                result.__dict__[key] = Batch()
+            else:
+                result.__dict__[key] = plan.stack(values, axis)  # type: ignore
+        return result
+
+
+def _schema_plan(schema: tuple) -> _SchemaPlan:
+    plan = _SCHEMA_PLANS.get(schema)
+    if plan is None:
+        if len(_SCHEMA_PLANS) >= _SCHEMA_PLANS_MAXSIZE:
+            _SCHEMA_PLANS.clear()
+        plan = _SCHEMA_PLANS[schema] = _SchemaPlan(schema)
+    return plan
+
+
+def _shared_schema_plan(batches: Sequence["Batch"]) -> Optional[_SchemaPlan]:
+    """Return the plan of the layout shared by all batches, if there is one."""
+    if not _SCHEMA_FAST_PATH:
+        return None
+    schema = _schema(batches[0])
+    if schema is None:
+        return None
+    for batch in batches[1:]:
+        if _schema(batch) != schema:
+            return None
+    plan = _schema_plan(schema)
+    return plan if plan.has_leaf else None
+
+
 def _alloc_by_keys_diff(
     meta: "Batch", batch: "Batch", size: int, stack: bool = True
 ) -> None:
@@ -465,6 +572,17 @@ class Batch:
         if len(batch_list) == 0:
             return
         batches = batch_list
+        # fast path: every batch has the same layout, so no key can be partial
+        candidates = batches if self.is_empty() else [self] + batches
+        plan = _shared_schema_plan(candidates)
+        if plan is not None and plan.catable:
+            try:
+                result = plan.cat(candidates)
+            except (ValueError, RuntimeError):
+                pass  # e.g. mismatched shapes, let the slow path handle it
+            else:
+                self.__dict__.update(result.__dict__)
+                return
         try:
             # x.is_empty(recurse=True) here means x is a nested empty batch
             # like Batch(a=Batch), and we have to treat it as length zero and
@@ -524,6 +642,16 @@ class Batch:
         batches = batch_list
         if not self.is_empty():
             batches = [self] + batches
+        # fast path: every batch has the same layout, so no key can be partial
+        plan = _shared_schema_plan(batches)
+        if plan is not None:
+            try:
+                result = plan.stack(batches, axis)
+            except (ValueError, RuntimeError):
+                pass  # e.g. mismatched shapes, let the slow path handle it
+            else:
+                self.__dict__.update(result.__dict__)
+                return
         # collect non-empty keys
         keys_map = [
             set(
@@ -743,7 +871,8 @@ class Batch:
     def split(self,
               size: int,
               shuffle: bool = True,
-              merge_last: bool = False) -> Iterator["Batch"]:
+              merge_last: bool = False,
+              contiguous: bool = False) -> Iterator["Batch"]:
         """Split whole data into multiple small batches.
 
         :param int size: divide the data batch with the given size, but one
@@ -752,6 +881,11 @@ class Batch:
             True, otherwise remain in the same. Default to True.
         :param bool merge_last: merge the last batch into the previous one.
             Default to False.
+        :param bool contiguous: gather the whole batch into the shuffled order once
+            and yield slices of it, which are views instead of per-batch copies.
+            The batches hold the same data as without it, but writing into one in
+            place writes into that shared copy (or into self if not shuffled).
+            Default to False.
         """
         length = len(self)
         assert 1 <= size  # size can be greater than length, return whole batch
@@ -759,9 +893,16 @@ class Batch:
             indices = np.random.permutation(length)
         else:
             indices = np.arange(length)
+        source, order = self, indices
+        if contiguous:
+            # a single gather, after which every batch is a slice of the result
+            source, order = (self[indices] if shuffle else self), None
         merge_last = merge_last and length % size > 0
         for idx in range(0, length, size):
             if merge_last and idx + size + size >= length:
-                yield self[indices[idx:]]
+                end = length
+            else:
+                end = idx + size
+            yield source[slice(idx, end) if order is None else order[idx:end]]
+            if end >= length:
                 break
-            yield self[indices[idx:idx + size]]
@@ -1,10 +1,13 @@
+import json
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 import h5py
 import numpy as np
+from numba import njit
 
 from tianshou.data import Batch
 from tianshou.data.batch import _alloc_by_keys_diff, _create_value
+from tianshou.data.buffer.codec import make_codecs
 from tianshou.data.utils.converter import from_hdf5, to_hdf5
 
 
@@ -26,6 +29,12 @@ class ReplayBuffer:
         of (timestep, ...) because of temporal stacking. Default to False.
     :param bool sample_avail: the parameter indicating sampling only available index
         when using frame-stack sampling method. Default to False.
+    :param dict codecs: the storage codec of "obs", "obs_next" or "act", given as a
+        dtype ("float32", "float16") or a dict like ``{"dtype": "uint8", "low": low,
+        "high": high}`` for an affine int8/uint8 quantization with per-dimension
+        bounds. Values are encoded when added and decoded (to float32) when indexed;
+        "obs_next" uses the codec of "obs" unless given its own. Default to None
+        (store every key at the dtype it arrives in).
     """
 
     _reserved_keys = (
@@ -35,6 +44,7 @@ class ReplayBuffer:
     _input_keys = (
         "obs", "act", "rew", "terminated", "truncated", "obs_next", "info", "policy"
     )
+    _codec_keys = ("obs", "obs_next", "act")
 
     def __init__(
         self,
@@ -43,13 +53,17 @@ class ReplayBuffer:
         ignore_obs_next: bool = False,
         save_only_last_obs: bool = False,
         sample_avail: bool = False,
+        codecs: Optional[Dict[str, Any]] = None,
         **kwargs: Any,  # otherwise PrioritizedVectorReplayBuffer will cause TypeError
     ) -> None:
+        self._codecs = make_codecs(codecs, self._codec_keys)
         self.options: Dict[str, Any] = {
             "stack_num": stack_num,
             "ignore_obs_next": ignore_obs_next,
             "save_only_last_obs": save_only_last_obs,
             "sample_avail": sample_avail,
+            "codecs": {key: codec.config()
+                       for key, codec in self._codecs.items()} or None,
         }
         super().__init__()
         self.maxsize = int(size)
@@ -61,6 +75,8 @@ class ReplayBuffer:
         self._sample_avail = sample_avail
         self._meta: Batch = Batch()
         self._ep_rew: Union[float, np.ndarray]
+        # row i holds the indices stacked by get(i), built on the first stacked get
+        self._stack_table: Optional[np.ndarray] = None
         self.reset()
 
     def __len__(self) -> int:
@@ -85,6 +101,8 @@ class ReplayBuffer:
         ("buffer.__getattr__" is customized).
         """
         self.__dict__.update(state)
+        self.__dict__.setdefault("_codecs", {})
+        self.__dict__.setdefault("_stack_table", None)
 
     def __setattr__(self, key: str, value: Any) -> None:
         """Set self.key = value."""
@@ -96,6 +114,30 @@ class ReplayBuffer:
         """Save replay buffer to HDF5 file."""
         with h5py.File(path, "w") as f:
             to_hdf5(self.__dict__, f, compression=compression)
+            self._record_codecs(f)
+
+    def _record_codecs(self, f: h5py.File) -> None:
+        """Tag every encoded dataset with its codec."""
+        for key, codec in self._codecs.items():
+            if "_meta" in f and key in f["_meta"]:
+                f["_meta"][key].attrs["codec"] = json.dumps(codec.config())
+
+    def _encode(self, batch: Batch) -> None:
+        """Encode the keys of batch that have a storage codec in place."""
+        for key, codec in self._codecs.items():
+            value = batch.__dict__.get(key)
+            if value is None:
+                continue
+            if not isinstance(value, np.ndarray) or value.dtype == object:
+                raise ValueError("Storage codecs only apply to arrays", key)
+            batch.__dict__[key] = codec.encode(value)
+
+    def _decode(self, key: str, value: Any) -> Any:
+        """Decode the stored value of key."""
+        codec = self._codecs.get(key)
+        if codec is None or not isinstance(value, np.ndarray):
+            return value
+        return codec.decode(value)
 
     @classmethod
     def load_hdf5(cls, path: str, device: Optional[str] = None) -> "ReplayBuffer":
@@ -135,6 +177,7 @@ class ReplayBuffer:
         """Clear all the data in replay buffer and episode statistics."""
         self.last_index = np.array([0])
         self._index = self._size = 0
+        self._stack_table = None
         if not keep_statistics:
             self._ep_rew, self._ep_len, self._ep_idx = 0.0, 0, 0
 
@@ -144,6 +187,46 @@ class ReplayBuffer:
             self._reserved_keys
         ), "Input batch doesn't meet ReplayBuffer's data form requirement."
         self._meta = batch
+        self._stack_table = None
+
+    def _stack_successors(self, index: np.ndarray) -> np.ndarray:
+        """Return the index and the stack_num - 1 storage slots written after it."""
+        return (index[:, None] + np.arange(self.stack_num)) % self.maxsize
+
+    def _fill_stack_table(self, index: np.ndarray) -> None:
+        """Recompute the frame-stack rows of index with the prev() chains."""
+        assert self._stack_table is not None
+        table = self._stack_table
+        if len(self) == 0:
+            table[index] = index[:, None]
+            return
+        table[index, -1] = prev_index = index
+        for i in range(self.stack_num - 2, -1, -1):
+            table[index, i] = prev_index = self.prev(prev_index)
+
+    def _refresh_stack_table(self, index: Union[List[int], np.ndarray]) -> None:
+        """Update the frame-stack table after the transitions at index were written.
+
+        Only the written rows and the next stack_num - 1 rows of the same buffer can
+        change: the latter may have stacked the overwritten transitions.
+        """
+        if self._stack_table is None:
+            return
+        if self._stack_table.shape[1] != self.stack_num:  # stack_num was changed
+            self._stack_table = None
+            return
+        index = np.asarray(index, dtype=int).reshape(-1)
+        self._fill_stack_table(self._stack_successors(index).reshape(-1))
+
+    def _stack_index(
+        self, index: Union[int, List[int], np.ndarray], stack_num: int
+    ) -> np.ndarray:
+        """Return the indices stacked by get(index), with shape [*index.shape, \
+        stack_num]."""
+        if self._stack_table is None or self._stack_table.shape[1] != self.stack_num:
+            self._stack_table = np.empty((self.maxsize, self.stack_num), int)
+            self._fill_stack_table(np.arange(self.maxsize))
+        return self._stack_table[index, self.stack_num - stack_num:]
 
     def unfinished_index(self) -> np.ndarray:
         """Return the index of unfinished episode."""
@@ -186,10 +269,16 @@ class ReplayBuffer:
             self._index = (self._index + 1) % self.maxsize
             self._size = min(self._size + 1, self.maxsize)
         to_indices = np.array(to_indices)
+        batch = buffer._meta[from_indices]
+        if buffer.options.get("codecs") != self.options["codecs"]:
+            for key in self._codec_keys:
+                if key in batch:
+                    batch.__dict__[key] = buffer._decode(key, batch[key])
+            self._encode(batch)
         if self._meta.is_empty():
-            self._meta = _create_value(  # type: ignore
-                buffer._meta, self.maxsize, stack=False)
-        self._meta[to_indices] = buffer._meta[from_indices]
+            self._alloc(batch, stack=False)
+        self._meta[to_indices] = batch
+        self._refresh_stack_table(to_indices)
         return to_indices
 
     def _add_index(self, rew: Union[float, np.ndarray],
@@ -249,6 +338,7 @@ class ReplayBuffer:
             batch.obs_next = (
                 batch.obs_next[:, -1] if stacked_batch else batch.obs_next[-1]
             )
+        self._encode(batch)
         # get ptr
         if stacked_batch:
             rew, done = batch.rew[0], batch.done[0]
@@ -265,14 +355,105 @@ class ReplayBuffer:
             batch.done = batch.done.astype(bool)
             batch.terminated = batch.terminated.astype(bool)
             batch.truncated = batch.truncated.astype(bool)
-            if self._meta.is_empty():
-                self._meta = _create_value(  # type: ignore
-                    batch, self.maxsize, stack)
-            else:  # dynamic key pops up in batch
-                _alloc_by_keys_diff(self._meta, batch, self.maxsize, stack)
+            self._alloc(batch, stack)
             self._meta[ptr] = batch
+        self._refresh_stack_table(ptr)
         return ptr, ep_rew, ep_len, ep_idx
 
+    def _alloc(self, batch: Batch, stack: bool) -> None:
+        """Allocate the storage of the keys in batch which the buffer doesn't have."""
+        if self._meta.is_empty():
+            self._meta = _create_value(  # type: ignore
+                batch, self.maxsize, stack)
+        else:  # dynamic key pops up in batch
+            _alloc_by_keys_diff(self._meta, batch, self.maxsize, stack)
+
+    def _prepare_block(self, batch: Batch, batch_ndim: int) -> Batch:
+        """Preprocess a block of transitions with ``batch_ndim`` leading dimensions \
+        the same way as :meth:`add` does."""
+        new_batch = Batch()
+        for key in set(self._input_keys).intersection(batch.keys()):
+            new_batch.__dict__[key] = batch[key]
+        batch = new_batch
+        batch.__dict__["done"] = np.logical_or(batch.terminated, batch.truncated)
+        assert set(["obs", "act", "rew", "terminated", "truncated",
+                    "done"]).issubset(batch.keys())
+        last_obs = (slice(None), ) * batch_ndim + (-1, )
+        if self._save_only_last_obs:
+            batch.obs = batch.obs[last_obs]
+        if not self._save_obs_next:
+            batch.pop("obs_next", None)
+        elif self._save_only_last_obs:
+            batch.obs_next = batch.obs_next[last_obs]
+        self._encode(batch)
+        return batch
+
+    def add_many(
+        self,
+        batch: Batch,
+        buffer_ids: Optional[Union[np.ndarray, List[int]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Add a block of consecutive transitions into replay buffer.
+
+        It is equivalent to calling :meth:`add` with ``batch[t]`` for every t in
+        order, but the circular index and the episode statistics of the whole block
+        are maintained at once.
+
+        :param Batch batch: the input data block with shape [T, ...]. Its keys must
+            belong to the 7 input keys, and "obs", "act", "rew", "terminated",
+            "truncated" is required.
+        :param buffer_ids: to make consistent with other buffer's add_many function;
+            if it is not None, we assume the block's shape is [T, 1, ...].
+
+        Return (current_index, episode_reward, episode_length, episode_start_index)
+        of every transition, each with shape [T] (or [T, 1] if buffer_ids is given).
+        If the episode is not finished, the return value of episode_length and
+        episode_reward is 0.
+        """
+        stacked_batch = buffer_ids is not None
+        if stacked_batch:
+            batch = batch[:, 0]
+        batch = self._prepare_block(batch, 1)
+        length = len(batch.done)
+        ptr = (self._index + np.arange(length)) % self.maxsize
+        ep_rew, ep_len, ep_idx, carry = _add_block_index(
+            np.asarray(batch.rew)[:, None], batch.done[:, None], ptr[:, None],
+            np.array([self.maxsize]),
+            [(self._ep_rew, self._ep_len, self._ep_idx)]
+        )
+        if length > 0:
+            self.last_index[0] = ptr[-1]
+            self._index = (self._index + length) % self.maxsize
+            self._size = min(self._size + length, self.maxsize)
+            self._ep_rew, self._ep_len, self._ep_idx = carry[0]
+        # only the newest maxsize transitions survive the block
+        keep = slice(max(length - self.maxsize, 0), None)
+        try:
+            self._meta[ptr[keep]] = batch[keep]
+        except ValueError:
+            batch.rew = batch.rew.astype(float)
+            batch.done = batch.done.astype(bool)
+            batch.terminated = batch.terminated.astype(bool)
+            batch.truncated = batch.truncated.astype(bool)
+            self._alloc(batch, stack=False)
+            self._meta[ptr[keep]] = batch[keep]
+        self._refresh_stack_table(ptr[keep])
+        if stacked_batch:
+            return ptr[:, None], ep_rew, ep_len, ep_idx
+        return ptr, ep_rew[:, 0], ep_len[:, 0], ep_idx[:, 0]
+
+    def _ordered_indices(self) -> np.ndarray:
+        """Return the indices of all the stored transitions, from oldest to newest."""
+        return np.concatenate(
+            [np.arange(self._index, self._size),
+             np.arange(self._index)]
+        )
+
+    def _stack_avail(self, indices: np.ndarray) -> np.ndarray:
+        """Keep the indices whose frame stack doesn't repeat its first frame."""
+        stack = self._stack_index(indices, self.stack_num)
+        return indices[stack[:, 0] != stack[:, 1]]
+
     def sample_indices(self, batch_size: int) -> np.ndarray:
         """Get a random sample of index with size = batch_size.
 
@@ -283,22 +464,13 @@ class ReplayBuffer:
             if batch_size > 0:
                 return np.random.choice(self._size, batch_size)
             elif batch_size == 0:  # construct current available indices
-                return np.concatenate(
-                    [np.arange(self._index, self._size),
-                     np.arange(self._index)]
-                )
+                return self._ordered_indices()
             else:
                 return np.array([], int)
         else:
             if batch_size < 0:
                 return np.array([], int)
-            all_indices = prev_indices = np.concatenate(
-                [np.arange(self._index, self._size),
-                 np.arange(self._index)]
-            )
-            for _ in range(self.stack_num - 2):
-                prev_indices = self.prev(prev_indices)
-            all_indices = all_indices[prev_indices != self.prev(prev_indices)]
+            all_indices = self._stack_avail(self._ordered_indices())
             if batch_size > 0:
                 return np.random.choice(all_indices, batch_size)
             else:
@@ -339,7 +511,9 @@ class ReplayBuffer:
             stack_num = self.stack_num
         try:
             if stack_num == 1:  # the most often case
-                return val[index]
+                return self._decode(key, val[index])
+            if stack_num <= self.stack_num:
+                return self._decode(key, val[self._stack_index(index, stack_num)])
             stack: List[Any] = []
             if isinstance(index, list):
                 indices = np.array(index)
@@ -351,7 +525,7 @@ class ReplayBuffer:
             if isinstance(val, Batch):
                 return Batch.stack(stack, axis=indices.ndim)
             else:
-                return np.stack(stack, axis=indices.ndim)
+                return self._decode(key, np.stack(stack, axis=indices.ndim))
         except IndexError as exception:
             if not (isinstance(val, Batch) and val.is_empty()):
                 raise exception  # val != Batch()
@@ -378,7 +552,7 @@ class ReplayBuffer:
             obs_next = self.get(self.next(indices), "obs", Batch())
         return Batch(
             obs=obs,
-            act=self.act[indices],
+            act=self._decode("act", self.act[indices]),
             rew=self.rew[indices],
             terminated=self.terminated[indices],
             truncated=self.truncated[indices],
@@ -387,3 +561,70 @@ class ReplayBuffer:
             info=self.get(indices, "info", Batch()),
             policy=self.get(indices, "policy", Batch()),
         )
+
+
+def _add_block_index(
+    rew: np.ndarray,
+    done: np.ndarray,
+    ptrs: np.ndarray,
+    sizes: np.ndarray,
+    stats: List[Tuple[Union[float, np.ndarray], int, int]],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[Tuple[Any, int, int]]]:
+    """Maintain the episode statistics of N buffers after adding a [T, N] block.
+
+    :param rew: the rewards with shape [T, N, ...].
+    :param done: the done flags with shape [T, N].
+    :param ptrs: the index every transition is written to inside its own buffer.
+    :param sizes: the maxsize of every buffer.
+    :param stats: (episode_reward, episode_length, episode_start_index) of every
+        buffer before the block.
+
+    Return (episode_reward, episode_length, episode_start_index) of every transition
+    as in :meth:`ReplayBuffer._add_index`, and the statistics after the block.
+    """
+    rew = np.asarray(rew, dtype=float)
+    length, num = done.shape
+    rew_shape = rew.shape[2:]
+    ep_rew = np.zeros((num, int(np.prod(rew_shape))))
+    for i, (cur_rew, _, _) in enumerate(stats):
+        ep_rew[i] = np.broadcast_to(cur_rew, rew_shape).reshape(-1)
+    ep_len = np.array([cur_len for _, cur_len, _ in stats], dtype=np.int64)
+    ep_idx = np.array([cur_idx for _, _, cur_idx in stats], dtype=np.int64)
+    out_rew, out_len, out_idx = _episode_block(
+        rew.reshape(length, num, -1), np.asarray(done, dtype=bool),
+        np.asarray(ptrs, dtype=np.int64), np.asarray(sizes, dtype=np.int64),
+        ep_rew, ep_len, ep_idx
+    )
+    carry = [
+        (cur_rew[0] if len(rew_shape) == 0 else cur_rew.reshape(rew_shape),
+         int(cur_len), int(cur_idx))
+        for cur_rew, cur_len, cur_idx in zip(ep_rew, ep_len, ep_idx)
+    ]
+    return out_rew.reshape(rew.shape), out_len, out_idx, carry
+
+
+@njit
+def _episode_block(
+    rew: np.ndarray,
+    done: np.ndarray,
+    ptrs: np.ndarray,
+    sizes: np.ndarray,
+    ep_rew: np.ndarray,
+    ep_len: np.ndarray,
+    ep_idx: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    out_rew = np.zeros(rew.shape)
+    out_len = np.zeros(done.shape, np.int64)
+    out_idx = np.zeros(done.shape, np.int64)
+    for i in range(done.shape[1]):
+        for t in range(done.shape[0]):
+            ep_rew[i] += rew[t, i]
+            ep_len[i] += 1
+            out_idx[t, i] = ep_idx[i]
+            if done[t, i]:
+                out_rew[t, i] = ep_rew[i]
+                out_len[t, i] = ep_len[i]
+                ep_rew[i] = 0.0
+                ep_len[i] = 0
+                ep_idx[i] = (ptrs[t, i] + 1) % sizes[i]
+    return out_rew, out_len, out_idx
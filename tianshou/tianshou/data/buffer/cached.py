@@ -69,7 +69,7 @@ class CachedReplayBuffer(ReplayBufferManager):
         updated_ptr, updated_ep_idx = [], []
         done = np.logical_or(batch.terminated, batch.truncated)
         for buffer_idx in buf_arr[done]:
-            index = self.main_buffer.update(self.buffers[buffer_idx])
+            index = moved = self.main_buffer.update(self.buffers[buffer_idx])
             if len(index) == 0:  # unsuccessful move, replace with -1
                 index = [-1]
             updated_ep_idx.append(index[0])
@@ -79,6 +79,26 @@ class CachedReplayBuffer(ReplayBufferManager):
             self._lengths[buffer_idx] = 0
             self.last_index[0] = index[-1]
             self.last_index[buffer_idx] = self._offset[buffer_idx]
+            self._refresh_stack_table(moved)
         ptr[done] = updated_ptr
         ep_idx[done] = updated_ep_idx
         return ptr, ep_rew, ep_len, ep_idx
+
+    def add_many(
+        self,
+        batch: Batch,
+        buffer_ids: Optional[Union[np.ndarray, List[int]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Add a time-major block of data into CachedReplayBuffer.
+
+        Finished episodes are moved to the main buffer one step at a time, so this
+        simply calls :meth:`add` with ``batch[t]`` for every t in order.
+
+        Return (current_index, episode_reward, episode_length, episode_start_index),
+        each stacked along the first dimension.
+        """
+        results = [self.add(batch[t], buffer_ids) for t in range(len(batch))]
+        if len(results) == 0:
+            return tuple(np.array([], int) for _ in range(4))  # type: ignore
+        ptr, ep_rew, ep_len, ep_idx = map(np.stack, zip(*results))
+        return ptr, ep_rew, ep_len, ep_idx
@@ -0,0 +1,114 @@
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+
+class CastCodec:
+    """Store an array key at a lower floating point precision.
+
+    float16 values are decoded to float32, since most CPUs have no fast float16
+    arithmetic; float32 values are returned as they are stored.
+
+    :param dtype: the storage dtype, float32 or float16.
+    """
+
+    def __init__(self, dtype: Union[str, np.dtype]) -> None:
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float16):
+            raise ValueError("CastCodec stores float32 or float16", self.dtype)
+        self.decode_dtype = np.dtype(np.float32)
+
+    def encode(self, value: np.ndarray) -> np.ndarray:
+        return np.asarray(value).astype(self.dtype, copy=False)
+
+    def decode(self, value: np.ndarray) -> np.ndarray:
+        return value.astype(self.decode_dtype, copy=False)
+
+    def config(self) -> Dict[str, Any]:
+        return {"dtype": self.dtype.name}
+
+
+class AffineCodec:
+    """Store an array key as int8/uint8 with a per-dimension affine quantization.
+
+    Every dimension is mapped linearly from [low, high] onto the whole integer range
+    of the storage dtype; values outside of the bounds are clipped. Decoded values
+    are float32.
+
+    :param dtype: the storage dtype, int8 or uint8.
+    :param low: the lower bound, a scalar or an array broadcastable to the shape of
+        one stored row.
+    :param high: the upper bound, with the same form as low.
+    """
+
+    def __init__(self, dtype: Union[str, np.dtype], low: Any, high: Any) -> None:
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.int8, np.uint8):
+            raise ValueError("AffineCodec stores int8 or uint8", self.dtype)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        if np.any(self.high < self.low):
+            raise ValueError("AffineCodec needs low <= high", self.low, self.high)
+        info = np.iinfo(self.dtype)
+        self._qmin, self._qmax = info.min, info.max
+        scale = (self.high - self.low) / (info.max - info.min)
+        self._scale = np.where(scale > 0, scale, 1.0)
+        self._decode_scale = self._scale.astype(np.float32)
+        self._decode_offset = (self.low - info.min * self._scale).astype(np.float32)
+
+    def encode(self, value: np.ndarray) -> np.ndarray:
+        quantized = np.rint((np.asarray(value) - self.low) / self._scale) + self._qmin
+        return np.clip(quantized, self._qmin, self._qmax).astype(self.dtype)
+
+    def decode(self, value: np.ndarray) -> np.ndarray:
+        return value.astype(np.float32) * self._decode_scale + self._decode_offset
+
+    def config(self) -> Dict[str, Any]:
+        return {
+            "dtype": self.dtype.name,
+            "low": self.low.tolist(),
+            "high": self.high.tolist(),
+        }
+
+
+Codec = Union[CastCodec, AffineCodec]
+
+
+def make_codec(spec: Union[str, np.dtype, Dict[str, Any]]) -> Codec:
+    """Build a storage codec from a dtype, or a dict with "dtype" and for int8/uint8 \
+    also "low" and "high"."""
+    if isinstance(spec, dict):
+        config = dict(spec)
+    else:
+        config = {"dtype": spec}
+    dtype = np.dtype(config.pop("dtype"))
+    if dtype.kind == "f":
+        if config:
+            raise ValueError("Unknown codec arguments", sorted(config))
+        return CastCodec(dtype)
+    if dtype.kind in "iu":
+        if set(config) != {"low", "high"}:
+            raise ValueError(
+                "Integer codecs need exactly the low and high bounds", dtype,
+                sorted(config)
+            )
+        return AffineCodec(dtype, config["low"], config["high"])
+    raise ValueError("Unsupported codec dtype", dtype)
+
+
+def make_codecs(
+    specs: Optional[Dict[str, Union[str, np.dtype, Dict[str, Any]]]],
+    keys: tuple,
+) -> Dict[str, Codec]:
+    """Build the codec of every key in specs, which must all belong to keys.
+
+    "obs_next" uses the codec of "obs" unless it has one of its own.
+    """
+    codecs: Dict[str, Codec] = {}
+    for key, spec in (specs or {}).items():
+        if key not in keys:
+            raise ValueError("Storage codecs only apply to the keys", keys, key)
+        codecs[key] = make_codec(spec)
+    if "obs" in codecs and "obs_next" in keys:
+        codecs.setdefault("obs_next", codecs["obs"])
+    return codecs
@@ -41,6 +41,49 @@ class HERReplayBuffer(ReplayBuffer):
         self.compute_reward_fn = compute_reward_fn
         self._original_meta = Batch()
         self._altered_indices = np.array([])
+        self._reset_episode_index()
+
+    def _reset_episode_index(self) -> None:
+        # Every stored transition gets the id of its episode, and _ep_last maps an
+        # episode id (modulo maxsize, at most maxsize episodes are alive at once) to
+        # the index of its newest transition, i.e. where next() stops.
+        self._ep_ids = np.zeros(self.maxsize, int)
+        self._ep_last = np.zeros(self.maxsize, int)
+        self._ep_count = 0
+        self._episode_index_valid = True
+
+    def _track_episodes(self, ptrs: np.ndarray, done: np.ndarray) -> None:
+        """Update the episode index after writing ptrs in chronological order."""
+        if not getattr(self, "_episode_index_valid", False):
+            return
+        done = np.asarray(done, dtype=bool).reshape(-1)
+        ep_ids = self._ep_count + np.cumsum(done) - done
+        self._ep_count += int(done.sum())
+        # only the newest maxsize transitions survive
+        ptrs, ep_ids = ptrs[-self.maxsize:], ep_ids[-self.maxsize:]
+        self._ep_ids[ptrs] = ep_ids
+        # the newest transition of every episode is its last one in ptrs
+        last = len(ep_ids) - 1 - np.unique(ep_ids[::-1], return_index=True)[1]
+        self._ep_last[ep_ids[last] % self.maxsize] = ptrs[last]
+
+    def _episode_last(self, indices: np.ndarray) -> np.ndarray:
+        """Return the newest transition of the episode of every index."""
+        if not getattr(self, "_episode_index_valid", False):
+            self._reset_episode_index()
+            ordered = self._ordered_indices()
+            self._track_episodes(ordered, self.done[ordered])
+        return self._ep_last[self._ep_ids[indices] % self.maxsize]
+
+    def _add_index(self, rew: Union[float, np.ndarray],
+                   done: bool) -> Tuple[int, Union[float, np.ndarray], int, int]:
+        result = super()._add_index(rew, done)
+        if getattr(self, "_episode_index_valid", False):
+            # _track_episodes for a single transition, without the array calls
+            ptr, ep_id = result[0], self._ep_count
+            self._ep_ids[ptr] = ep_id
+            self._ep_last[ep_id % self.maxsize] = ptr
+            self._ep_count += int(done)
+        return result
 
     def _restore_cache(self) -> None:
         """Write cached original meta back to `self._meta`.
@@ -59,6 +102,7 @@ class HERReplayBuffer(ReplayBuffer):
 
     def reset(self, keep_statistics: bool = False) -> None:
         self._restore_cache()
+        self._episode_index_valid = False
         return super().reset(keep_statistics)
 
     def save_hdf5(self, path: str, compression: Optional[str] = None) -> None:
@@ -67,10 +111,12 @@ class HERReplayBuffer(ReplayBuffer):
 
     def set_batch(self, batch: Batch) -> None:
         self._restore_cache()
+        self._episode_index_valid = False
         return super().set_batch(batch)
 
     def update(self, buffer: Union["HERReplayBuffer", "ReplayBuffer"]) -> np.ndarray:
         self._restore_cache()
+        self._episode_index_valid = False
         return super().update(buffer)
 
     def add(
@@ -81,6 +127,18 @@ class HERReplayBuffer(ReplayBuffer):
         self._restore_cache()
         return super().add(batch, buffer_ids)
 
+    def add_many(
+        self,
+        batch: Batch,
+        buffer_ids: Optional[Union[np.ndarray, List[int]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        self._restore_cache()
+        result = super().add_many(batch, buffer_ids)
+        self._track_episodes(
+            result[0].reshape(-1), np.logical_or(batch.terminated, batch.truncated)
+        )
+        return result
+
     def sample_indices(self, batch_size: int) -> np.ndarray:
         """Get a random sample of index with size = batch_size.
 
@@ -111,16 +169,18 @@ class HERReplayBuffer(ReplayBuffer):
         indices = np.sort(indices)
         indices[indices >= self.maxsize] -= self.maxsize
 
-        # Construct episode trajectories
-        indices = [indices]
-        for _ in range(self.horizon - 1):
-            indices.append(self.next(indices[-1]))
-        indices = np.stack(indices)
+        # Construct episode trajectories, each one stops at the episode's newest
+        # transition like next() does
+        current = indices
+        steps = np.minimum(
+            (self._episode_last(current) - current) % self.maxsize, self.horizon - 1
+        )
+        offsets = np.minimum(np.arange(self.horizon)[:, None], steps)
+        indices = (current + offsets) % self.maxsize
 
         # Calculate future timestep to use
-        current = indices[0]
         terminal = indices[-1]
-        episodes_len = (terminal - current + self.maxsize) % self.maxsize
+        episodes_len = steps
         future_offset = np.random.uniform(size=len(indices[0])) * episodes_len
         future_offset = np.round(future_offset).astype(int)
         future_t = (current + future_offset) % self.maxsize
@@ -129,7 +189,6 @@ class HERReplayBuffer(ReplayBuffer):
         #   open indices are used to find longest, unique trajectories among
         #   presented episodes
         unique_ep_open_indices = np.sort(np.unique(terminal, return_index=True)[1])
-        unique_ep_indices = indices[:, unique_ep_open_indices]
         #   close indices are used to find max future_t among presented episodes
         unique_ep_close_indices = np.hstack(
             [(unique_ep_open_indices - 1)[1:],
@@ -141,32 +200,31 @@ class HERReplayBuffer(ReplayBuffer):
             size=int(len(unique_ep_open_indices) * self.future_p),
             replace=False
         )
+        if len(her_ep_indices) == 0:
+            return
+        her_ep_indices = np.sort(her_ep_indices)
+        unique_ep_indices = indices[:, unique_ep_open_indices[her_ep_indices]]
+        future_t = future_t[unique_ep_close_indices[her_ep_indices]]
 
         # Cache original meta
         self._altered_indices = unique_ep_indices.copy()
         self._original_meta = self._meta[self._altered_indices].copy()
 
-        # Copy original obs, ep_rew (and obs_next), and obs of future time step
-        ep_obs = self[unique_ep_indices].obs
-        ep_rew = self[unique_ep_indices].rew
-        if self._save_obs_next:
-            ep_obs_next = self[unique_ep_indices].obs_next
-            future_obs = self[future_t[unique_ep_close_indices]].obs_next
-        else:
-            future_obs = self[self.next(future_t[unique_ep_close_indices])].obs
-
-        # Re-assign goals and rewards via broadcast assignment
-        ep_obs.desired_goal[:, her_ep_indices] = \
-            future_obs.achieved_goal[None, her_ep_indices]
+        # Gather the obs (and obs_next) of the altered episodes, and the obs of the
+        # future time step
+        ep_obs = self.get(unique_ep_indices, "obs")
         if self._save_obs_next:
-            ep_obs_next.desired_goal[:, her_ep_indices] = \
-                future_obs.achieved_goal[None, her_ep_indices]
-            ep_rew[:, her_ep_indices] = \
-                self._compute_reward(ep_obs_next)[:, her_ep_indices]
+            ep_obs_next = self.get(unique_ep_indices, "obs_next")
+            future_obs = self.get(future_t, "obs_next")
         else:
-            tmp_ep_obs_next = self[self.next(unique_ep_indices)].obs
-            ep_rew[:, her_ep_indices] = \
-                self._compute_reward(tmp_ep_obs_next)[:, her_ep_indices]
+            ep_obs_next = self.get(self.next(unique_ep_indices), "obs")
+            future_obs = self.get(self.next(future_t), "obs")
+
+        # Re-assign goals via broadcast assignment, and recompute all the rewards of
+        # the altered episodes at once
+        ep_obs.desired_goal[:] = future_obs.achieved_goal[None]
+        ep_obs_next.desired_goal[:] = future_obs.achieved_goal[None]
+        ep_rew = self._compute_reward(ep_obs_next)
 
         # Sanity check
         assert ep_obs.desired_goal.shape[:2] == unique_ep_indices.shape
@@ -0,0 +1,539 @@
+import json
+import os
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import h5py
+import numpy as np
+import torch
+
+from tianshou.data import Batch, ReplayBuffer
+from tianshou.data.batch import _create_value
+from tianshou.data.utils.converter import from_hdf5, to_hdf5
+
+IndexType = Union[slice, int, np.ndarray, List[int]]
+
+
+class _PageCache:
+    """A least-recently-used cache of row pages, bounded by their total bytes."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = self.misses = 0
+        self._pages: "OrderedDict[Tuple[str, int], np.ndarray]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"max_bytes": self.max_bytes}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["max_bytes"])  # type: ignore
+
+    def get(self, key: Tuple[str, int]) -> Optional[np.ndarray]:
+        page = self._pages.get(key)
+        if page is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._pages.move_to_end(key)
+        return page
+
+    def peek(self, key: Tuple[str, int]) -> Optional[np.ndarray]:
+        """Return the page without counting it as used."""
+        return self._pages.get(key)
+
+    def put(self, key: Tuple[str, int], page: np.ndarray) -> None:
+        self._pages[key] = page
+        self.nbytes += page.nbytes
+        while self.nbytes > self.max_bytes and len(self._pages) > 1:
+            _, evicted = self._pages.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self) -> None:
+        self._pages.clear()
+        self.nbytes = 0
+
+
+class _ChunkFiles:
+    """Rows of one key stored in memory-mapped ``.npy`` files of chunk_size rows.
+
+    A chunk file is only created when a row in it is written for the first time;
+    rows of missing chunks read as zeros.
+    """
+
+    def __init__(
+        self, prefix: str, row_shape: Tuple[int, ...], dtype: np.dtype,
+        chunk_size: int
+    ) -> None:
+        self.prefix = prefix
+        self.row_shape = row_shape
+        self.dtype = dtype
+        self.chunk_size = chunk_size
+        self._maps: Dict[int, np.ndarray] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        self.flush()
+        state = dict(self.__dict__)
+        state["_maps"] = {}
+        return state
+
+    def _chunk(self, chunk: int, create: bool) -> Optional[np.ndarray]:
+        chunk_map = self._maps.get(chunk)
+        if chunk_map is None:
+            filename = f"{self.prefix}.{chunk}.npy"
+            if os.path.exists(filename):
+                chunk_map = np.load(filename, mmap_mode="r+")
+            elif create:
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                chunk_map = np.lib.format.open_memmap(
+                    filename,
+                    mode="w+",
+                    dtype=self.dtype,
+                    shape=(self.chunk_size, *self.row_shape)
+                )
+            else:
+                return None
+            self._maps[chunk] = chunk_map
+        return chunk_map
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        """Read rows [start, stop), which must lie in the same chunk."""
+        chunk, offset = divmod(start, self.chunk_size)
+        chunk_map = self._chunk(chunk, create=False)
+        if chunk_map is None:
+            return np.zeros((stop - start, *self.row_shape), self.dtype)
+        return np.array(chunk_map[offset:offset + stop - start])
+
+    def write(self, index: np.ndarray, value: np.ndarray) -> None:
+        chunks = index // self.chunk_size
+        first = int(chunks[0])
+        if (chunks == first).all():  # most often case, e.g. adding one transition
+            chunk_map = self._chunk(first, create=True)
+            chunk_map[index - first * self.chunk_size] = value  # type: ignore
+            return
+        for chunk in np.unique(chunks):
+            mask = chunks == chunk
+            chunk_map = self._chunk(int(chunk), create=True)
+            chunk_map[index[mask] % self.chunk_size] = value[mask]  # type: ignore
+
+    def flush(self) -> None:
+        for chunk_map in self._maps.values():
+            chunk_map.flush()  # type: ignore
+
+
+class _Hdf5Rows:
+    """Rows of one HDF5 dataset, which stays in its file."""
+
+    def __init__(self, dataset: h5py.Dataset) -> None:
+        self.dataset = dataset
+
+    def __getstate__(self) -> Dict[str, Any]:
+        file = self.dataset.file
+        return {
+            "filename": file.filename,
+            "name": self.dataset.name,
+            "mode": file.mode
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.dataset = h5py.File(state["filename"], state["mode"])[state["name"]]
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        return self.dataset[start:stop]
+
+    def write(self, index: np.ndarray, value: np.ndarray) -> None:
+        # h5py needs increasing indices, keep the last write of each row
+        reverse_index = index[::-1]
+        index, last = np.unique(reverse_index, return_index=True)
+        self.dataset[index] = value[::-1][last]
+
+    def flush(self) -> None:
+        self.dataset.file.flush()
+
+
+class _LazyColumn:
+    """An array-like column whose rows are read through a shared page cache."""
+
+    def __init__(
+        self,
+        name: str,
+        source: Union[_ChunkFiles, _Hdf5Rows],
+        size: int,
+        row_shape: Tuple[int, ...],
+        dtype: np.dtype,
+        page_size: int,
+        cache: _PageCache,
+    ) -> None:
+        self.name = name
+        self.source = source
+        self.shape = (size, *row_shape)
+        self.ndim = len(self.shape)
+        self.dtype = np.dtype(dtype)
+        self._row_size = int(np.prod(row_shape))
+        self.page_size = page_size
+        self.cache = cache
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __repr__(self) -> str:
+        return f"LazyColumn(shape={self.shape}, dtype={self.dtype})"
+
+    def __array__(self, dtype: Optional[np.dtype] = None) -> np.ndarray:
+        array = self[:]
+        return array if dtype is None else array.astype(dtype)
+
+    def _flat_index(self, index: IndexType) -> Tuple[np.ndarray, Tuple[int, ...]]:
+        if isinstance(index, (int, np.integer)) and 0 <= index < len(self):
+            return np.array([index], np.int64), ()
+        if isinstance(index, np.ndarray) and index.size == 1 and \
+                index.dtype.kind in "iu" and 0 <= index.flat[0] < len(self):
+            return index.reshape(1).astype(np.int64), index.shape
+        if isinstance(index, slice):
+            index = np.arange(*index.indices(len(self)))
+        index = np.asarray(index)
+        if index.dtype == bool:
+            index = np.nonzero(index)[0]
+        flat = index.reshape(-1).astype(np.int64)
+        if np.any((flat < -len(self)) | (flat >= len(self))):
+            raise IndexError(f"index out of bounds for {self}")
+        return np.where(flat < 0, flat + len(self), flat), index.shape
+
+    def _page(self, page: int) -> np.ndarray:
+        key = (self.name, page)
+        data = self.cache.get(key)
+        if data is None:
+            start = page * self.page_size
+            data = self.source.read(start, min(start + self.page_size, len(self)))
+            self.cache.put(key, data)
+        return data
+
+    def __getitem__(self, index: IndexType) -> np.ndarray:
+        flat, shape = self._flat_index(index)
+        result = np.empty((len(flat), *self.shape[1:]), self.dtype)
+        pages = flat // self.page_size
+        # gather the rows page by page, every needed page is read at most once
+        order = np.argsort(pages, kind="stable")
+        unique_pages, starts = np.unique(pages[order], return_index=True)
+        bounds = np.append(starts, len(flat))
+        for page, start, stop in zip(unique_pages, bounds[:-1], bounds[1:]):
+            rows = order[start:stop]
+            result[rows] = self._page(int(page))[flat[rows] - page * self.page_size]
+        return result.reshape((*shape, *self.shape[1:]))[()]
+
+    def __setitem__(self, index: IndexType, value: Any) -> None:
+        flat, shape = self._flat_index(index)
+        value = np.asarray(value, dtype=self.dtype)
+        row_shape = self.shape[1:]
+        if value.size != len(flat) * self._row_size or \
+                value.shape[value.ndim - len(row_shape):] != row_shape:
+            value = np.broadcast_to(value, (*shape, *row_shape))
+        value = value.reshape(len(flat), *row_shape)
+        self.source.write(flat, value)
+        # write through to the cached pages
+        pages = flat // self.page_size
+        if len(pages) == 1:
+            data = self.cache.peek((self.name, int(pages[0])))
+            if data is not None:
+                data[flat[0] - pages[0] * self.page_size] = value[0]
+            return
+        for page in np.unique(pages):
+            data = self.cache.peek((self.name, int(page)))
+            if data is not None:
+                mask = pages == page
+                data[flat[mask] - page * self.page_size] = value[mask]
+
+
+class LazyReplayBuffer(ReplayBuffer):
+    """LazyReplayBuffer keeps its data on disk and reads it on demand.
+
+    Every key is stored in memory-mapped ``.npy`` chunk files of ``chunk_size`` rows
+    under ``path``, or stays in the HDF5 file it was loaded from (see
+    :meth:`load_hdf5` and :meth:`from_data`). Reads go through an LRU cache of
+    ``page_size``-row pages shared by all keys, so sampling only reads the pages
+    holding the sampled rows, and adding data only writes to the chunks it lands in.
+    :meth:`flush` persists the buffer and :meth:`open` reopens it in O(1) time
+    regardless of its size, since no data is read until it's sampled.
+
+    Keys whose data can't be memory-mapped (object arrays such as a string info, or
+    torch tensors) are kept in memory and are not persisted by :meth:`flush`.
+
+    :param int size: the maximum size of replay buffer.
+    :param str path: the directory of the chunk files. Default to a new temporary
+        directory, created when the first data is added and removed when the
+        buffer is garbage collected; pass a path to keep the files, e.g. to
+        :meth:`open` them later.
+    :param int chunk_size: the number of rows in a chunk file. Default to 65536.
+    :param int page_size: the number of rows in a cached page, should divide
+        chunk_size. Default to 256.
+    :param int cache_bytes: the maximum size of the page cache. Default to 256MB.
+
+    .. seealso::
+
+        Please refer to :class:`~tianshou.data.ReplayBuffer` for other APIs' usage.
+    """
+
+    _layout_file = "layout.json"
+
+    def __init__(
+        self,
+        size: int,
+        path: Optional[str] = None,
+        chunk_size: int = 65536,
+        page_size: int = 256,
+        cache_bytes: int = 256 * 2**20,
+        **kwargs: Any,
+    ) -> None:
+        if chunk_size % page_size != 0:
+            raise ValueError(
+                "page_size should divide chunk_size", page_size, chunk_size
+            )
+        self._path = path
+        self._chunk_size = chunk_size
+        self._page_size = page_size
+        self._cache = _PageCache(cache_bytes)
+        super().__init__(size, **kwargs)
+
+    @property
+    def path(self) -> str:
+        """The directory of the chunk files."""
+        if self._path is None:
+            self._path = tempfile.mkdtemp(prefix="tianshou-buffer-")
+            # the buffer owns this directory, so its files go away with it
+            weakref.finalize(self, shutil.rmtree, self._path, True)
+        return self._path
+
+    def _column(
+        self,
+        name: str,
+        row_shape: Tuple[int, ...],
+        dtype: np.dtype,
+        dataset: Optional[h5py.Dataset] = None,
+    ) -> _LazyColumn:
+        source: Union[_ChunkFiles, _Hdf5Rows]
+        if dataset is None:
+            prefix = os.path.join(self.path, *name.split("/"))
+            source = _ChunkFiles(prefix, row_shape, dtype, self._chunk_size)
+        else:
+            source = _Hdf5Rows(dataset)
+        return _LazyColumn(
+            name, source, self.maxsize, row_shape, dtype, self._page_size, self._cache
+        )
+
+    def _alloc(self, batch: Batch, stack: bool) -> None:
+        template = _create_value(batch if stack else batch[:1], 1, stack)
+
+        def alloc(meta: Batch, template: Batch, prefix: str) -> None:
+            for key, value in template.items():
+                name = prefix + key
+                old = meta.__dict__.get(key)
+                exists = old is not None and not (
+                    isinstance(old, Batch) and old.is_empty()
+                )
+                if isinstance(value, Batch):
+                    if not exists:
+                        meta.__dict__[key] = Batch()
+                    if isinstance(meta.__dict__[key], Batch):
+                        alloc(meta.__dict__[key], value, name + "/")
+                elif exists:
+                    continue
+                elif isinstance(value, torch.Tensor) or value.dtype == object:
+                    meta.__dict__[key] = _create_value(value, self.maxsize, False)
+                else:
+                    meta.__dict__[key] = self._column(
+                        name, value.shape[1:], value.dtype
+                    )
+
+        alloc(self._meta, template, "")  # type: ignore
+
+    def _columns(self) -> Dict[str, Union[_LazyColumn, Batch]]:
+        """Return the lazy columns and the empty sub-batches by their path."""
+        columns: Dict[str, Union[_LazyColumn, Batch]] = {}
+
+        def walk(meta: Batch, prefix: str) -> None:
+            for key, value in meta.items():
+                if isinstance(value, Batch):
+                    if value.is_empty():
+                        columns[prefix + key] = value
+                    else:
+                        walk(value, prefix + key + "/")
+                elif isinstance(value, _LazyColumn):
+                    columns[prefix + key] = value
+
+        walk(self._meta, "")
+        return columns
+
+    def flush(self) -> None:
+        """Write the pending data and the buffer's layout to disk."""
+        columns = {}
+        for name, column in self._columns().items():
+            if isinstance(column, _LazyColumn):
+                column.source.flush()
+                if isinstance(column.source, _ChunkFiles):
+                    columns[name] = {
+                        "shape": list(column.shape[1:]),
+                        "dtype": column.dtype.str
+                    }
+            else:
+                columns[name] = None
+        layout = {
+            "size": self.maxsize,
+            "chunk_size": self._chunk_size,
+            "page_size": self._page_size,
+            "options": self.options,
+            "columns": columns,
+            "state": {
+                "index": self._index,
+                "size": self._size,
+                "last_index": self.last_index.tolist(),
+                "ep_rew": np.asarray(self._ep_rew).tolist(),
+                "ep_len": self._ep_len,
+                "ep_idx": self._ep_idx,
+            },
+        }
+        with open(os.path.join(self.path, self._layout_file), "w") as f:
+            json.dump(layout, f)
+
+    @classmethod
+    def open(cls, path: str, cache_bytes: int = 256 * 2**20) -> "LazyReplayBuffer":
+        """Open a buffer written by :meth:`flush` without reading its data."""
+        with open(os.path.join(path, cls._layout_file)) as f:
+            layout = json.load(f)
+        buf = cls(
+            layout["size"],
+            path=path,
+            chunk_size=layout["chunk_size"],
+            page_size=layout["page_size"],
+            cache_bytes=cache_bytes,
+            **layout["options"],
+        )
+        for name, column in layout["columns"].items():
+            *parents, key = name.split("/")
+            meta = buf._meta
+            for parent in parents:
+                meta = meta.__dict__.setdefault(parent, Batch())
+            meta.__dict__[key] = Batch() if column is None else buf._column(
+                name, tuple(column["shape"]), np.dtype(column["dtype"])
+            )
+        state = layout["state"]
+        buf._index, buf._size = state["index"], state["size"]
+        buf.last_index = np.array(state["last_index"])
+        ep_rew = np.asarray(state["ep_rew"])
+        buf._ep_rew = ep_rew if ep_rew.ndim > 0 else float(ep_rew)
+        buf._ep_len, buf._ep_idx = state["ep_len"], state["ep_idx"]
+        return buf
+
+    def save_hdf5(self, path: str, compression: Optional[str] = None) -> None:
+        """Save replay buffer to an HDF5 file that ReplayBuffer can load.
+
+        The data is copied one chunk at a time, bypassing the page cache.
+        """
+        state = {
+            key: value
+            for key, value in self.__dict__.items() if key not in
+            ["_meta", "_path", "_chunk_size", "_page_size", "_cache"]
+        }
+
+        def save(meta: Batch, group: h5py.Group) -> None:
+            group.attrs["__data_type__"] = "Batch"
+            for key, value in meta.items():
+                if isinstance(value, Batch):
+                    save(value, group.create_group(key))
+                elif isinstance(value, _LazyColumn):
+                    dataset = group.create_dataset(
+                        key, value.shape, value.dtype, compression=compression
+                    )
+                    dataset.attrs["__data_type__"] = "ndarray"
+                    for start in range(0, len(value), self._chunk_size):
+                        stop = min(start + self._chunk_size, len(value))
+                        dataset[start:stop] = value.source.read(start, stop)
+                else:
+                    to_hdf5({key: value}, group, compression=compression)
+
+        with h5py.File(path, "w") as f:
+            to_hdf5(state, f, compression=compression)
+            save(self._meta, f.create_group("_meta"))
+            self._record_codecs(f)
+
+    @classmethod
+    def load_hdf5(
+        cls,
+        path: str,
+        device: Optional[str] = None,
+        mode: str = "r",
+        cache_bytes: int = 256 * 2**20,
+    ) -> "LazyReplayBuffer":
+        """Load a replay buffer saved by ``save_hdf5`` without reading its data.
+
+        The HDF5 file stays open in the given mode; with ``mode="r+"`` new data is
+        written back to it.
+        """
+        f = h5py.File(path, mode)
+        state = dict(f.attrs.items())
+        for key, value in f.items():
+            if key != "_meta":
+                state[key] = from_hdf5(value, device=device)
+        size = int(state["maxsize"])
+        buf = cls(size, cache_bytes=cache_bytes, **state["options"])
+        buf.__setstate__({k: v for k, v in state.items() if k != "options"})
+
+        def load(group: h5py.Group, name: str) -> Batch:
+            meta = Batch()
+            for key, value in group.items():
+                if isinstance(value, h5py.Group):
+                    meta.__dict__[key] = load(value, name + key + "/")
+                elif value.attrs["__data_type__"] == "ndarray" and \
+                        value.ndim > 0 and len(value) == size:
+                    meta.__dict__[key] = buf._column(
+                        name + key, value.shape[1:], value.dtype, dataset=value
+                    )
+                else:
+                    meta.__dict__[key] = from_hdf5(value, device=device)
+            return meta
+
+        buf._meta = load(f["_meta"], "")
+        return buf
+
+    @classmethod
+    def from_data(
+        cls, obs: h5py.Dataset, act: h5py.Dataset, rew: h5py.Dataset,
+        terminated: h5py.Dataset, truncated: h5py.Dataset, done: h5py.Dataset,
+        obs_next: h5py.Dataset
+    ) -> "LazyReplayBuffer":
+        """Build a buffer over HDF5 datasets without reading them.
+
+        The datasets' file has to stay open while the buffer is used. Values that
+        are not HDF5 datasets (e.g. numpy arrays) are kept in memory.
+        """
+        data = {
+            "obs": obs,
+            "act": act,
+            "rew": rew,
+            "terminated": terminated,
+            "truncated": truncated,
+            "done": done,
+            "obs_next": obs_next,
+        }
+        size = len(obs)
+        assert all(len(dset) == size for dset in data.values()), \
+            "Lengths of all hdf5 datasets need to be equal."
+        buf = cls(size)
+        if size == 0:
+            return buf
+        meta = Batch()
+        for key, value in data.items():
+            if isinstance(value, h5py.Dataset):
+                meta.__dict__[key] = buf._column(
+                    key, value.shape[1:], value.dtype, dataset=value
+                )
+            else:
+                meta.__dict__[key] = np.asarray(value)
+        buf.set_batch(meta)
+        buf._size = size
+        return buf
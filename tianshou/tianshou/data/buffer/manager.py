@@ -1,10 +1,11 @@
-from typing import List, Optional, Sequence, Tuple, Union
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 from numba import njit
 
 from tianshou.data import Batch, HERReplayBuffer, PrioritizedReplayBuffer, ReplayBuffer
 from tianshou.data.batch import _alloc_by_keys_diff, _create_value
+from tianshou.data.buffer.base import _add_block_index
 
 
 class ReplayBufferManager(ReplayBuffer):
@@ -47,6 +48,7 @@ class ReplayBufferManager(ReplayBuffer):
         done = np.array([False, False])
         _prev_index(index, offset, done, last, lens)
         _next_index(index, offset, done, last, lens)
+        _refresh_stack_rows(np.zeros((1, 2), int), index, offset, done, last, lens)
 
     def __len__(self) -> int:
         return int(self._lengths.sum())
@@ -54,6 +56,7 @@ class ReplayBufferManager(ReplayBuffer):
     def reset(self, keep_statistics: bool = False) -> None:
         self.last_index = self._offset.copy()
         self._lengths = np.zeros_like(self._offset)
+        self._stack_table = None
         for buf in self.buffers:
             buf.reset(keep_statistics=keep_statistics)
 
@@ -65,6 +68,22 @@ class ReplayBufferManager(ReplayBuffer):
         super().set_batch(batch)
         self._set_batch_for_children()
 
+    def _stack_successors(self, index: np.ndarray) -> np.ndarray:
+        buffer_ids = np.searchsorted(self._offset, index, side="right") - 1
+        start = self._offset[buffer_ids, None]
+        size = self._extend_offset[buffer_ids + 1, None] - start
+        return (index[:, None] - start + np.arange(self.stack_num)) % size + start
+
+    def _refresh_stack_table(self, index: Union[List[int], np.ndarray]) -> None:
+        if self._stack_table is None or self._stack_table.shape[1] != self.stack_num:
+            self._stack_table = None
+            return
+        _refresh_stack_rows(
+            self._stack_table,
+            np.asarray(index, dtype=np.int64).reshape(-1), self._extend_offset,
+            self.done, self.last_index, self._lengths
+        )
+
     def unfinished_index(self) -> np.ndarray:
         return np.concatenate(
             [
@@ -129,21 +148,13 @@ class ReplayBufferManager(ReplayBuffer):
             batch.pop("obs_next", None)
         elif self._save_only_last_obs:
             batch.obs_next = batch.obs_next[:, -1]
+        self._encode(batch)
         # get index
         if buffer_ids is None:
             buffer_ids = np.arange(self.buffer_num)
-        ptrs, ep_lens, ep_rews, ep_idxs = [], [], [], []
-        for batch_idx, buffer_id in enumerate(buffer_ids):
-            ptr, ep_rew, ep_len, ep_idx = self.buffers[buffer_id]._add_index(
-                batch.rew[batch_idx], batch.done[batch_idx]
-            )
-            ptrs.append(ptr + self._offset[buffer_id])
-            ep_lens.append(ep_len)
-            ep_rews.append(ep_rew)
-            ep_idxs.append(ep_idx + self._offset[buffer_id])
-            self.last_index[buffer_id] = ptr + self._offset[buffer_id]
-            self._lengths[buffer_id] = len(self.buffers[buffer_id])
-        ptrs = np.array(ptrs)
+        ptrs, ep_rews, ep_lens, ep_idxs = self._add_indices(
+            batch.rew, batch.done, buffer_ids
+        )
         try:
             self._meta[ptrs] = batch
         except ValueError:
@@ -158,17 +169,148 @@ class ReplayBufferManager(ReplayBuffer):
                 _alloc_by_keys_diff(self._meta, batch, self.maxsize, False)
             self._set_batch_for_children()
             self._meta[ptrs] = batch
-        return ptrs, np.array(ep_rews), np.array(ep_lens), np.array(ep_idxs)
+        self._refresh_stack_tables(ptrs, buffer_ids)
+        return ptrs, ep_rews, ep_lens, ep_idxs
+
+    def _add_indices(
+        self,
+        rew: np.ndarray,
+        done: np.ndarray,
+        buffer_ids: Union[np.ndarray, List[int]],
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Maintain the state of the buffers in buffer_ids after adding one \
+        transition to each of them.
+
+        Return (current_index, episode_reward, episode_length, episode_start_index)
+        as :meth:`add` does.
+        """
+        ptrs, ep_lens, ep_rews, ep_idxs = [], [], [], []
+        for buffer_id, cur_rew, cur_done in zip(buffer_ids, rew, done):
+            buffer = self.buffers[buffer_id]
+            ptr, ep_rew, ep_len, ep_idx = buffer._add_index(cur_rew, cur_done)
+            ptrs.append(ptr)
+            ep_lens.append(ep_len)
+            ep_rews.append(ep_rew)
+            ep_idxs.append(ep_idx)
+            self._lengths[buffer_id] = len(buffer)
+        offset = self._offset[buffer_ids]
+        ptrs = np.array(ptrs, dtype=int) + offset
+        self.last_index[buffer_ids] = ptrs
+        return ptrs, np.array(ep_rews), np.array(ep_lens), \
+            np.array(ep_idxs, dtype=int) + offset
+
+    def _refresh_stack_tables(
+        self, ptrs: np.ndarray, buffer_ids: Union[np.ndarray, List[int]]
+    ) -> None:
+        """Refresh the frame-stack tables of the manager and of its children."""
+        self._refresh_stack_table(ptrs)
+        for buffer_id, ptr in zip(buffer_ids, ptrs):
+            buffer = self.buffers[buffer_id]
+            if buffer._stack_table is not None:
+                buffer._refresh_stack_table(ptr - self._offset[buffer_id])
+
+    def _add_arrays(
+        self,
+        data: Dict[str, Any],
+        buffer_ids: Union[np.ndarray, List[int]],
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Add one transition of every buffer in buffer_ids, writing the arrays of \
+        data straight into the storage instead of going through a Batch.
+
+        data must hold the keys :meth:`add` would store, with "done" already
+        computed and Batch values of "info" and "policy". Unless the storage has
+        exactly these keys, it falls back to :meth:`add`, which allocates the missing
+        ones.
+        """
+        meta = self._meta.__dict__
+        if meta.keys() != data.keys() or not all(
+            meta[key].__dict__.keys() >= data[key].__dict__.keys()
+            for key in ("info", "policy")
+        ):
+            return self.add(Batch(data), buffer_ids)
+        ptrs, ep_rews, ep_lens, ep_idxs = self._add_indices(
+            data["rew"], data["done"], buffer_ids
+        )
+        for key, value in data.items():
+            codec = self._codecs.get(key)
+            meta[key][ptrs] = value if codec is None else codec.encode(value)
+        self._refresh_stack_tables(ptrs, buffer_ids)
+        return ptrs, ep_rews, ep_lens, ep_idxs
+
+    def add_many(
+        self,
+        batch: Batch,
+        buffer_ids: Optional[Union[np.ndarray, List[int]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Add a time-major block of transitions into ReplayBufferManager.
+
+        It is equivalent to calling :meth:`add` with ``batch[t]`` for every t in
+        order, but the circular indices, the episode statistics and last_index are
+        maintained for the whole block at once.
+
+        The data's shape must be [T, len(buffer_ids), ...], and buffer_ids must not
+        contain duplicates. By default buffer_ids is [0, 1, ..., buffer_num - 1].
+
+        Return (current_index, episode_reward, episode_length, episode_start_index),
+        each with shape [T, len(buffer_ids)]. If the episode is not finished, the
+        return value of episode_length and episode_reward is 0.
+        """
+        batch = self._prepare_block(batch, 2)
+        if buffer_ids is None:
+            buffer_ids = np.arange(self.buffer_num)
+        buffer_ids = np.asarray(buffer_ids)
+        buffers = self.buffers[buffer_ids]
+        length = len(batch.done)
+        sizes = np.array([buf.maxsize for buf in buffers])
+        index = np.array([buf._index for buf in buffers])
+        steps = np.arange(length)[:, None]
+        local_ptrs = (index + steps) % sizes
+        ep_rews, ep_lens, ep_idxs, carry = _add_block_index(
+            batch.rew, batch.done, local_ptrs, sizes,
+            [(buf._ep_rew, buf._ep_len, buf._ep_idx) for buf in buffers]
+        )
+        offset = self._offset[buffer_ids]
+        ptrs, ep_idxs = local_ptrs + offset, ep_idxs + offset
+        if length > 0:
+            for buf, last, stats in zip(buffers, local_ptrs[-1], carry):
+                buf.last_index[0] = last
+                buf._index = (last + 1) % buf.maxsize
+                buf._size = min(buf._size + length, buf.maxsize)
+                buf._ep_rew, buf._ep_len, buf._ep_idx = stats
+            self.last_index[buffer_ids] = ptrs[-1]
+            self._lengths[buffer_ids] = [len(buf) for buf in buffers]
+        # only the newest maxsize transitions of each buffer survive the block
+        keep = steps >= length - sizes
+        try:
+            self._meta[ptrs[keep]] = batch[keep]
+        except ValueError:
+            batch.rew = batch.rew.astype(float)
+            batch.done = batch.done.astype(bool)
+            batch.terminated = batch.terminated.astype(bool)
+            batch.truncated = batch.truncated.astype(bool)
+            if self._meta.is_empty():
+                self._meta = _create_value(  # type: ignore
+                    batch[0], self.maxsize, stack=False)
+            else:  # dynamic key pops up in batch
+                _alloc_by_keys_diff(self._meta, batch[0], self.maxsize, False)
+            self._set_batch_for_children()
+            self._meta[ptrs[keep]] = batch[keep]
+        self._refresh_stack_table(ptrs[keep])
+        for buf, buf_ptrs, buf_keep, start in zip(buffers, ptrs.T, keep.T, offset):
+            buf._refresh_stack_table(buf_ptrs[buf_keep] - start)
+        return ptrs, ep_rews, ep_lens, ep_idxs
 
     def sample_indices(self, batch_size: int) -> np.ndarray:
         if batch_size < 0:
             return np.array([], int)
         if self._sample_avail and self.stack_num > 1:
-            all_indices = np.concatenate(
-                [
-                    buf.sample_indices(0) + offset
-                    for offset, buf in zip(self._offset, self.buffers)
-                ]
+            all_indices = self._stack_avail(
+                np.concatenate(
+                    [
+                        buf._ordered_indices() + offset
+                        for offset, buf in zip(self._offset, self.buffers)
+                    ]
+                )
             )
             if batch_size == 0:
                 return all_indices
@@ -255,6 +397,22 @@ class HERReplayBufferManager(ReplayBufferManager):
         self._restore_cache()
         return super().add(batch, buffer_ids)
 
+    def add_many(
+        self,
+        batch: Batch,
+        buffer_ids: Optional[Union[np.ndarray, List[int]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        self._restore_cache()
+        result = super().add_many(batch, buffer_ids)
+        if buffer_ids is None:
+            buffer_ids = np.arange(self.buffer_num)
+        done = np.logical_or(batch.terminated, batch.truncated)
+        for i, buffer_id in enumerate(buffer_ids):
+            self.buffers[buffer_id]._track_episodes(
+                result[0][:, i] - self._offset[buffer_id], done[:, i]
+            )
+        return result
+
 
 @njit
 def _prev_index(
@@ -295,3 +453,29 @@ def _next_index(
             end_flag = done[subind] | (subind == last)
             next_index[mask] = (subind - start + 1 - end_flag) % cur_len + start
     return next_index
+
+
+@njit
+def _refresh_stack_rows(
+    table: np.ndarray,
+    index: np.ndarray,
+    offset: np.ndarray,
+    done: np.ndarray,
+    last_index: np.ndarray,
+    lengths: np.ndarray,
+) -> None:
+    """Recompute the frame-stack rows of the written index and of the next \
+    stack_num - 1 slots of their buffers, following the chain of _prev_index."""
+    stack_num = table.shape[1]
+    for ptr in index:
+        buffer_id = np.searchsorted(offset, ptr, side="right") - 1
+        start, size = offset[buffer_id], offset[buffer_id + 1] - offset[buffer_id]
+        cur_len, last = max(1, lengths[buffer_id]), last_index[buffer_id]
+        for step in range(stack_num):
+            row = cur = (ptr - start + step) % size + start
+            table[row, stack_num - 1] = row
+            for i in range(stack_num - 2, -1, -1):
+                subind = (cur - start - 1) % cur_len
+                end_flag = done[subind + start] or subind + start == last
+                cur = (subind + end_flag) % cur_len + start
+                table[row, i] = cur
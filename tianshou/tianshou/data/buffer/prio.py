@@ -56,6 +56,15 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         self.init_weight(ptr)
         return ptr, ep_rew, ep_len, ep_idx
 
+    def add_many(
+        self,
+        batch: Batch,
+        buffer_ids: Optional[Union[np.ndarray, List[int]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        ptr, ep_rew, ep_len, ep_idx = super().add_many(batch, buffer_ids)
+        self.init_weight(ptr.reshape(-1))
+        return ptr, ep_rew, ep_len, ep_idx
+
     def sample_indices(self, batch_size: int) -> np.ndarray:
         if batch_size > 0 and len(self) > 0:
             scalar = np.random.rand(batch_size) * self.weight.reduce()
@@ -0,0 +1,323 @@
+from typing import Any, List, Optional, Tuple, Union
+
+import numpy as np
+from numba import njit
+
+from tianshou.data import Batch, ReplayBuffer, ReplayBufferManager
+from tianshou.data.batch import _alloc_by_keys_diff, _create_value
+from tianshou.data.buffer.base import _add_block_index
+
+
+class RolloutBuffer(ReplayBufferManager):
+    """RolloutBuffer stores one on-policy rollout laid out as [T, buffer_num].
+
+    Transition ``t`` of environment ``i`` lives at flat index ``t * buffer_num + i``,
+    so ``buffer.sample(0)`` returns the rollout in time-major order and every key can
+    be viewed as an array of shape (T, buffer_num, ...) with :meth:`time_major`.
+    The storage is allocated once, and :meth:`compute_gae` runs GAE down all the
+    columns at once instead of chasing prev/next indices through the buffer.
+
+    Each column is circular on its own like a :class:`~tianshou.data.ReplayBuffer`
+    of size T, so it works as a drop-in replacement of
+    :class:`~tianshou.data.VectorReplayBuffer` for the
+    :class:`~tianshou.data.Collector` and the on-policy trainer.
+
+    :param int total_size: the total size of RolloutBuffer, T is
+        ``ceil(total_size / buffer_num)``.
+    :param int buffer_num: the number of environments (columns).
+
+    Other input arguments (stack_num/ignore_obs_next/save_only_last_obs) are the same
+    as :class:`~tianshou.data.ReplayBuffer`.
+
+    .. seealso::
+
+        Please refer to :class:`~tianshou.data.ReplayBuffer` for other APIs' usage.
+    """
+
+    def __init__(self, total_size: int, buffer_num: int, **kwargs: Any) -> None:
+        assert buffer_num > 0
+        self.buffer_num = buffer_num
+        self.rollout_len = int(np.ceil(total_size / buffer_num))
+        self.buffers = np.array([], dtype=object)
+        ReplayBuffer.__init__(self, self.rollout_len * buffer_num, **kwargs)
+        self._compile()
+        self._meta: Batch
+
+    def _compile(self) -> None:
+        delta = discount = np.zeros((1, 1))
+        _gae_return_time_major(delta, discount)
+
+    def __len__(self) -> int:
+        return int(self._sizes.sum())
+
+    def reset(self, keep_statistics: bool = False) -> None:
+        self.last_index = np.arange(self.buffer_num)
+        self._ptrs = np.zeros(self.buffer_num, int)
+        self._sizes = np.zeros(self.buffer_num, int)
+        self._stack_table = None
+        if not keep_statistics:
+            self._ep_rew = np.zeros(self.buffer_num)
+            self._ep_len = np.zeros(self.buffer_num, int)
+            self._ep_idx = np.arange(self.buffer_num)
+
+    def _set_batch_for_children(self) -> None:
+        pass
+
+    def _stack_successors(self, index: np.ndarray) -> np.ndarray:
+        steps = np.arange(self.stack_num) * self.buffer_num
+        return (index[:, None] + steps) % self.maxsize
+
+    def _refresh_stack_table(self, index: Union[List[int], np.ndarray]) -> None:
+        ReplayBuffer._refresh_stack_table(self, index)
+
+    def time_major(self, key: str) -> Union[Batch, np.ndarray]:
+        """Return a view of the stored ``key`` with shape (T, buffer_num, ...).
+
+        Rows are in storage order, which is time order unless a column wrapped around.
+        """
+        return self._meta[key].reshape(  # type: ignore
+            self.rollout_len, self.buffer_num, *self._meta[key].shape[1:]
+        )
+
+    def _time_order(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the [T, buffer_num] flat indices in time order and their validity."""
+        steps = np.arange(self.rollout_len)[:, None]
+        start = np.where(self._sizes == self.rollout_len, self._ptrs, 0)
+        rows = (start + steps) % self.rollout_len
+        return rows * self.buffer_num + np.arange(self.buffer_num), \
+            steps < self._sizes
+
+    def _time_position(self, index: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (position in its column's time order, column) of flat indices."""
+        rows, columns = np.divmod(index, self.buffer_num)
+        start = np.where(self._sizes == self.rollout_len, self._ptrs, 0)
+        return (rows - start[columns]) % self.rollout_len, columns
+
+    def unfinished_index(self) -> np.ndarray:
+        last = self.last_index[self._sizes > 0]
+        return last[~self.done[last]]
+
+    def prev(self, index: Union[int, np.ndarray]) -> np.ndarray:
+        indices = np.asarray(index) % self.maxsize
+        positions, columns = self._time_position(indices)
+        prev_indices = (indices - self.buffer_num) % self.maxsize
+        end_flag = (positions == 0) | self.done[prev_indices]
+        prev_indices = np.where(end_flag, indices, prev_indices)
+        return prev_indices if isinstance(index, (list, np.ndarray)) \
+            else prev_indices.item()
+
+    def next(self, index: Union[int, np.ndarray]) -> np.ndarray:
+        indices = np.asarray(index) % self.maxsize
+        columns = indices % self.buffer_num
+        end_flag = self.done[indices] | (indices == self.last_index[columns])
+        next_indices = np.where(
+            end_flag, indices, (indices + self.buffer_num) % self.maxsize
+        )
+        return next_indices if isinstance(index, (list, np.ndarray)) \
+            else next_indices.item()
+
+    def add(
+        self,
+        batch: Batch,
+        buffer_ids: Optional[Union[np.ndarray, List[int]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Add a batch of data into RolloutBuffer.
+
+        Each of the data's length (first dimension) must equal to the length of
+        buffer_ids. By default buffer_ids is [0, 1, ..., buffer_num - 1].
+
+        Return (current_index, episode_reward, episode_length, episode_start_index). If
+        the episode is not finished, the return value of episode_length and
+        episode_reward is 0.
+        """
+        # preprocess batch
+        new_batch = Batch()
+        for key in set(self._reserved_keys).intersection(batch.keys()):
+            new_batch.__dict__[key] = batch[key]
+        batch = new_batch
+        batch.__dict__["done"] = np.logical_or(batch.terminated, batch.truncated)
+        assert set(["obs", "act", "rew", "terminated", "truncated",
+                    "done"]).issubset(batch.keys())
+        if self._save_only_last_obs:
+            batch.obs = batch.obs[:, -1]
+        if not self._save_obs_next:
+            batch.pop("obs_next", None)
+        elif self._save_only_last_obs:
+            batch.obs_next = batch.obs_next[:, -1]
+        self._encode(batch)
+        if buffer_ids is None:
+            buffer_ids = np.arange(self.buffer_num)
+        ptrs, ep_rews, ep_lens, ep_idxs = self._add_indices(
+            batch.rew, batch.done, buffer_ids
+        )
+        try:
+            self._meta[ptrs] = batch
+        except ValueError:
+            batch.rew = batch.rew.astype(float)
+            batch.done = batch.done.astype(bool)
+            batch.terminated = batch.terminated.astype(bool)
+            batch.truncated = batch.truncated.astype(bool)
+            if self._meta.is_empty():
+                self._meta = _create_value(  # type: ignore
+                    batch, self.maxsize, stack=False)
+            else:  # dynamic key pops up in batch
+                _alloc_by_keys_diff(self._meta, batch, self.maxsize, False)
+            self._meta[ptrs] = batch
+        self._refresh_stack_table(ptrs)
+        return ptrs, ep_rews, ep_lens, ep_idxs
+
+    def _add_indices(
+        self,
+        rew: np.ndarray,
+        done: np.ndarray,
+        buffer_ids: Union[np.ndarray, List[int]],
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # get index, every column advances by one row
+        buffer_ids = np.asarray(buffer_ids)
+        ptrs = self._ptrs[buffer_ids] * self.buffer_num + buffer_ids
+        self.last_index[buffer_ids] = ptrs
+        self._ptrs[buffer_ids] = (self._ptrs[buffer_ids] + 1) % self.rollout_len
+        self._sizes[buffer_ids] = np.minimum(
+            self._sizes[buffer_ids] + 1, self.rollout_len
+        )
+        # maintain episode statistics
+        rew, done = np.asarray(rew), np.asarray(done, dtype=bool)
+        if self._ep_rew.shape[1:] != rew.shape[1:]:  # e.g. multi-dimensional reward
+            self._ep_rew = np.zeros((self.buffer_num, *rew.shape[1:]))
+        self._ep_rew[buffer_ids] += rew
+        self._ep_len[buffer_ids] += 1
+        done_mask = done.reshape(-1, *([1] * (rew.ndim - 1)))
+        ep_rews = np.where(done_mask, self._ep_rew[buffer_ids], 0.0)
+        ep_lens = np.where(done, self._ep_len[buffer_ids], 0)
+        ep_idxs = self._ep_idx[buffer_ids]
+        finished = buffer_ids[done]
+        self._ep_rew[finished] = 0.0
+        self._ep_len[finished] = 0
+        self._ep_idx[finished] = self._ptrs[finished] * self.buffer_num + finished
+        return ptrs, ep_rews, ep_lens, ep_idxs
+
+    def _refresh_stack_tables(
+        self, ptrs: np.ndarray, buffer_ids: Union[np.ndarray, List[int]]
+    ) -> None:
+        self._refresh_stack_table(ptrs)
+
+    def add_many(
+        self,
+        batch: Batch,
+        buffer_ids: Optional[Union[np.ndarray, List[int]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Add a time-major block of transitions into RolloutBuffer.
+
+        The data's shape must be [T, len(buffer_ids), ...]. It is equivalent to
+        calling :meth:`add` with ``batch[t]`` for every t in order.
+
+        Return (current_index, episode_reward, episode_length, episode_start_index),
+        each with shape [T, len(buffer_ids)].
+        """
+        batch = self._prepare_block(batch, 2)
+        if buffer_ids is None:
+            buffer_ids = np.arange(self.buffer_num)
+        buffer_ids = np.asarray(buffer_ids)
+        length = len(batch.done)
+        steps = np.arange(length)[:, None]
+        rows = (self._ptrs[buffer_ids] + steps) % self.rollout_len
+        rew = np.asarray(batch.rew)
+        if self._ep_rew.shape[1:] != rew.shape[2:]:  # e.g. multi-dimensional reward
+            self._ep_rew = np.zeros((self.buffer_num, *rew.shape[2:]))
+        ep_rews, ep_lens, ep_rows, carry = _add_block_index(
+            rew, batch.done, rows, np.full(len(buffer_ids), self.rollout_len),
+            list(
+                zip(
+                    self._ep_rew[buffer_ids], self._ep_len[buffer_ids],
+                    self._ep_idx[buffer_ids] // self.buffer_num
+                )
+            )
+        )
+        ptrs = rows * self.buffer_num + buffer_ids
+        if length > 0:
+            self.last_index[buffer_ids] = ptrs[-1]
+            self._ptrs[buffer_ids] = (rows[-1] + 1) % self.rollout_len
+            self._sizes[buffer_ids] = np.minimum(
+                self._sizes[buffer_ids] + length, self.rollout_len
+            )
+            self._ep_rew[buffer_ids] = [stats[0] for stats in carry]
+            self._ep_len[buffer_ids] = [stats[1] for stats in carry]
+            self._ep_idx[buffer_ids] = \
+                np.array([stats[2] for stats in carry]) * self.buffer_num + buffer_ids
+        # only the newest rollout_len transitions of each column survive the block
+        keep = np.broadcast_to(steps >= length - self.rollout_len, rows.shape)
+        try:
+            self._meta[ptrs[keep]] = batch[keep]
+        except ValueError:
+            batch.rew = batch.rew.astype(float)
+            batch.done = batch.done.astype(bool)
+            batch.terminated = batch.terminated.astype(bool)
+            batch.truncated = batch.truncated.astype(bool)
+            if self._meta.is_empty():
+                self._meta = _create_value(  # type: ignore
+                    batch[0], self.maxsize, stack=False)
+            else:  # dynamic key pops up in batch
+                _alloc_by_keys_diff(self._meta, batch[0], self.maxsize, False)
+            self._meta[ptrs[keep]] = batch[keep]
+        self._refresh_stack_table(ptrs[keep])
+        return ptrs, ep_rews, ep_lens, ep_rows * self.buffer_num + buffer_ids
+
+    def sample_indices(self, batch_size: int) -> np.ndarray:
+        """Get a random sample of index with size = batch_size.
+
+        Return all available indices in time-major order if batch_size is 0; return an
+        empty numpy array if batch_size < 0.
+        """
+        if batch_size < 0:
+            return np.array([], int)
+        indices, valid = self._time_order()
+        all_indices = indices[valid]
+        if batch_size == 0:
+            return all_indices
+        return np.random.choice(all_indices, batch_size)
+
+    def compute_gae(
+        self,
+        indices: np.ndarray,
+        rew: np.ndarray,
+        v_s: np.ndarray,
+        v_s_: np.ndarray,
+        gamma: float = 0.99,
+        gae_lambda: float = 0.95,
+    ) -> np.ndarray:
+        """Compute the GAE advantage of ``buffer[indices]`` column by column.
+
+        The values are scattered into [T, buffer_num] arrays in time order, so
+        episode boundaries are just the done flags plus the newest transition of
+        every column, and the recursion runs over T steps for all columns at once.
+        Indices absent from ``indices`` cut the recursion like an episode end.
+
+        :param numpy.ndarray indices: the flat indices of the transitions.
+        :param numpy.ndarray rew: the reward of every transition.
+        :param numpy.ndarray v_s: :math:`V(s)` of every transition.
+        :param numpy.ndarray v_s_: :math:`V(s')` of every transition, already masked
+            where the episode terminated.
+
+        :return: the advantage with shape (len(indices), ).
+        """
+        positions, columns = self._time_position(indices)
+        shape = (self.rollout_len, self.buffer_num)
+        delta = np.zeros(shape)
+        delta[positions, columns] = rew + v_s_ * gamma - v_s
+        end_flag = np.ones(shape, dtype=bool)
+        end_flag[positions, columns] = self.done[indices]
+        filled = self._sizes > 0
+        end_flag[self._sizes[filled] - 1, np.nonzero(filled)[0]] = True
+        discount = (1.0 - end_flag) * (gamma * gae_lambda)
+        return _gae_return_time_major(delta, discount)[positions, columns]
+
+
+@njit
+def _gae_return_time_major(delta: np.ndarray, discount: np.ndarray) -> np.ndarray:
+    returns = np.zeros(delta.shape)
+    gae = np.zeros(delta.shape[1])
+    for t in range(delta.shape[0] - 1, -1, -1):
+        for i in range(delta.shape[1]):
+            gae[i] = delta[t, i] + discount[t, i] * gae[i]
+            returns[t, i] = gae[i]
+    return returns
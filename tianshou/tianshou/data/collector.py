@@ -1,6 +1,6 @@
 import time
 import warnings
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import gymnasium as gym
 import numpy as np
@@ -11,12 +11,15 @@ from tianshou.data import (
     CachedReplayBuffer,
     ReplayBuffer,
     ReplayBufferManager,
+    RolloutBuffer,
     VectorReplayBuffer,
     to_numpy,
 )
-from tianshou.data.batch import _alloc_by_keys_diff
-from tianshou.env import BaseVectorEnv, DummyVectorEnv
+from tianshou.data.batch import _alloc_by_keys_diff, _parse_value
+from tianshou.env import BaseVectorEnv, DummyVectorEnv, VectorEnvWrapper
+from tianshou.env.utils import gym_new_venv_step_type
 from tianshou.policy import BasePolicy
+from tianshou.utils import Timing
 
 
 class Collector(object):
@@ -34,6 +37,12 @@ class Collector(object):
         with corresponding policy's exploration noise. If so, "policy.
         exploration_noise(act, batch)" will be called automatically to add the
         exploration noise into action. Default to False.
+    :param info_schema: a dict from the info keys to keep to their dtype, e.g.
+        ``{"success": bool, "near_object": np.float32}``. These scalar fields are read
+        from every env's info dict straight into typed arrays, instead of turning the
+        dicts into a Batch each step; a missing key reads as 0. Default to None.
+    :param bool drop_unknown_info: whether to drop the info keys not in info_schema.
+        Otherwise they are converted into a Batch as usual. Default to False.
 
     The "preprocess_fn" is a function called before the data has been added to the
     buffer with batch format. It will receive only "obs" and "env_id" when the
@@ -62,6 +71,8 @@ class Collector(object):
         buffer: Optional[ReplayBuffer] = None,
         preprocess_fn: Optional[Callable[..., Batch]] = None,
         exploration_noise: bool = False,
+        info_schema: Optional[Dict[str, Any]] = None,
+        drop_unknown_info: bool = False,
     ) -> None:
         super().__init__()
         if isinstance(env, gym.Env) and not hasattr(env, "__len__"):
@@ -71,10 +82,14 @@ class Collector(object):
             self.env = env  # type: ignore
         self.env_num = len(self.env)
         self.exploration_noise = exploration_noise
+        self.info_schema = info_schema
+        self.drop_unknown_info = drop_unknown_info
         self._assign_buffer(buffer)
         self.policy = policy
         self.preprocess_fn = preprocess_fn
         self._action_space = self.env.action_space
+        # the trainer shares its Timing to break collect() down into phases
+        self.timing = Timing(enabled=False)
         # avoid creating attribute outside __init__
         self.reset(False)
 
@@ -140,10 +155,41 @@ class Collector(object):
         """Reset the data buffer."""
         self.buffer.reset(keep_statistics=keep_statistics)
 
+    def _parse_info(self, info: Any) -> Any:
+        """Read the per-env info dicts into typed arrays according to info_schema."""
+        if self.info_schema is None or isinstance(info, (dict, Batch)):
+            return info
+        typed_info = Batch()
+        for key, dtype in self.info_schema.items():
+            typed_info.__dict__[key] = np.fromiter(
+                (inf.get(key, 0) for inf in info), dtype=dtype, count=len(info)
+            )
+        if not self.drop_unknown_info:
+            typed_info.update(
+                Batch(
+                    [
+                        {k: v
+                         for k, v in inf.items() if k not in self.info_schema}
+                        for inf in info
+                    ]
+                )
+            )
+        return typed_info
+
+    @staticmethod
+    def _info_success(info: Any) -> Optional[np.ndarray]:
+        """Return the "success" flag of every env's info, if the env reports one."""
+        if isinstance(info, Batch):
+            return info.success.astype(bool) if "success" in info else None
+        if not isinstance(info, dict) and len(info) > 0 and "success" in info[0]:
+            return np.asarray([inf["success"] for inf in info], dtype=bool)
+        return None
+
     def reset_env(self, gym_reset_kwargs: Optional[Dict[str, Any]] = None) -> None:
         """Reset all of the environments."""
         gym_reset_kwargs = gym_reset_kwargs if gym_reset_kwargs else {}
         obs, info = self.env.reset(**gym_reset_kwargs)
+        info = self._parse_info(info)
         if self.preprocess_fn:
             processed_data = self.preprocess_fn(
                 obs=obs, info=info, env_id=np.arange(self.env_num)
@@ -172,6 +218,7 @@ class Collector(object):
     ) -> None:
         gym_reset_kwargs = gym_reset_kwargs if gym_reset_kwargs else {}
         obs_reset, info = self.env.reset(global_ids, **gym_reset_kwargs)
+        info = self._parse_info(info)
         if self.preprocess_fn:
             processed_data = self.preprocess_fn(
                 obs=obs_reset, info=info, env_id=global_ids
@@ -220,6 +267,8 @@ class Collector(object):
             * ``rews`` array of episode reward over collected episodes.
             * ``lens`` array of episode length over collected episodes.
             * ``idxs`` array of episode start index in buffer over collected episodes.
+            * ``successes`` array of episode success (0. or 1.) over collected \
+                episodes.
             * ``rew`` mean of episodic rewards.
             * ``len`` mean of episodic lengths.
             * ``rew_std`` standard error of episodic rewards.
@@ -274,12 +323,13 @@ class Collector(object):
                 act_sample = self.policy.map_action_inverse(act_sample)  # type: ignore
                 self.data.update(act=act_sample)
             else:
-                if no_grad:
-                    with torch.no_grad():  # faster than retain_grad version
-                        # self.data.obs will be used by agent to get result
+                with self.timing.timeit("policy"):
+                    if no_grad:
+                        with torch.no_grad():  # faster than retain_grad version
+                            # self.data.obs will be used by agent to get result
+                            result = self.policy(self.data, last_state)
+                    else:
                         result = self.policy(self.data, last_state)
-                else:
-                    result = self.policy(self.data, last_state)
                 # update state / act / policy into self.data
                 policy = result.get("policy", Batch())
                 assert isinstance(policy, Batch)
@@ -294,14 +344,16 @@ class Collector(object):
             # get bounded and remapped actions first (not saved into buffer)
             action_remap = self.policy.map_action(self.data.act)
             # step in env
-            obs_next, rew, terminated, truncated, info = self.env.step(
-                action_remap,  # type: ignore
-                ready_env_ids
-            )
+            with self.timing.timeit("env"):
+                obs_next, rew, terminated, truncated, info = self.env.step(
+                    action_remap,  # type: ignore
+                    ready_env_ids
+                )
+            info = self._parse_info(info)
             done = np.logical_or(terminated, truncated)
-            if not isinstance(info, dict) and "success" in info[0]:
-                success = np.asarray([inf["success"] for inf in info], dtype=bool)
-                ep_success |= success
+            success = self._info_success(info)
+            if success is not None:
+                ep_success[ready_env_ids] |= success
 
             self.data.update(
                 obs_next=obs_next,
@@ -330,9 +382,10 @@ class Collector(object):
                     time.sleep(render)
 
             # add data into the buffer
-            ptr, ep_rew, ep_len, ep_idx = self.buffer.add(
-                self.data, buffer_ids=ready_env_ids
-            )
+            with self.timing.timeit("buffer"):
+                ptr, ep_rew, ep_len, ep_idx = self.buffer.add(
+                    self.data, buffer_ids=ready_env_ids
+                )
 
             # collect statistics
             step_count += len(ready_env_ids)
@@ -343,14 +396,17 @@ class Collector(object):
                 episode_count += len(env_ind_local)
                 episode_lens.append(ep_len[env_ind_local])
                 episode_rews.append(ep_rew[env_ind_local])
-                episode_success_rates.append(ep_success[env_ind_local].astype('float32'))
-                ep_success[env_ind_local] = False
+                episode_success_rates.append(
+                    ep_success[env_ind_global].astype(np.float32)
+                )
+                ep_success[env_ind_global] = False
                 episode_start_indices.append(ep_idx[env_ind_local])
                 # now we copy obs_next to obs, but since there might be
                 # finished episodes, we have to reset finished envs first.
-                self._reset_env_with_ids(
-                    env_ind_local, env_ind_global, gym_reset_kwargs
-                )
+                with self.timing.timeit("reset"):
+                    self._reset_env_with_ids(
+                        env_ind_local, env_ind_global, gym_reset_kwargs
+                    )
                 for i in env_ind_local:
                     self._reset_state(i)
 
@@ -396,11 +452,13 @@ class Collector(object):
                     [episode_rews, episode_lens, episode_start_indices]
                 )
             )
+            successes = np.concatenate(episode_success_rates)
             rew_mean, rew_std = rews.mean(), rews.std()
             len_mean, len_std = lens.mean(), lens.std()
-            success_rate_mean = np.concatenate(episode_success_rates).mean()
+            success_rate_mean = successes.mean()
         else:
             rews, lens, idxs = np.array([]), np.array([], int), np.array([], int)
+            successes = np.array([], np.float32)
             rew_mean = rew_std = len_mean = len_std = 0
             success_rate_mean = 0.
 
@@ -410,6 +468,7 @@ class Collector(object):
             "rews": rews,
             "lens": lens,
             "idxs": idxs,
+            "successes": successes,
             "rew": rew_mean,
             "len": len_mean,
             "rew_std": rew_std,
@@ -432,6 +491,8 @@ class AsyncCollector(Collector):
         buffer: Optional[ReplayBuffer] = None,
         preprocess_fn: Optional[Callable[..., Batch]] = None,
         exploration_noise: bool = False,
+        info_schema: Optional[Dict[str, Any]] = None,
+        drop_unknown_info: bool = False,
     ) -> None:
         # assert env.is_async
         warnings.warn("Using async setting may collect extra transitions into buffer.")
@@ -441,6 +502,8 @@ class AsyncCollector(Collector):
             buffer,
             preprocess_fn,
             exploration_noise,
+            info_schema,
+            drop_unknown_info,
         )
 
     def reset_env(self, gym_reset_kwargs: Optional[Dict[str, Any]] = None) -> None:
@@ -485,6 +548,8 @@ class AsyncCollector(Collector):
             * ``rews`` array of episode reward over collected episodes.
             * ``lens`` array of episode length over collected episodes.
             * ``idxs`` array of episode start index in buffer over collected episodes.
+            * ``successes`` array of episode success (0. or 1.) over collected \
+                episodes.
             * ``rew`` mean of episodic rewards.
             * ``len`` mean of episodic lengths.
             * ``rew_std`` standard error of episodic rewards.
@@ -535,12 +600,13 @@ class AsyncCollector(Collector):
                 act_sample = self.policy.map_action_inverse(act_sample)  # type: ignore
                 self.data.update(act=act_sample)
             else:
-                if no_grad:
-                    with torch.no_grad():  # faster than retain_grad version
-                        # self.data.obs will be used by agent to get result
+                with self.timing.timeit("policy"):
+                    if no_grad:
+                        with torch.no_grad():  # faster than retain_grad version
+                            # self.data.obs will be used by agent to get result
+                            result = self.policy(self.data, last_state)
+                    else:
                         result = self.policy(self.data, last_state)
-                else:
-                    result = self.policy(self.data, last_state)
                 # update state / act / policy into self.data
                 policy = result.get("policy", Batch())
                 assert isinstance(policy, Batch)
@@ -563,20 +629,22 @@ class AsyncCollector(Collector):
             # get bounded and remapped actions first (not saved into buffer)
             action_remap = self.policy.map_action(self.data.act)
             # step in env
-            obs_next, rew, terminated, truncated, info = self.env.step(
-                action_remap,  # type: ignore
-                ready_env_ids
-            )
+            with self.timing.timeit("env"):
+                obs_next, rew, terminated, truncated, info = self.env.step(
+                    action_remap,  # type: ignore
+                    ready_env_ids
+                )
             done = np.logical_or(terminated, truncated)
-            if "success" in info[0]:
-                success = np.asarray([inf["success"] for inf in info], dtype=bool)
-                ep_success |= success
 
             # change self.data here because ready_env_ids has changed
             try:
                 ready_env_ids = info["env_id"]
             except Exception:
                 ready_env_ids = np.array([i["env_id"] for i in info])
+            info = self._parse_info(info)
+            success = self._info_success(info)
+            if success is not None:
+                ep_success[ready_env_ids] |= success
             self.data = whole_data[ready_env_ids]
 
             self.data.update(
@@ -617,9 +685,10 @@ class AsyncCollector(Collector):
                     time.sleep(render)
 
             # add data into the buffer
-            ptr, ep_rew, ep_len, ep_idx = self.buffer.add(
-                self.data, buffer_ids=ready_env_ids
-            )
+            with self.timing.timeit("buffer"):
+                ptr, ep_rew, ep_len, ep_idx = self.buffer.add(
+                    self.data, buffer_ids=ready_env_ids
+                )
 
             # collect statistics
             step_count += len(ready_env_ids)
@@ -630,14 +699,17 @@ class AsyncCollector(Collector):
                 episode_count += len(env_ind_local)
                 episode_lens.append(ep_len[env_ind_local])
                 episode_rews.append(ep_rew[env_ind_local])
-                episode_success_rates.append(ep_success[env_ind_local].astype('float32'))
-                ep_success[env_ind_local] = False
+                episode_success_rates.append(
+                    ep_success[env_ind_global].astype(np.float32)
+                )
+                ep_success[env_ind_global] = False
                 episode_start_indices.append(ep_idx[env_ind_local])
                 # now we copy obs_next to obs, but since there might be
                 # finished episodes, we have to reset finished envs first.
-                self._reset_env_with_ids(
-                    env_ind_local, env_ind_global, gym_reset_kwargs
-                )
+                with self.timing.timeit("reset"):
+                    self._reset_env_with_ids(
+                        env_ind_local, env_ind_global, gym_reset_kwargs
+                    )
                 for i in env_ind_local:
                     self._reset_state(i)
 
@@ -670,11 +742,460 @@ class AsyncCollector(Collector):
                     [episode_rews, episode_lens, episode_start_indices]
                 )
             )
+            successes = np.concatenate(episode_success_rates)
+            rew_mean, rew_std = rews.mean(), rews.std()
+            len_mean, len_std = lens.mean(), lens.std()
+            success_rate_mean = successes.mean()
+        else:
+            rews, lens, idxs = np.array([]), np.array([], int), np.array([], int)
+            successes = np.array([], np.float32)
+            rew_mean = rew_std = len_mean = len_std = 0
+            success_rate_mean = 0.
+
+        return {
+            "n/ep": episode_count,
+            "n/st": step_count,
+            "rews": rews,
+            "lens": lens,
+            "idxs": idxs,
+            "successes": successes,
+            "rew": rew_mean,
+            "len": len_mean,
+            "rew_std": rew_std,
+            "len_std": len_std,
+            "success_rate": success_rate_mean,
+        }
+
+
+class _TwoGroupPipeline(VectorEnvWrapper):
+    """Step a vector env as two groups of envs which take turns.
+
+    :meth:`step` sends the actions of the given envs, then returns the results of
+    the group which has been stepping the longest, once all of its envs are back.
+    The results of other envs which arrive in the meantime are kept until it is their
+    group's turn. The first envs sent while nothing is stepping are split into two
+    halves, so that the caller computes the actions of one half while the other one
+    steps.
+
+    The wrapped vector env is switched to async stepping.
+    """
+
+    def __init__(self, venv: BaseVectorEnv) -> None:
+        super().__init__(venv)
+        self.env_num = len(venv)
+        inner = venv
+        while isinstance(inner, VectorEnvWrapper):
+            inner = inner.venv
+        inner.wait_num, inner.is_async = 1, True
+        self.is_async = True
+        self._groups: List[np.ndarray] = []  # the stepping groups, oldest first
+        self._arrived: Dict[int, tuple] = {}
+
+    def _fetch(self, result: gym_new_venv_step_type) -> None:
+        """Keep every env's part of a step result of the wrapped env."""
+        info = result[-1]
+        for i, env_info in enumerate(info):
+            self._arrived[env_info["env_id"]] = tuple(r[i] for r in result)
+
+    def step(
+        self,
+        action: np.ndarray,
+        id: Optional[Union[int, List[int], np.ndarray]] = None,
+    ) -> gym_new_venv_step_type:
+        id = self._wrap_id(id)
+        if action is not None:
+            if not self._groups and len(id) > 1:
+                half = (len(id) + 1) // 2
+                self._groups += [np.asarray(id[:half]), np.asarray(id[half:])]
+            else:
+                self._groups.append(np.asarray(id))
+            self._fetch(self.venv.step(action, id))
+        group = self._groups.pop(0)
+        while not all(i in self._arrived for i in group):
+            self._fetch(self.venv.step(None))  # type: ignore
+        returns = [self._arrived.pop(i) for i in group]
+        obs_list, rew_list, term_list, trunc_list, info_list = zip(*returns)
+        try:
+            obs_stack = np.stack(obs_list)
+        except ValueError:  # different len(obs)
+            obs_stack = np.array(obs_list, dtype=object)
+        return (
+            obs_stack,
+            np.stack(rew_list),
+            np.stack(term_list),
+            np.stack(trunc_list),
+            np.stack(info_list),
+        )
+
+    def reset(
+        self,
+        id: Optional[Union[int, List[int], np.ndarray]] = None,
+        **kwargs: Any,
+    ) -> Tuple[np.ndarray, Union[dict, List[dict]]]:
+        # drop the steps of the envs to reset which are still on their way
+        id = self._wrap_id(id)
+        for group in self._groups:
+            while any(i in group and i not in self._arrived for i in id):
+                self._fetch(self.venv.step(None))  # type: ignore
+        for i in id:
+            self._arrived.pop(i, None)
+        self._groups = [
+            group[~np.isin(group, id)] for group in self._groups
+        ]
+        self._groups = [group for group in self._groups if len(group)]
+        return self.venv.reset(id, **kwargs)
+
+
+class PipelinedCollector(AsyncCollector):
+    """Pipelined Collector overlaps the policy forward with the env steps.
+
+    The envs are split into two groups which take turns: the policy computes the
+    actions of one group while the other group steps in its workers. It works best
+    with :class:`~tianshou.env.SubprocVectorEnv` or
+    :class:`~tianshou.env.ShmemVectorEnv`, whose workers step in parallel to the
+    main process. Every env steps exactly once per turn of its group, and the
+    transitions and episode statistics are recorded per env id by the
+    :class:`~tianshou.data.AsyncCollector` machinery.
+
+    As with AsyncCollector, :meth:`collect` may collect a few more transitions than
+    asked for, and the group stepping when it returns is collected by the next call,
+    with the actions chosen by the policy at that time.
+
+    The arguments are exactly the same as :class:`~tianshou.data.Collector`, please
+    refer to :class:`~tianshou.data.Collector` for more detailed explanation. The env
+    must be a :class:`~tianshou.env.BaseVectorEnv`, it is switched to async
+    stepping.
+    """
+
+    def __init__(
+        self,
+        policy: BasePolicy,
+        env: BaseVectorEnv,
+        buffer: Optional[ReplayBuffer] = None,
+        preprocess_fn: Optional[Callable[..., Batch]] = None,
+        exploration_noise: bool = False,
+        info_schema: Optional[Dict[str, Any]] = None,
+        drop_unknown_info: bool = False,
+    ) -> None:
+        if not isinstance(env, BaseVectorEnv):
+            raise TypeError(
+                "PipelinedCollector needs a BaseVectorEnv", type(env).__name__
+            )
+        super().__init__(
+            policy,
+            _TwoGroupPipeline(env),
+            buffer,
+            preprocess_fn,
+            exploration_noise,
+            info_schema,
+            drop_unknown_info,
+        )
+
+
+class FastCollector(Collector):
+    """Collector specialized for flat Box observation and action spaces.
+
+    The step loop copies the observations, actions, rewards and flags of the
+    running envs into ``[env_num, ...]`` staging arrays allocated once per
+    collector, calls the policy with a reused Batch of only "obs" and "info", and
+    writes every step straight from the staging arrays into the storage of the
+    buffer, instead of updating the nested ``self.data`` Batch and building a new
+    Batch for :meth:`ReplayBuffer.add`. The
+    buffer content and the returned statistics are the same as
+    :meth:`Collector.collect`.
+
+    The fast path needs 1-d :class:`~gymnasium.spaces.Box` observation and action
+    spaces, no preprocess_fn, a policy without hidden state, and a
+    :class:`~tianshou.data.VectorReplayBuffer` or
+    :class:`~tianshou.data.RolloutBuffer` without ``save_only_last_obs``. In every
+    other case :meth:`collect` falls back to :meth:`Collector.collect`. Without a
+    given buffer, it stores the last transition of every env in a RolloutBuffer.
+
+    The arguments are exactly the same as :class:`~tianshou.data.Collector`, please
+    refer to :class:`~tianshou.data.Collector` for more detailed explanation.
+    """
+
+    def __init__(
+        self,
+        policy: BasePolicy,
+        env: Union[gym.Env, BaseVectorEnv],
+        buffer: Optional[ReplayBuffer] = None,
+        preprocess_fn: Optional[Callable[..., Batch]] = None,
+        exploration_noise: bool = False,
+        info_schema: Optional[Dict[str, Any]] = None,
+        drop_unknown_info: bool = False,
+    ) -> None:
+        super().__init__(
+            policy,
+            env,
+            buffer,
+            preprocess_fn,
+            exploration_noise,
+            info_schema,
+            drop_unknown_info,
+        )
+        self._flat_spaces = self._is_flat_box(self.env.observation_space) and \
+            self._is_flat_box(self._action_space)
+        # per-step arrays of the fast path, see _staging_array
+        self._staging: Dict[str, np.ndarray] = {}
+
+    def _assign_buffer(self, buffer: Optional[ReplayBuffer]) -> None:
+        if buffer is None:  # the same layout as Collector's, with a vectorized add
+            buffer = RolloutBuffer(self.env_num, self.env_num)
+        super()._assign_buffer(buffer)
+
+    @staticmethod
+    def _is_flat_box(space: Any) -> bool:
+        """Whether space (or every per-env space in a list) is a 1-d Box."""
+        if isinstance(space, (list, tuple)):
+            return len(space) > 0 and all(map(FastCollector._is_flat_box, space))
+        return isinstance(space, gym.spaces.Box) and len(space.shape) == 1
+
+    def _staging_array(self, key: str, like: np.ndarray) -> np.ndarray:
+        """Return the [env_num, ...] staging array of key, allocated on first use."""
+        array = self._staging.get(key)
+        if array is None or array.dtype != like.dtype or \
+                array.shape[1:] != like.shape[1:]:
+            array = np.empty((self.env_num, *like.shape[1:]), like.dtype)
+            self._staging[key] = array
+        return array
+
+    def _stage(self, key: str, value: Any, num: int) -> np.ndarray:
+        """Copy the values of the first num envs into the staging array of key."""
+        value = np.asarray(value)
+        array = self._staging_array(key, value)[:num]
+        array[...] = value
+        return array
+
+    def _use_fast_path(self) -> bool:
+        return (
+            self._flat_spaces and self.preprocess_fn is None
+            and type(self.buffer) in (VectorReplayBuffer, RolloutBuffer)
+            and not self.buffer._save_only_last_obs
+            and "hidden_state" not in self.data.policy
+        )
+
+    def collect(
+        self,
+        n_step: Optional[int] = None,
+        n_episode: Optional[int] = None,
+        random: bool = False,
+        render: Optional[float] = None,
+        no_grad: bool = True,
+        gym_reset_kwargs: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Collect a specified number of step or episode.
+
+        See :meth:`Collector.collect` for the arguments and the returned dict.
+        """
+        if not self._use_fast_path():
+            return super().collect(
+                n_step, n_episode, random, render, no_grad, gym_reset_kwargs
+            )
+        assert not self.env.is_async, "Please use AsyncCollector if using async venv."
+        if n_step is not None:
+            assert n_episode is None, (
+                f"Only one of n_step or n_episode is allowed in Collector."
+                f"collect, got n_step={n_step}, n_episode={n_episode}."
+            )
+            assert n_step > 0
+            if not n_step % self.env_num == 0:
+                warnings.warn(
+                    f"n_step={n_step} is not a multiple of #env ({self.env_num}), "
+                    "which may cause extra transitions collected into the buffer."
+                )
+            ready_env_ids = np.arange(self.env_num)
+        elif n_episode is not None:
+            assert n_episode > 0
+            ready_env_ids = np.arange(min(self.env_num, n_episode))
+        else:
+            raise TypeError(
+                "Please specify at least one (either n_step or n_episode) "
+                "in AsyncCollector.collect()."
+            )
+
+        start_time = time.time()
+
+        ep_success = np.zeros(self.env_num, dtype=bool)
+        episode_success_rates = []
+        step_count = 0
+        episode_count = 0
+        episode_rews = []
+        episode_lens = []
+        episode_start_indices = []
+
+        last = self.data[:len(ready_env_ids)]
+        # a random step keeps the policy outputs of the last step, as Collector does
+        info, policy = last.info, last.policy
+        obs = self._stage("obs", last.obs, len(ready_env_ids))
+        save_obs_next = self.buffer._save_obs_next
+        # the policy input and the transition handed to the buffer are reused, their
+        # arrays are views of the staging arrays filled in place every step
+        batch = Batch()
+        step_data: Dict[str, Any] = {}
+
+        while True:
+            num = len(ready_env_ids)
+            # get the next action
+            if random:
+                try:
+                    act_sample = [
+                        self._action_space[i].sample() for i in ready_env_ids
+                    ]
+                except TypeError:  # envpool's action space is not for per-env
+                    act_sample = [self._action_space.sample() for _ in ready_env_ids]
+                act = self.policy.map_action_inverse(act_sample)  # type: ignore
+            else:
+                batch.obs, batch.info = obs, info
+                with self.timing.timeit("policy"):
+                    if no_grad:
+                        with torch.no_grad():  # faster than retain_grad version
+                            result = self.policy(batch)
+                    else:
+                        result = self.policy(batch)
+                if result.get("state", None) is not None:
+                    raise ValueError(
+                        "FastCollector does not support policies with hidden state,"
+                        " please use Collector instead."
+                    )
+                policy = result.get("policy", Batch())
+                assert isinstance(policy, Batch)
+                act = to_numpy(result.act)
+                if self.exploration_noise:
+                    act = self.policy.exploration_noise(act, batch)
+            act = self._stage("act", act, num)
+
+            # get bounded and remapped actions first (not saved into buffer)
+            action_remap = self.policy.map_action(act)
+            # step in env
+            with self.timing.timeit("env"):
+                obs_next, rew, terminated, truncated, step_info = self.env.step(
+                    action_remap,  # type: ignore
+                    ready_env_ids
+                )
+            obs_next = self._stage("obs_next", obs_next, num)
+            rew = self._stage("rew", rew, num)
+            terminated = self._stage("terminated", terminated, num)
+            truncated = self._stage("truncated", truncated, num)
+            done = np.logical_or(
+                terminated,
+                truncated,
+                out=self._staging_array("done", terminated)[:num]
+            )
+            step_info = self._parse_info(step_info)
+            success = self._info_success(step_info)
+            if success is not None:
+                ep_success[ready_env_ids] |= success
+            info = _parse_value(step_info)
+
+            if render:
+                self.env.render()
+                if render > 0 and not np.isclose(render, 0):
+                    time.sleep(render)
+
+            # add data into the buffer
+            step_data["obs"] = obs
+            step_data["act"] = act
+            step_data["rew"] = rew
+            step_data["terminated"] = terminated
+            step_data["truncated"] = truncated
+            step_data["done"] = done
+            step_data["info"] = info
+            step_data["policy"] = policy
+            if save_obs_next:
+                step_data["obs_next"] = obs_next
+            with self.timing.timeit("buffer"):
+                ptr, ep_rew, ep_len, ep_idx = self.buffer._add_arrays(
+                    step_data, ready_env_ids
+                )
+
+            # collect statistics
+            step_count += num
+
+            if np.any(done):
+                env_ind_local = np.where(done)[0]
+                env_ind_global = ready_env_ids[env_ind_local]
+                episode_count += len(env_ind_local)
+                episode_lens.append(ep_len[env_ind_local])
+                episode_rews.append(ep_rew[env_ind_local])
+                episode_success_rates.append(
+                    ep_success[env_ind_global].astype(np.float32)
+                )
+                ep_success[env_ind_global] = False
+                episode_start_indices.append(ep_idx[env_ind_local])
+                # reset the finished envs in place of their obs_next
+                with self.timing.timeit("reset"):
+                    obs_reset, info_reset = self.env.reset(
+                        env_ind_global, **(gym_reset_kwargs or {})
+                    )
+                obs_next[env_ind_local] = obs_reset
+                info[env_ind_local] = self._parse_info(info_reset)
+
+                # remove surplus env id from ready_env_ids
+                # to avoid bias in selecting environments
+                if n_episode:
+                    surplus_env_num = len(ready_env_ids) - (n_episode - episode_count)
+                    if surplus_env_num > 0:
+                        mask = np.ones_like(ready_env_ids, dtype=bool)
+                        mask[env_ind_local[:surplus_env_num]] = False
+                        ready_env_ids = ready_env_ids[mask]
+                        obs_next = obs_next[mask]
+                        kept = Batch(info=info, policy=policy)[mask]
+                        info, policy = kept.info, kept.policy
+
+            obs = self._stage("obs", obs_next, len(ready_env_ids))
+
+            if (n_step and step_count >= n_step) or \
+                    (n_episode and episode_count >= n_episode):
+                break
+
+        # generate statistics
+        self.collect_step += step_count
+        self.collect_episode += episode_count
+        self.collect_time += max(time.time() - start_time, 1e-9)
+
+        if n_episode:
+            self.data = Batch(
+                obs={},
+                act={},
+                rew={},
+                terminated={},
+                truncated={},
+                done={},
+                obs_next={},
+                info={},
+                policy={}
+            )
+            self.reset_env()
+        else:
+            # the staging arrays are overwritten by the next call
+            obs = obs.copy()
+            self.data = Batch(
+                obs=obs,
+                act=act.copy(),
+                rew=rew.copy(),
+                terminated=terminated.copy(),
+                truncated=truncated.copy(),
+                done=done.copy(),
+                obs_next=obs,
+                info=info,
+                policy=policy
+            )
+
+        if episode_count > 0:
+            rews, lens, idxs = list(
+                map(
+                    np.concatenate,
+                    [episode_rews, episode_lens, episode_start_indices]
+                )
+            )
+            successes = np.concatenate(episode_success_rates)
             rew_mean, rew_std = rews.mean(), rews.std()
             len_mean, len_std = lens.mean(), lens.std()
-            success_rate_mean = np.concatenate(episode_success_rates).mean()
+            success_rate_mean = successes.mean()
         else:
             rews, lens, idxs = np.array([]), np.array([], int), np.array([], int)
+            successes = np.array([], np.float32)
             rew_mean = rew_std = len_mean = len_std = 0
             success_rate_mean = 0.
 
@@ -684,6 +1205,7 @@ class AsyncCollector(Collector):
             "rews": rews,
             "lens": lens,
             "idxs": idxs,
+            "successes": successes,
             "rew": rew_mean,
             "len": len_mean,
             "rew_std": rew_std,
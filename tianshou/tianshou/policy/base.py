@@ -8,8 +8,8 @@ from gymnasium.spaces import Box, Discrete, MultiBinary, MultiDiscrete
 from numba import njit
 from torch import nn
 
-from tianshou.data import Batch, ReplayBuffer, to_numpy, to_torch_as
-from tianshou.utils import MultipleLRSchedulers
+from tianshou.data import Batch, ReplayBuffer, RolloutBuffer, to_numpy, to_torch_as
+from tianshou.utils import MultipleLRSchedulers, Timing
 
 
 class BasePolicy(ABC, nn.Module):
@@ -83,6 +83,8 @@ class BasePolicy(ABC, nn.Module):
         assert action_bound_method in ("", "clip", "tanh")
         self.action_bound_method = action_bound_method
         self.lr_scheduler = lr_scheduler
+        # the trainer shares its Timing to break update() down into phases
+        self.timing = Timing(enabled=False)
         self._compile()
 
     def set_agent_id(self, agent_id: int) -> None:
@@ -271,11 +273,15 @@ class BasePolicy(ABC, nn.Module):
         """
         if buffer is None:
             return {}
-        batch, indices = buffer.sample(sample_size)
+        with self.timing.timeit("sample"):
+            batch, indices = buffer.sample(sample_size)
         self.updating = True
-        batch = self.process_fn(batch, buffer, indices)
-        result = self.learn(batch, **kwargs)
-        self.post_process_fn(batch, buffer, indices)
+        with self.timing.timeit("process_fn"):
+            batch = self.process_fn(batch, buffer, indices)
+        with self.timing.timeit("learn"):
+            result = self.learn(batch, **kwargs)
+        with self.timing.timeit("post_process_fn"):
+            self.post_process_fn(batch, buffer, indices)
         if self.lr_scheduler is not None:
             self.lr_scheduler.step()
         self.updating = False
@@ -319,7 +325,10 @@ class BasePolicy(ABC, nn.Module):
         :param Batch batch: a data batch which contains several episodes of data in
             sequential order. Mind that the end of each finished episode of batch
             should be marked by done flag, unfinished (or collecting) episodes will be
-            recognized by buffer.unfinished_index().
+            recognized by buffer.unfinished_index(). With a
+            :class:`~tianshou.data.RolloutBuffer`, the boundaries come from its
+            time-major layout instead, see
+            :meth:`~tianshou.data.RolloutBuffer.compute_gae`.
         :param numpy.ndarray indices: tell batch's location in buffer, batch is equal
             to buffer[indices].
         :param np.ndarray v_s_: the value function of all next states :math:`V(s')`.
@@ -338,13 +347,83 @@ class BasePolicy(ABC, nn.Module):
             v_s_ = v_s_ * BasePolicy.value_mask(buffer, indices)
         v_s = np.roll(v_s_, 1) if v_s is None else to_numpy(v_s.flatten())
 
-        end_flag = np.logical_or(batch.terminated, batch.truncated)
-        end_flag[np.isin(indices, buffer.unfinished_index())] = True
-        advantage = _gae_return(v_s, v_s_, rew, end_flag, gamma, gae_lambda)
+        if isinstance(buffer, RolloutBuffer):
+            advantage = buffer.compute_gae(indices, rew, v_s, v_s_, gamma, gae_lambda)
+        else:
+            end_flag = np.logical_or(batch.terminated, batch.truncated)
+            end_flag[np.isin(indices, buffer.unfinished_index())] = True
+            advantage = _gae_return(v_s, v_s_, rew, end_flag, gamma, gae_lambda)
         returns = advantage + v_s
         # normalization varies from each policy, so we don't do it here
         return returns, advantage
 
+    @staticmethod
+    def compute_episodic_return_torch(
+        batch: Batch,
+        buffer: ReplayBuffer,
+        indices: np.ndarray,
+        v_s_: Optional[torch.Tensor] = None,
+        v_s: Optional[torch.Tensor] = None,
+        gamma: float = 0.99,
+        gae_lambda: float = 0.95,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Compute returns over given batch with torch, on the device of the values.
+
+        Same as :meth:`compute_episodic_return`, but the values never leave their
+        device; only the rewards and the episode structure, which live in the
+        buffer on the host, are copied over once. Episodes are followed through
+        ``buffer.next()``, so any order of ``indices`` works, e.g. the time-major
+        order of :class:`~tianshou.data.RolloutBuffer`.
+
+        :param torch.Tensor v_s_: the value function of all next states
+            :math:`V(s')`.
+        :param torch.Tensor v_s: the value function of all current states
+            :math:`V(s)`.
+
+        :return: two tensors (returns, advantage) with each shape (bsz, ).
+
+        .. seealso::
+
+            Please refer to :meth:`compute_episodic_return` for the other
+            parameters.
+        """
+        reference = v_s_ if v_s_ is not None else v_s
+        rew = to_torch_as(batch.rew, reference) if reference is not None \
+            else torch.as_tensor(batch.rew)
+        if v_s_ is None:
+            assert np.isclose(gae_lambda, 1.0)
+            v_s_ = torch.zeros_like(rew)
+        else:
+            value_mask = BasePolicy.value_mask(buffer, indices)
+            v_s_ = v_s_.flatten() * torch.as_tensor(value_mask, device=rew.device)
+        v_s = v_s_.roll(1) if v_s is None else v_s.flatten()
+        next_rows = torch.as_tensor(
+            BasePolicy._next_rows(buffer, indices), device=rew.device
+        )
+        advantage = _gae_return_torch(v_s, v_s_, rew, next_rows, gamma, gae_lambda)
+        returns = advantage + v_s
+        return returns, advantage
+
+    @staticmethod
+    def _next_rows(buffer: ReplayBuffer, indices: np.ndarray) -> np.ndarray:
+        """Row of the batch holding the next transition of each row, -1 if none.
+
+        There is none at the end of an episode, at the newest transition of an
+        unfinished one, or when the next transition isn't part of the batch. Inside
+        an episode the next transition's "obs" is the "obs_next" of the row, e.g.
+        for ``buffer.sample(0)`` after an on-policy collect, in whatever order the
+        buffer returns the transitions (env-major or time-major).
+        """
+        next_rows = np.full(len(indices), -1)
+        if len(indices) > 1:
+            next_indices = buffer.next(indices)
+            order = np.argsort(indices, kind="stable")
+            found = np.searchsorted(indices[order], next_indices)
+            found = order[np.minimum(found, len(indices) - 1)]
+            reusable = (next_indices != indices) & (indices[found] == next_indices)
+            next_rows[reusable] = found[reusable]
+        return next_rows
+
     @staticmethod
     def compute_nstep_return(
         batch: Batch,
@@ -429,6 +508,34 @@ def _gae_return(
     return returns
 
 
+def _gae_return_torch(
+    v_s: torch.Tensor,
+    v_s_: torch.Tensor,
+    rew: torch.Tensor,
+    next_rows: torch.Tensor,
+    gamma: float,
+    gae_lambda: float,
+) -> torch.Tensor:
+    """Torch counterpart of :func:`_gae_return` following ``next_rows`` links.
+
+    The recursion ``gae[i] = delta[i] + discount[i] * gae[next[i]]`` is solved by
+    pointer jumping: after k rounds every row has summed the 2 ** k rows ahead of
+    it, so it takes log2(bsz) rounds of elementwise ops instead of bsz steps.
+    """
+    size = len(rew)
+    # row ``size`` is a sentinel with zero advantage which every chain ends in
+    sentinel = torch.full_like(next_rows, size)
+    next_rows = torch.cat([torch.where(next_rows < 0, sentinel, next_rows),
+                           sentinel[:1]])
+    gae = torch.cat([rew + v_s_ * gamma - v_s, rew.new_zeros(1)])
+    discount = (next_rows < size).to(gae.dtype) * (gamma * gae_lambda)
+    for _ in range(int(np.ceil(np.log2(max(size, 2))))):
+        gae = gae + discount * gae[next_rows]
+        discount = discount * discount[next_rows]
+        next_rows = next_rows[next_rows]
+    return gae[:size]
+
+
 @njit
 def _nstep_return(
     rew: np.ndarray,
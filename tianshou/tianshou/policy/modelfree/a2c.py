@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional, Type
+from typing import Any, Dict, List, Optional, Tuple, Type
 
 import numpy as np
 import torch
@@ -7,6 +7,7 @@ from torch import nn
 
 from tianshou.data import Batch, ReplayBuffer, to_torch_as
 from tianshou.policy import PGPolicy
+from tianshou.utils import DeferredMetrics
 from tianshou.utils.net.common import ActorCritic
 
 
@@ -32,6 +33,16 @@ class A2CPolicy(PGPolicy):
         depends on the size of available memory and the memory cost of the
         model; should be as large as possible within the memory constraint.
         Default to 256.
+    :param bool deferred_metrics: whether to keep the losses of each gradient step
+        on the device and synchronize them once at the end of ``learn()``, instead
+        of calling ``.item()`` on every minibatch. Default to False.
+    :param bool device_gae: whether to compute GAE with torch on the device of the
+        critic, see :meth:`~tianshou.policy.BasePolicy.compute_episodic_return_torch`,
+        instead of with numba on the host. Default to False.
+    :param bool reuse_next_value: whether to take V(s') from V(s) of the next
+        transition when it is in the same batch and episode, and only evaluate the
+        critic on the "obs_next" of the remaining rows. Default to False, which
+        evaluates it on every "obs_next".
     :param bool action_scaling: whether to map actions from range [-1, 1] to range
         [action_spaces.low, action_spaces.high]. Default to True.
     :param str action_bound_method: method to bound action to range [-1, 1], can be
@@ -61,6 +72,9 @@ class A2CPolicy(PGPolicy):
         max_grad_norm: Optional[float] = None,
         gae_lambda: float = 0.95,
         max_batchsize: int = 256,
+        deferred_metrics: bool = False,
+        device_gae: bool = False,
+        reuse_next_value: bool = False,
         **kwargs: Any
     ) -> None:
         super().__init__(actor, optim, dist_fn, **kwargs)
@@ -71,6 +85,9 @@ class A2CPolicy(PGPolicy):
         self._weight_ent = ent_coef
         self._grad_norm = max_grad_norm
         self._batch = max_batchsize
+        self._deferred_metrics = deferred_metrics
+        self._device_gae = device_gae
+        self._reuse_next_value = reuse_next_value
         self._actor_critic = ActorCritic(self.actor, self.critic)
 
     def process_fn(
@@ -80,17 +97,50 @@ class A2CPolicy(PGPolicy):
         batch.act = to_torch_as(batch.act, batch.v_s)
         return batch
 
+    def _next_values(
+        self, batch: Batch, v_s: torch.Tensor, next_rows: np.ndarray
+    ) -> torch.Tensor:
+        """Compute V(s') from V(s), evaluating the critic only where it's needed."""
+        v_s_ = torch.empty_like(v_s)
+        reuse_indices = np.nonzero(next_rows >= 0)[0]
+        v_s_[reuse_indices] = v_s[next_rows[reuse_indices]]
+        eval_indices = np.nonzero(next_rows < 0)[0]
+        with torch.no_grad():
+            for start in range(0, len(eval_indices), self._batch):
+                chunk = eval_indices[start:start + self._batch]
+                v_s_[chunk] = self.critic(batch.obs_next[chunk]).flatten()
+        return v_s_
+
     def _compute_returns(
-        self, batch: Batch, buffer: ReplayBuffer, indices: np.ndarray
+        self,
+        batch: Batch,
+        buffer: ReplayBuffer,
+        indices: np.ndarray,
+        values: Optional[Tuple[torch.Tensor, torch.Tensor]] = None,
     ) -> Batch:
-        v_s, v_s_ = [], []
-        with torch.no_grad():
-            for minibatch in batch.split(self._batch, shuffle=False, merge_last=True):
-                v_s.append(self.critic(minibatch.obs))
-                v_s_.append(self.critic(minibatch.obs_next))
-        batch.v_s = torch.cat(v_s, dim=0).flatten()  # old value
+        if values is None:
+            v_s, v_s_ = [], []
+            with torch.no_grad():
+                for minibatch in batch.split(
+                    self._batch, shuffle=False, merge_last=True
+                ):
+                    v_s.append(self.critic(minibatch.obs))
+                    if not self._reuse_next_value:
+                        v_s_.append(self.critic(minibatch.obs_next))
+            batch.v_s = torch.cat(v_s, dim=0).flatten()  # old value
+            if self._reuse_next_value:
+                v_s_ = self._next_values(
+                    batch, batch.v_s, self._next_rows(buffer, indices)
+                )
+            else:
+                v_s_ = torch.cat(v_s_, dim=0).flatten()
+        else:
+            # (V(s), V(s')) precomputed by the caller, e.g. in a fused pass
+            batch.v_s, v_s_ = values
+        if self._device_gae:
+            return self._compute_returns_on_device(batch, buffer, indices, v_s_)
         v_s = batch.v_s.cpu().numpy()
-        v_s_ = torch.cat(v_s_, dim=0).flatten().cpu().numpy()
+        v_s_ = v_s_.cpu().numpy()
         # when normalizing values, we do not minus self.ret_rms.mean to be numerically
         # consistent with OPENAI baselines' value normalization pipeline. Emperical
         # study also shows that "minus mean" will harm performances a tiny little bit
@@ -117,10 +167,56 @@ class A2CPolicy(PGPolicy):
         batch.adv = to_torch_as(advantages, batch.v_s)
         return batch
 
+    def _compute_returns_on_device(
+        self,
+        batch: Batch,
+        buffer: ReplayBuffer,
+        indices: np.ndarray,
+        v_s_: torch.Tensor,
+    ) -> Batch:
+        """Same as the end of :meth:`_compute_returns`, without leaving the device."""
+        scale = 1.0
+        if self._rew_norm:  # unnormalize v_s & v_s_
+            scale = float(np.sqrt(self.ret_rms.var + self._eps))
+        unnormalized_returns, advantages = self.compute_episodic_return_torch(
+            batch,
+            buffer,
+            indices,
+            v_s_ * scale,
+            batch.v_s * scale,
+            gamma=self._gamma,
+            gae_lambda=self._lambda
+        )
+        if self._rew_norm:
+            batch.returns = unnormalized_returns / scale
+            # a single transfer of the batch moments instead of the returns
+            moments = torch.stack(
+                [unnormalized_returns.mean(),
+                 unnormalized_returns.var(unbiased=False)]
+            ).cpu().numpy()
+            self.ret_rms.update_from_moments(
+                moments[0], moments[1], len(unnormalized_returns)
+            )
+        else:
+            batch.returns = unnormalized_returns
+        batch.adv = advantages
+        return batch
+
+    def _metrics(
+        self, keys: List[str], batch: Batch, batch_size: int, repeat: int
+    ) -> DeferredMetrics:
+        """Create the metric accumulator for one call to ``learn()``."""
+        num_minibatch = max(len(batch) // batch_size, 1) if batch_size else 1
+        return DeferredMetrics(
+            keys, capacity=repeat * num_minibatch, deferred=self._deferred_metrics
+        )
+
     def learn(  # type: ignore
         self, batch: Batch, batch_size: int, repeat: int, **kwargs: Any
     ) -> Dict[str, List[float]]:
-        losses, actor_losses, vf_losses, ent_losses = [], [], [], []
+        metrics = self._metrics(
+            ["loss", "loss/actor", "loss/vf", "loss/ent"], batch, batch_size, repeat
+        )
         for _ in range(repeat):
             for minibatch in batch.split(batch_size, merge_last=True):
                 # calculate loss for actor
@@ -142,14 +238,9 @@ class A2CPolicy(PGPolicy):
                         self._actor_critic.parameters(), max_norm=self._grad_norm
                     )
                 self.optim.step()
-                actor_losses.append(actor_loss.item())
-                vf_losses.append(vf_loss.item())
-                ent_losses.append(ent_loss.item())
-                losses.append(loss.item())
+                metrics.add("loss/actor", actor_loss)
+                metrics.add("loss/vf", vf_loss)
+                metrics.add("loss/ent", ent_loss)
+                metrics.add("loss", loss)
 
-        return {
-            "loss": losses,
-            "loss/actor": actor_losses,
-            "loss/vf": vf_losses,
-            "loss/ent": ent_losses,
-        }
+        return metrics.result()
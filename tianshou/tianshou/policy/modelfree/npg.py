@@ -33,6 +33,9 @@ class NPGPolicy(A2CPolicy):
         depends on the size of available memory and the memory cost of the
         model; should be as large as possible within the memory constraint.
         Default to 256.
+    :param bool deferred_metrics: whether to keep the losses of each gradient step
+        on the device and synchronize them once at the end of ``learn()``, instead
+        of calling ``.item()`` on every minibatch. Default to False.
     :param bool action_scaling: whether to map actions from range [-1, 1] to range
         [action_spaces.low, action_spaces.high]. Default to True.
     :param str action_bound_method: method to bound action to range [-1, 1], can be
@@ -81,7 +84,9 @@ class NPGPolicy(A2CPolicy):
     def learn(  # type: ignore
         self, batch: Batch, batch_size: int, repeat: int, **kwargs: Any
     ) -> Dict[str, List[float]]:
-        actor_losses, vf_losses, kls = [], [], []
+        metrics = self._metrics(
+            ["loss/actor", "loss/vf", "kl"], batch, batch_size, repeat
+        )
         for _ in range(repeat):
             for minibatch in batch.split(batch_size, merge_last=True):
                 # optimize actor
@@ -123,15 +128,11 @@ class NPGPolicy(A2CPolicy):
                     vf_loss.backward()
                     self.optim.step()
 
-                actor_losses.append(actor_loss.item())
-                vf_losses.append(vf_loss.item())
-                kls.append(kl.item())
+                metrics.add("loss/actor", actor_loss)
+                metrics.add("loss/vf", vf_loss)
+                metrics.add("kl", kl)
 
-        return {
-            "loss/actor": actor_losses,
-            "loss/vf": vf_losses,
-            "kl": kls,
-        }
+        return metrics.result()
 
     def _MVP(self, v: torch.Tensor, flat_kl_grad: torch.Tensor) -> torch.Tensor:
         """Matrix vector product."""
@@ -42,6 +42,9 @@ class PPOPolicy(A2CPolicy):
     :param int max_batchsize: the maximum size of the batch when computing GAE,
         depends on the size of available memory and the memory cost of the model;
         should be as large as possible within the memory constraint. Default to 256.
+    :param bool deferred_metrics: whether to keep the losses of each gradient step
+        on the device and synchronize them once at the end of ``learn()``, instead
+        of calling ``.item()`` on every minibatch. Default to False.
     :param bool action_scaling: whether to map actions from range [-1, 1] to range
         [action_spaces.low, action_spaces.high]. Default to True.
     :param str action_bound_method: method to bound action to range [-1, 1], can be
@@ -98,7 +101,9 @@ class PPOPolicy(A2CPolicy):
     def learn(  # type: ignore
         self, batch: Batch, batch_size: int, repeat: int, **kwargs: Any
     ) -> Dict[str, List[float]]:
-        losses, clip_losses, vf_losses, ent_losses = [], [], [], []
+        metrics = self._metrics(
+            ["loss", "loss/clip", "loss/vf", "loss/ent"], batch, batch_size, repeat
+        )
         for step in range(repeat):
             if self._recompute_adv and step > 0:
                 batch = self._compute_returns(batch, self._buffer, self._indices)
@@ -143,14 +148,9 @@ class PPOPolicy(A2CPolicy):
                         self._actor_critic.parameters(), max_norm=self._grad_norm
                     )
                 self.optim.step()
-                clip_losses.append(clip_loss.item())
-                vf_losses.append(vf_loss.item())
-                ent_losses.append(ent_loss.item())
-                losses.append(loss.item())
+                metrics.add("loss/clip", clip_loss)
+                metrics.add("loss/vf", vf_loss)
+                metrics.add("loss/ent", ent_loss)
+                metrics.add("loss", loss)
 
-        return {
-            "loss": losses,
-            "loss/clip": clip_losses,
-            "loss/vf": vf_losses,
-            "loss/ent": ent_losses,
-        }
+        return metrics.result()
@@ -1,6 +1,7 @@
 """Trainer package."""
 
 from tianshou.trainer.base import BaseTrainer
+from tianshou.trainer.evaluator import BackgroundEvaluator
 from tianshou.trainer.offline import (
     OfflineTrainer,
     offline_trainer,
@@ -31,4 +32,5 @@ __all__ = [
     "OfflineTrainer",
     "test_episode",
     "gather_info",
+    "BackgroundEvaluator",
 ]
@@ -1,19 +1,31 @@
 import time
 from abc import ABC, abstractmethod
 from collections import defaultdict, deque
-from typing import Any, Callable, DefaultDict, Dict, Optional, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    DefaultDict,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import numpy as np
 import tqdm
 
 from tianshou.data import AsyncCollector, Collector, ReplayBuffer
 from tianshou.policy import BasePolicy
+from tianshou.trainer.evaluator import BackgroundEvaluator
 from tianshou.trainer.utils import gather_info, test_episode
 from tianshou.utils import (
     BaseLogger,
     DummyTqdm,
+    EpochProfiler,
     LazyLogger,
     MovAvg,
+    Timing,
     deprecation,
     tqdm_config,
 )
@@ -79,6 +91,23 @@ class BaseTrainer(ABC):
         Default to True.
     :param bool test_in_train: whether to test in the training phase.
         Default to True.
+    :param BackgroundEvaluator evaluator: run the test phases in the background
+        with this :class:`~tianshou.trainer.BackgroundEvaluator` instead of
+        ``test_collector``, which must be None then. Each test phase only submits a
+        snapshot of the policy; results are logged with the env step of their
+        snapshot once they arrive, and ``save_best_fn`` is called with the weights
+        of the best snapshot loaded. The remaining results are waited for when
+        training finishes. Default to None.
+    :param bool timing: whether to time the phases of every epoch (collect, update,
+        test, log and save, broken down further by the collectors and
+        :meth:`~tianshou.policy.BasePolicy.update`) with a
+        :class:`~tianshou.utils.Timing` shared with the policy and collectors. The
+        times of each epoch are written with ``logger.write`` under "timing/" keys
+        and added to the epoch stats; ``trainer.timing`` holds the last epoch's.
+        Default to False.
+    :param EpochProfiler profiler: a :class:`~tianshou.utils.EpochProfiler` that
+        captures a torch.profiler or cProfile profile of a window of epochs.
+        Default to None.
     """
 
     @staticmethod
@@ -154,6 +183,9 @@ class BaseTrainer(ABC):
         verbose: bool = True,
         show_progress: bool = True,
         test_in_train: bool = True,
+        evaluator: Optional[BackgroundEvaluator] = None,
+        timing: bool = False,
+        profiler: Optional[EpochProfiler] = None,
         save_fn: Optional[Callable[[BasePolicy], None]] = None,
     ):
         if save_fn:
@@ -169,6 +201,9 @@ class BaseTrainer(ABC):
 
         self.train_collector = train_collector
         self.test_collector = test_collector
+        assert evaluator is None or test_collector is None, \
+            "evaluator replaces test_collector, please pass only one of them."
+        self.evaluator = evaluator
 
         self.logger = logger
         self.start_time = time.time()
@@ -204,6 +239,14 @@ class BaseTrainer(ABC):
         self.test_in_train = test_in_train
         self.resume_from_log = resume_from_log
 
+        self.timing = Timing(enabled=timing)
+        self.profiler = profiler
+        if timing:
+            self.policy.timing = self.timing
+            for collector in [self.train_collector, self.test_collector]:
+                if collector is not None:
+                    collector.timing = self.timing
+
         self.is_run = False
         self.last_rew, self.last_len = 0.0, 0
 
@@ -241,6 +284,15 @@ class BaseTrainer(ABC):
             self.best_epoch = self.start_epoch
             self.best_reward, self.best_reward_std = \
                 test_result["rew"], test_result["rew_std"]
+        elif self.evaluator is not None:
+            assert self.episode_per_test is not None
+            self.evaluator.wait()  # drop the results of a previous run
+            self.evaluator.submit(
+                self.policy, self.episode_per_test, self.start_epoch, self.env_step
+            )
+            # the first result to arrive becomes the best one
+            self.best_epoch = -1
+            self.best_reward, self.best_reward_std = 0.0, 0.0
         if self.save_best_fn:
             self.save_best_fn(self.policy)
 
@@ -261,12 +313,19 @@ class BaseTrainer(ABC):
 
             # iterator exhaustion check
             if self.epoch > self.max_epoch:
+                self._finish()
                 raise StopIteration
 
             # exit flag 1, when stop_fn succeeds in train_step or test_step
             if self.stop_fn_flag:
+                self._finish()
                 raise StopIteration
 
+        self.timing.reset()
+        epoch_start_time = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.begin(self.epoch, self.timing)
+
         # set policy in train mode
         self.policy.train()
 
@@ -296,7 +355,8 @@ class BaseTrainer(ABC):
                     result["n/st"] = int(self.gradient_step)
                     t.update()
 
-                self.policy_update_fn(data, result)
+                with self.timing.timeit("update"):
+                    self.policy_update_fn(data, result)
                 t.set_postfix(**data)
 
             if t.n <= t.total and not self.stop_fn_flag:
@@ -307,15 +367,25 @@ class BaseTrainer(ABC):
             self.env_step = self.gradient_step * self.batch_size
 
         if not self.stop_fn_flag:
-            self.logger.save_data(
-                self.epoch, self.env_step, self.gradient_step, self.save_checkpoint_fn
-            )
+            with self.timing.timeit("save"):
+                self.logger.save_data(
+                    self.epoch, self.env_step, self.gradient_step,
+                    self.save_checkpoint_fn
+                )
             # test
-            if self.test_collector is not None:
-                test_stat, self.stop_fn_flag = self.test_step()
+            if self.test_collector is not None or self.evaluator is not None:
+                with self.timing.timeit("test"):
+                    test_stat, self.stop_fn_flag = self.test_step()
                 if not self.is_run:
                     epoch_stat.update(test_stat)
 
+        if self.timing.enabled:
+            timing_stat = self._log_timing(time.perf_counter() - epoch_start_time)
+            if not self.is_run:
+                epoch_stat.update(timing_stat)
+        if self.profiler is not None:
+            self.profiler.end(self.epoch)
+
         if not self.is_run:
             epoch_stat.update({k: v.get() for k, v in self.stat.items()})
             epoch_stat["gradient_step"] = self.gradient_step
@@ -328,10 +398,7 @@ class BaseTrainer(ABC):
                     "n/st": int(result["n/st"]),
                 }
             )
-            info = gather_info(
-                self.start_time, self.train_collector, self.test_collector,
-                self.best_reward, self.best_reward_std
-            )
+            info = self._gather_info()
             return self.epoch, epoch_stat, info
         else:
             return None
@@ -339,24 +406,81 @@ class BaseTrainer(ABC):
     def test_step(self) -> Tuple[Dict[str, Any], bool]:
         """Perform one testing step."""
         assert self.episode_per_test is not None
+        if self.evaluator is not None:
+            self.evaluator.submit(
+                self.policy, self.episode_per_test, self.epoch, self.env_step
+            )
+            return self._background_test_step(self.evaluator.poll())
         assert self.test_collector is not None
-        stop_fn_flag = False
         test_result = test_episode(
             self.policy, self.test_collector, self.test_fn, self.epoch,
             self.episode_per_test, self.logger, self.env_step, self.reward_metric
         )
+        return self._test_result_step(self.epoch, test_result)
+
+    def _background_test_step(
+        self, finished: List[Tuple[int, int, Dict[str, Any], Dict[str, Any]]]
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Log and compare the results fetched from the background evaluator."""
+        test_stat: Dict[str, Any] = {}
+        stop_fn_flag = False
+        for epoch, env_step, test_result, snapshot in finished:
+            if self.reward_metric:
+                rew = self.reward_metric(test_result["rews"])
+                test_result.update(rews=rew, rew=rew.mean(), rew_std=rew.std())
+            self.logger.log_test_data(test_result, env_step)
+            test_stat, stop = self._test_result_step(epoch, test_result, snapshot)
+            stop_fn_flag = stop_fn_flag or stop
+        return test_stat, stop_fn_flag
+
+    def _finish(self) -> None:
+        """Wait for the background tests and save the profile of a cut window."""
+        if self.evaluator is not None:
+            self._background_test_step(self.evaluator.wait())
+        if self.profiler is not None:
+            self.profiler.close()
+
+    def _log_timing(self, epoch_time: float) -> Dict[str, float]:
+        """Write the phase times of the epoch to the logger and return them.
+
+        "timing/other" is the part of the epoch outside of the top-level phases.
+        """
+        stat = {f"timing/{k}": v for k, v in self.timing.times.items()}
+        top_level = sum(v for k, v in self.timing.times.items() if "/" not in k)
+        stat["timing/epoch"] = epoch_time
+        stat["timing/other"] = max(0.0, epoch_time - top_level)
+        self.logger.write("timing/env_step", self.env_step, stat)
+        return stat
+
+    def _test_result_step(
+        self,
+        epoch: int,
+        test_result: Dict[str, Any],
+        snapshot: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Update the best result with the test result of the given epoch.
+
+        :param snapshot: the background evaluator's snapshot the result belongs to,
+            whose weights are loaded while calling ``save_best_fn``.
+        """
+        stop_fn_flag = False
         rew, rew_std = test_result["rew"], test_result["rew_std"]
         if self.best_epoch < 0 or self.best_reward < rew:
-            self.best_epoch = self.epoch
+            self.best_epoch = epoch
             self.best_reward = float(rew)
             self.best_reward_std = rew_std
             if self.save_best_fn:
-                self.save_best_fn(self.policy)
+                if snapshot is None:
+                    self.save_best_fn(self.policy)
+                else:
+                    assert self.evaluator is not None
+                    with self.evaluator.loaded(self.policy, snapshot):
+                        self.save_best_fn(self.policy)
         if self.verbose:
             if "success_rate" in test_result:
                 success_rate = test_result["success_rate"]
                 print(
-                    f"Epoch #{self.epoch}: test_reward: {rew:.6f} ± {rew_std:.6f},"
+                    f"Epoch #{epoch}: test_reward: {rew:.6f} ± {rew_std:.6f},"
                     f" success_rate: {success_rate:.3f},"
                     f" best_reward: {self.best_reward:.6f} ± "
                     f"{self.best_reward_std:.6f} in #{self.best_epoch}",
@@ -364,7 +488,7 @@ class BaseTrainer(ABC):
                 )
             else:
                 print(
-                    f"Epoch #{self.epoch}: test_reward: {rew:.6f} ± {rew_std:.6f},"
+                    f"Epoch #{epoch}: test_reward: {rew:.6f} ± {rew_std:.6f},"
                     f" best_reward: {self.best_reward:.6f} ± "
                     f"{self.best_reward_std:.6f} in #{self.best_epoch}",
                     flush=True
@@ -393,14 +517,16 @@ class BaseTrainer(ABC):
         stop_fn_flag = False
         if self.train_fn:
             self.train_fn(self.epoch, self.env_step)
-        result = self.train_collector.collect(
-            n_step=self.step_per_collect, n_episode=self.episode_per_collect
-        )
+        with self.timing.timeit("collect"):
+            result = self.train_collector.collect(
+                n_step=self.step_per_collect, n_episode=self.episode_per_collect
+            )
         if result["n/ep"] > 0 and self.reward_metric:
             rew = self.reward_metric(result["rews"])
             result.update(rews=rew, rew=rew.mean(), rew_std=rew.std())
         self.env_step += int(result["n/st"])
-        self.logger.log_train_data(result, self.env_step)
+        with self.timing.timeit("log"):
+            self.logger.log_train_data(result, self.env_step)
         self.last_rew = result["rew"] if result["n/ep"] > 0 else self.last_rew
         self.last_len = result["len"] if result["n/ep"] > 0 else self.last_len
         data = {
@@ -413,10 +539,11 @@ class BaseTrainer(ABC):
         if result["n/ep"] > 0:
             if self.test_in_train and self.stop_fn and self.stop_fn(result["rew"]):
                 assert self.test_collector is not None
-                test_result = test_episode(
-                    self.policy, self.test_collector, self.test_fn, self.epoch,
-                    self.episode_per_test, self.logger, self.env_step
-                )
+                with self.timing.timeit("test"):
+                    test_result = test_episode(
+                        self.policy, self.test_collector, self.test_fn, self.epoch,
+                        self.episode_per_test, self.logger, self.env_step
+                    )
                 if self.stop_fn(test_result["rew"]):
                     stop_fn_flag = True
                     self.best_reward = test_result["rew"]
@@ -432,7 +559,8 @@ class BaseTrainer(ABC):
             self.stat[k].add(losses[k])
             losses[k] = self.stat[k].get()
             data[k] = f"{losses[k]:.3f}"
-        self.logger.log_update_data(losses, self.gradient_step)
+        with self.timing.timeit("log"):
+            self.logger.log_update_data(losses, self.gradient_step)
 
     @abstractmethod
     def policy_update_fn(self, data: Dict[str, Any], result: Dict[str, Any]) -> None:
@@ -442,6 +570,21 @@ class BaseTrainer(ABC):
         :param result: collector's return value.
         """
 
+    def _gather_info(self) -> Dict[str, Union[float, str]]:
+        info = gather_info(
+            self.start_time, self.train_collector, self.test_collector,
+            self.best_reward, self.best_reward_std
+        )
+        if self.evaluator is not None:
+            info.update(
+                {
+                    "best_reward": self.best_reward,
+                    "best_result":
+                    f"{self.best_reward:.2f} ± {self.best_reward_std:.2f}",
+                }
+            )
+        return info
+
     def run(self) -> Dict[str, Union[float, str]]:
         """Consume iterator.
 
@@ -451,10 +594,7 @@ class BaseTrainer(ABC):
         try:
             self.is_run = True
             deque(self, maxlen=0)  # feed the entire iterator into a zero-length deque
-            info = gather_info(
-                self.start_time, self.train_collector, self.test_collector,
-                self.best_reward, self.best_reward_std
-            )
+            info = self._gather_info()
         finally:
             self.is_run = False
 
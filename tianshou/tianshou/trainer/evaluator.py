@@ -0,0 +1,191 @@
+import copy
+import queue
+import traceback
+from contextlib import contextmanager
+from multiprocessing import Queue
+from multiprocessing.context import Process
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from tianshou.data import Collector
+from tianshou.env.utils import CloudpickleWrapper
+from tianshou.policy import BasePolicy
+from tianshou.trainer.utils import test_episode
+
+
+def _evaluator_worker(
+    requests: Queue,
+    results: Queue,
+    collector_fn_wrapper: CloudpickleWrapper,
+) -> None:
+    collector = None
+    try:
+        collector = collector_fn_wrapper.data()
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            key, n_episode, snapshot = request
+            collector.policy.load_state_dict(snapshot["model"])
+            if snapshot["obs_rms"] is not None:
+                collector.env.set_obs_rms(snapshot["obs_rms"])
+            result = test_episode(collector.policy, collector, None, 0, n_episode)
+            results.put((key, result))
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        results.put((None, traceback.format_exc()))
+    finally:
+        if collector is not None:
+            collector.env.close()
+
+
+class BackgroundEvaluator(object):
+    """Evaluate snapshots of a policy in a separate process.
+
+    The evaluator process builds its own policy, test envs and collector with
+    ``collector_fn``. :meth:`submit` copies the weights of the training policy (and
+    the observation statistics returned by ``obs_rms_fn``) and returns at once; the
+    process loads the snapshot and collects the test episodes while training goes
+    on. Finished results are fetched with :meth:`poll`. Pass it to a trainer with
+    ``evaluator=...`` in place of ``test_collector``.
+
+    :param collector_fn: a function with signature ``f() -> Collector``, called
+        in the evaluator process. The collector's policy must accept the state dict
+        of the training policy.
+    :param obs_rms_fn: a function returning the observation statistics of the
+        training envs, e.g. ``train_envs.get_obs_rms``. Each snapshot takes a copy,
+        which is set on the test envs with ``set_obs_rms`` before evaluating it.
+        Default to None, which means the test envs keep their own statistics.
+    :param int max_pending: the number of snapshots allowed to wait for their
+        results. :meth:`submit` blocks until the oldest result arrives when there
+        are more, which bounds both the memory used by snapshots and the lag of the
+        test results. Default to 2.
+
+    .. note::
+
+        The test envs live in the evaluator process, so hooks acting on them or on
+        the training policy (such as ``test_fn``) are not called for background
+        evaluations.
+    """
+
+    def __init__(
+        self,
+        collector_fn: Callable[[], Collector],
+        obs_rms_fn: Optional[Callable[[], Any]] = None,
+        max_pending: int = 2,
+    ) -> None:
+        if max_pending < 1:
+            raise ValueError(f"max_pending should be positive, got {max_pending}.")
+        self.obs_rms_fn = obs_rms_fn
+        self.max_pending = max_pending
+        self.obs_rms: Any = None
+        self._requests: Queue = Queue()
+        self._results: Queue = Queue()
+        # key -> (epoch, env_step, snapshot), in submission order
+        self._pending: Dict[int, Tuple[int, int, Dict[str, Any]]] = {}
+        self._finished: List[Tuple[int, int, Dict[str, Any], Dict[str, Any]]] = []
+        self._next_key = 0
+        self.process = Process(
+            target=_evaluator_worker,
+            args=(self._requests, self._results, CloudpickleWrapper(collector_fn)),
+            daemon=True,
+        )
+        self.process.start()
+        self.is_closed = False
+
+    def __len__(self) -> int:
+        """Return the number of snapshots waiting for their results."""
+        return len(self._pending)
+
+    def submit(
+        self, policy: BasePolicy, n_episode: int, epoch: int, env_step: int
+    ) -> None:
+        """Snapshot ``policy`` and queue the evaluation of ``n_episode`` episodes.
+
+        :param int epoch: the epoch the snapshot is taken at.
+        :param int env_step: the env step the snapshot is taken at, which the
+            result gets logged with.
+        """
+        assert not self.is_closed, "The evaluator has been closed."
+        while len(self._pending) >= self.max_pending:
+            self._fetch(block=True)
+        snapshot = {
+            "model": {
+                k: v.detach().cpu().clone()
+                for k, v in policy.state_dict().items()
+            },
+            "obs_rms":
+            copy.deepcopy(self.obs_rms_fn()) if self.obs_rms_fn else None,
+        }
+        key, self._next_key = self._next_key, self._next_key + 1
+        self._pending[key] = (epoch, env_step, snapshot)
+        self._requests.put((key, n_episode, snapshot))
+
+    def _fetch(self, block: bool) -> None:
+        """Move the arrived results to the finished list, waiting for one if asked."""
+        while self._pending:
+            try:
+                key, result = self._results.get(block, timeout=1.0)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise RuntimeError("The evaluator process exited unexpectedly.")
+                if block:
+                    continue
+                break
+            if key is None:
+                raise RuntimeError(f"Background evaluation failed:\n{result}")
+            epoch, env_step, snapshot = self._pending.pop(key)
+            self._finished.append((epoch, env_step, result, snapshot))
+            block = False
+
+    def poll(
+        self,
+        block: bool = False
+    ) -> List[Tuple[int, int, Dict[str, Any], Dict[str, Any]]]:
+        """Fetch the results that have arrived since the last call.
+
+        :param bool block: wait for at least one result if any snapshot is pending.
+            Default to False.
+
+        :return: a list of ``(epoch, env_step, result, snapshot)`` in submission
+            order, where ``result`` is the return value of :meth:`Collector.collect`
+            and ``snapshot`` is a dict with keys "model" (the state dict) and
+            "obs_rms".
+        """
+        self._fetch(block and not self._finished)
+        finished, self._finished = self._finished, []
+        return finished
+
+    def wait(self) -> List[Tuple[int, int, Dict[str, Any], Dict[str, Any]]]:
+        """Wait for all pending snapshots and return their results like poll."""
+        while self._pending:
+            self._fetch(block=True)
+        return self.poll()
+
+    @contextmanager
+    def loaded(self, policy: BasePolicy,
+               snapshot: Dict[str, Any]) -> Iterator[BasePolicy]:
+        """Temporarily load the weights of ``snapshot`` into ``policy``.
+
+        The ``obs_rms`` attribute holds the observation statistics of the snapshot
+        inside the block, e.g. for ``save_best_fn`` to store along with the weights.
+        """
+        current = {k: v.clone() for k, v in policy.state_dict().items()}
+        policy.load_state_dict(snapshot["model"])
+        self.obs_rms = snapshot["obs_rms"]
+        try:
+            yield policy
+        finally:
+            policy.load_state_dict(current)
+            self.obs_rms = None
+
+    def close(self) -> None:
+        """Stop the evaluator process, dropping the pending snapshots."""
+        if self.is_closed:
+            return
+        self.is_closed = True
+        self._pending.clear()
+        self._requests.put(None)
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
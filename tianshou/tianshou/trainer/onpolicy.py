@@ -5,7 +5,8 @@ import numpy as np
 from tianshou.data import Collector
 from tianshou.policy import BasePolicy
 from tianshou.trainer.base import BaseTrainer
-from tianshou.utils import BaseLogger, LazyLogger
+from tianshou.trainer.evaluator import BackgroundEvaluator
+from tianshou.utils import BaseLogger, EpochProfiler, LazyLogger
 
 
 class OnpolicyTrainer(BaseTrainer):
@@ -64,6 +65,15 @@ class OnpolicyTrainer(BaseTrainer):
         Default to True.
     :param bool test_in_train: whether to test in the training phase. Default to
         True.
+    :param BackgroundEvaluator evaluator: evaluate snapshots of the policy in a
+        separate process with this :class:`~tianshou.trainer.BackgroundEvaluator`
+        instead of collecting the test episodes with ``test_collector`` (which must
+        be None then) between epochs. Default to None.
+    :param bool timing: whether to time the phases of every epoch with a
+        :class:`~tianshou.utils.Timing` shared with the policy and collectors, and
+        write them with ``logger.write`` under "timing/" keys. Default to False.
+    :param EpochProfiler profiler: a :class:`~tianshou.utils.EpochProfiler` that
+        profiles a window of epochs. Default to None.
 
     .. note::
 
@@ -95,6 +105,9 @@ class OnpolicyTrainer(BaseTrainer):
         verbose: bool = True,
         show_progress: bool = True,
         test_in_train: bool = True,
+        evaluator: Optional[BackgroundEvaluator] = None,
+        timing: bool = False,
+        profiler: Optional[EpochProfiler] = None,
         **kwargs: Any,
     ):
         super().__init__(
@@ -120,6 +133,9 @@ class OnpolicyTrainer(BaseTrainer):
             verbose=verbose,
             show_progress=show_progress,
             test_in_train=test_in_train,
+            evaluator=evaluator,
+            timing=timing,
+            profiler=profiler,
             **kwargs,
         )
 
@@ -1,16 +1,19 @@
 """Utils package."""
 
+from tianshou.utils.logger.background import AsyncLogger
 from tianshou.utils.logger.base import BaseLogger, LazyLogger
 from tianshou.utils.logger.tensorboard import BasicLogger, TensorboardLogger
 from tianshou.utils.logger.wandb import WandbLogger
 from tianshou.utils.lr_scheduler import MultipleLRSchedulers
 from tianshou.utils.progress_bar import DummyTqdm, tqdm_config
-from tianshou.utils.statistics import MovAvg, RunningMeanStd
+from tianshou.utils.statistics import DeferredMetrics, MovAvg, RunningMeanStd
+from tianshou.utils.timing import EpochProfiler, Timing
 from tianshou.utils.warning import deprecation
 
 __all__ = [
     "MovAvg",
     "RunningMeanStd",
+    "DeferredMetrics",
     "tqdm_config",
     "DummyTqdm",
     "BaseLogger",
@@ -18,6 +21,9 @@ __all__ = [
     "BasicLogger",
     "LazyLogger",
     "WandbLogger",
+    "AsyncLogger",
     "deprecation",
     "MultipleLRSchedulers",
+    "Timing",
+    "EpochProfiler",
 ]
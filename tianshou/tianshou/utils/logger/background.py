@@ -0,0 +1,170 @@
+import atexit
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from tianshou.utils.logger.base import LOG_DATA_TYPE, BaseLogger
+
+
+def _wrapped_loggers(logger: Any) -> Iterator[Any]:
+    """Yield ``logger`` and the loggers it writes through, outermost first."""
+    while logger is not None:
+        yield logger
+        tensorboard_logger = getattr(logger, "tensorboard_logger", None)
+        if tensorboard_logger is not None:
+            yield tensorboard_logger
+        logger = getattr(logger, "logger", None)
+
+
+class AsyncLogger(BaseLogger):
+    """Wrap a logger to write its records from a background thread.
+
+    Calls to :meth:`write` and the ``log_*_data`` methods only queue a record and
+    return. A background thread waits ``flush_interval`` seconds after the first
+    queued record, then hands all records that arrived to the wrapped logger in
+    their original order and flushes its SummaryWriter once. Per-write flushing of
+    the wrapped loggers (``write_flush``) is turned off for that reason.
+
+    :meth:`save_data` with a ``save_checkpoint_fn`` and :meth:`restore_data` first
+    wait until every queued record is written, then run on the calling thread, so
+    checkpoints and the metadata read back on resume are consistent with the logged
+    steps; without one, :meth:`save_data` only flushes the queue. :meth:`close` (also
+    registered with :mod:`atexit`) writes the remaining records. An error raised by
+    the wrapped logger in the background is raised again by the next call.
+    ::
+
+        logger = AsyncLogger(TensorboardLogger(SummaryWriter(log_path)))
+        result = onpolicy_trainer(policy, train_collector, test_collector,
+                                  logger=logger)
+        logger.close()
+
+    :param BaseLogger logger: the logger to write to, e.g. a
+        :class:`~tianshou.utils.TensorboardLogger` or a loaded
+        :class:`~tianshou.utils.WandbLogger`. Its own log intervals apply.
+    :param float flush_interval: the time in seconds to gather records into one
+        batch. Default to 1.0.
+    """
+
+    def __init__(self, logger: BaseLogger, flush_interval: float = 1.0) -> None:
+        super().__init__(
+            logger.train_interval, logger.test_interval, logger.update_interval
+        )
+        self.logger = logger
+        self.flush_interval = flush_interval
+        for wrapped in _wrapped_loggers(logger):
+            if hasattr(wrapped, "write_flush"):
+                wrapped.write_flush = False
+        self._queue: queue.Queue = queue.Queue()
+        # held while the wrapped logger is in use, by either thread
+        self._lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+        self.is_closed = False
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _worker(self) -> None:
+        while True:
+            records = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            # a flush request or the final record ends the batch early
+            while isinstance(records[-1], tuple):
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    records.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write_batch([r for r in records if isinstance(r, tuple)])
+            for record in records:
+                if isinstance(record, threading.Event):
+                    record.set()
+            if records[-1] is None:
+                break
+
+    def _write_batch(self, records: List[Tuple[str, Tuple[Any, ...]]]) -> None:
+        if not records or self._error is not None:
+            return
+        with self._lock:
+            try:
+                for method, args in records:
+                    getattr(self.logger, method)(*args)
+                self._flush_writer()
+            except Exception as e:
+                self._error = e
+
+    def _flush_writer(self) -> None:
+        for wrapped in _wrapped_loggers(self.logger):
+            writer = getattr(wrapped, "writer", None)
+            if writer is not None:
+                writer.flush()
+                break
+
+    def _put(self, method: str, *args: Any) -> None:
+        self._check_error()
+        if self.is_closed:
+            raise RuntimeError("Cannot log to a closed AsyncLogger.")
+        self._queue.put((method, args))
+
+    def _check_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def write(self, step_type: str, step: int, data: LOG_DATA_TYPE) -> None:
+        self._put("write", step_type, step, dict(data))
+
+    def log_train_data(self, collect_result: dict, step: int) -> None:
+        self._put("log_train_data", dict(collect_result), step)
+
+    def log_test_data(self, collect_result: dict, step: int) -> None:
+        self._put("log_test_data", dict(collect_result), step)
+
+    def log_update_data(self, update_result: dict, step: int) -> None:
+        self._put("log_update_data", dict(update_result), step)
+
+    def flush(self, wait: bool = True) -> None:
+        """Write the queued records and flush the writer without further delay.
+
+        :param bool wait: whether to wait until it is done. Default to True.
+        """
+        if not self.is_closed:
+            done = threading.Event()
+            self._queue.put(done)
+            if wait:
+                done.wait()
+        self._check_error()
+
+    def save_data(
+        self,
+        epoch: int,
+        env_step: int,
+        gradient_step: int,
+        save_checkpoint_fn: Optional[Callable[[int, int, int], str]] = None,
+    ) -> None:
+        if save_checkpoint_fn is None:
+            # nothing to checkpoint on this thread, the metadata can follow the queue
+            self._put("save_data", epoch, env_step, gradient_step)
+            self.flush(wait=False)
+            return
+        self.flush()
+        with self._lock:
+            self.logger.save_data(epoch, env_step, gradient_step, save_checkpoint_fn)
+            self._flush_writer()
+
+    def restore_data(self) -> Tuple[int, int, int]:
+        self.flush()
+        with self._lock:
+            return self.logger.restore_data()
+
+    def close(self) -> None:
+        """Write the remaining records and stop the background thread."""
+        if self.is_closed:
+            return
+        self.is_closed = True
+        self._queue.put(None)
+        self._thread.join()
+        atexit.unregister(self.close)
+        self._check_error()
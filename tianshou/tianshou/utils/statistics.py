@@ -1,5 +1,5 @@
 from numbers import Number
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Sequence, Union
 
 import numpy as np
 import torch
@@ -99,8 +99,15 @@ class RunningMeanStd(object):
     def update(self, data_array: np.ndarray) -> None:
         """Add a batch of item into RMS with the same shape, modify mean/var/count."""
         batch_mean, batch_var = np.mean(data_array, axis=0), np.var(data_array, axis=0)
-        batch_count = len(data_array)
+        self.update_from_moments(batch_mean, batch_var, len(data_array))
 
+    def update_from_moments(
+        self,
+        batch_mean: Union[float, np.ndarray],
+        batch_var: Union[float, np.ndarray],
+        batch_count: int,
+    ) -> None:
+        """Merge the mean/var/count of a batch computed elsewhere, e.g. on a GPU."""
         delta = batch_mean - self.mean
         total_count = self.count + batch_count
 
@@ -112,3 +119,72 @@ class RunningMeanStd(object):
 
         self.mean, self.var = new_mean, new_var
         self.count = total_count
+
+
+class DeferredMetrics(object):
+    """Collect scalar metrics from a learn loop with a single device sync.
+
+    With ``deferred=True`` every added tensor is copied into a preallocated buffer
+    on its own device, and values only reach the host when :meth:`result` is
+    called. On GPU this replaces one synchronization per ``.item()`` with one per
+    ``learn()``. With ``deferred=False`` values are converted right away. Usage:
+    ::
+
+        >>> metrics = DeferredMetrics(["loss"], capacity=2)
+        >>> metrics.add("loss", torch.tensor(1.0))
+        >>> metrics.add("loss", torch.tensor(2.0))
+        >>> metrics.result()
+        {'loss': [1.0, 2.0]}
+
+    :param keys: the metric names, in the order they will be returned.
+    :param int capacity: the number of values preallocated per key; buffers grow
+        when more values are added. Default to 64.
+    :param bool deferred: whether to defer the host sync to :meth:`result`.
+        Default to True.
+    """
+
+    def __init__(
+        self, keys: Sequence[str], capacity: int = 64, deferred: bool = True
+    ) -> None:
+        self.keys = list(keys)
+        self.deferred = deferred
+        self._capacity = max(capacity, 1)
+        self._buffers: Dict[str, torch.Tensor] = {}
+        self._sizes = {key: 0 for key in self.keys}
+        self._values: Dict[str, List[float]] = {key: [] for key in self.keys}
+
+    def add(self, key: str, value: Union[float, torch.Tensor]) -> None:
+        """Record one scalar value for ``key``."""
+        if not self.deferred:
+            self._values[key].append(
+                value.item() if isinstance(value, torch.Tensor) else float(value)
+            )
+            return
+        value = torch.as_tensor(value).detach().reshape(())
+        size, buffer = self._sizes[key], self._buffers.get(key)
+        if buffer is None:
+            buffer = torch.empty(
+                self._capacity, dtype=value.dtype, device=value.device
+            )
+            self._buffers[key] = buffer
+        elif size == len(buffer):
+            buffer = torch.cat([buffer, torch.empty_like(buffer)])
+            self._buffers[key] = buffer
+        buffer[size] = value
+        self._sizes[key] = size + 1
+
+    def result(self) -> Dict[str, List[float]]:
+        """Return every recorded value as a list of python floats per key."""
+        if self.deferred:
+            by_device: Dict[torch.device, List[str]] = {}
+            for key, buffer in self._buffers.items():
+                by_device.setdefault(buffer.device, []).append(key)
+            for keys in by_device.values():
+                # one transfer per device for all keys on it
+                flat = torch.cat(
+                    [self._buffers[key][:self._sizes[key]] for key in keys]
+                ).tolist()
+                for key in keys:
+                    size = self._sizes[key]
+                    self._values[key], flat = flat[:size], flat[size:]
+        return {key: list(self._values[key]) for key in self.keys}
@@ -0,0 +1,176 @@
+import cProfile
+import time
+from collections import defaultdict
+from typing import Any, DefaultDict, List, Optional
+
+import torch
+
+
+class _TimingScope(object):
+    """A context manager adding its wall time to the path of a nested phase."""
+
+    def __init__(self, timing: "Timing", key: str) -> None:
+        self.timing = timing
+        self.key = key
+        self.path = ""
+        self.start = 0.0
+        self.record: Any = None
+
+    def __enter__(self) -> "_TimingScope":
+        stack = self.timing._stack
+        self.path = f"{stack[-1]}/{self.key}" if stack else self.key
+        stack.append(self.path)
+        if self.timing.record_functions:
+            # name the phase in the trace of a running torch profiler
+            self.record = torch.profiler.record_function(self.path)
+            self.record.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        elapsed = time.perf_counter() - self.start
+        if self.record is not None:
+            self.record.__exit__(*exc)
+            self.record = None
+        self.timing._stack.pop()
+        self.timing.times[self.path] += elapsed
+        self.timing.counts[self.path] += 1
+
+
+class _NullScope(object):
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+
+_NULL_SCOPE = _NullScope()
+
+
+class Timing(object):
+    """Accumulate the wall time of nested, named phases into a tree.
+
+    A phase entered inside another one is recorded under the path of its parent,
+    so code timing itself (e.g. :class:`~tianshou.data.Collector` or
+    :meth:`~tianshou.policy.BasePolicy.update`) does not need to know who called
+    it. Usage:
+    ::
+
+        >>> timing = Timing()
+        >>> with timing.timeit("update"):
+        ...     with timing.timeit("learn"):
+        ...         time.sleep(0.01)
+        >>> list(timing.times)
+        ['update/learn', 'update']
+
+    A disabled instance returns a shared no-op context manager, so phases can be
+    timed unconditionally in the hot loops. Work queued on a GPU is attributed to
+    the phase that synchronizes with it.
+
+    :param bool enabled: whether to record anything. Default to True.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.record_functions = False
+        self.times: DefaultDict[str, float] = defaultdict(float)
+        self.counts: DefaultDict[str, int] = defaultdict(int)
+        self._stack: List[str] = []
+
+    def timeit(self, key: str) -> Any:
+        """Return a context manager timing the phase ``key``."""
+        if not self.enabled:
+            return _NULL_SCOPE
+        return _TimingScope(self, key)
+
+    def reset(self) -> None:
+        """Drop the recorded times, e.g. at the start of an epoch."""
+        self.times.clear()
+        self.counts.clear()
+
+    def __str__(self) -> str:
+        """Return the phases as an indented tree, children under their parents."""
+        lines = []
+        for path in sorted(self.times):
+            depth = path.count("/")
+            lines.append(
+                "  " * depth + f"{path.rsplit('/', 1)[-1]}: "
+                f"{self.times[path]:.4f}s ({self.counts[path]}x)"
+            )
+        return "\n".join(lines)
+
+
+class EpochProfiler(object):
+    """Profile a window of training epochs with torch.profiler or cProfile.
+
+    Trainers call :meth:`begin` and :meth:`end` around every epoch; the profile
+    starts with epoch ``start_epoch`` and is saved to ``path`` after ``num_epochs``
+    epochs, or by :meth:`close` when training stops earlier. The torch profiler
+    writes a Chrome trace (open it in ``chrome://tracing`` or Perfetto) in which
+    the phases of the trainer's :class:`Timing` show up as named ranges; cProfile
+    writes stats readable with :mod:`pstats` or snakeviz.
+
+    :param str path: the file to save the profile to.
+    :param int start_epoch: the first epoch to profile. Default to 1.
+    :param int num_epochs: the number of epochs to profile. Default to 1.
+    :param str backend: "torch" or "cprofile". Default to "torch".
+    """
+
+    def __init__(
+        self,
+        path: str,
+        start_epoch: int = 1,
+        num_epochs: int = 1,
+        backend: str = "torch",
+    ) -> None:
+        if backend not in ["torch", "cprofile"]:
+            raise ValueError(f"Unknown profiler backend {backend}.")
+        self.path = path
+        self.start_epoch = start_epoch
+        self.num_epochs = num_epochs
+        self.backend = backend
+        self._profiler: Any = None
+        self._timing: Optional[Timing] = None
+
+    @property
+    def active(self) -> bool:
+        return self._profiler is not None
+
+    def begin(self, epoch: int, timing: Optional[Timing] = None) -> None:
+        """Start profiling if ``epoch`` is the first epoch of the window."""
+        if epoch != self.start_epoch or self.active:
+            return
+        if self.backend == "torch":
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self._profiler = torch.profiler.profile(activities=activities)
+            self._profiler.start()
+            if timing is not None:
+                timing.record_functions = True
+                self._timing = timing
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def end(self, epoch: int) -> None:
+        """Save the profile if ``epoch`` is the last epoch of the window."""
+        if epoch >= self.start_epoch + self.num_epochs - 1:
+            self.close()
+
+    def close(self) -> None:
+        """Stop profiling and save the profile, if it is running."""
+        if not self.active:
+            return
+        if self.backend == "torch":
+            self._profiler.stop()
+            self._profiler.export_chrome_trace(self.path)
+            if self._timing is not None:
+                self._timing.record_functions = False
+                self._timing = None
+        else:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.path)
+        self._profiler = None